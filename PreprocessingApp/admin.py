@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import CSVModel
+from .models import CSVModel, ProcessedResult, ProcessingRun, StageRun, UploadSession
 
 class CSVModelAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'file', 'uploaded_at', 'is_ready', 'processing_type', 'target_column', 'drop_column', 'error_message')
@@ -12,4 +12,28 @@ class CSVModelAdmin(admin.ModelAdmin):
         for obj in queryset:
             obj.delete()  # Llama a tu método delete personalizado para cada objeto
 
-admin.site.register(CSVModel, CSVModelAdmin)
\ No newline at end of file
+admin.site.register(CSVModel, CSVModelAdmin)
+
+class UploadSessionAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'original_filename', 'received_bytes', 'total_size', 'received_parts', 'created_at', 'csv')
+
+admin.site.register(UploadSession, UploadSessionAdmin)
+
+class ProcessedResultAdmin(admin.ModelAdmin):
+    list_display = ('id', 'key', 'ref_count', 'file_path', 'created_at')
+
+admin.site.register(ProcessedResult, ProcessedResultAdmin)
+
+class StageRunInline(admin.TabularInline):
+    model = StageRun
+    extra = 0
+    readonly_fields = ('stage', 'worker', 'started_at', 'duration_seconds', 'rows_in', 'rows_out',
+                       'peak_rss_bytes', 'bytes_read', 'bytes_written')
+    fields = readonly_fields
+
+class ProcessingRunAdmin(admin.ModelAdmin):
+    list_display = ('id', 'csv', 'mode', 'status', 'from_cache', 'worker', 'started_at', 'duration_seconds')
+    list_filter = ('status', 'mode', 'from_cache')
+    inlines = [StageRunInline]
+
+admin.site.register(ProcessingRun, ProcessingRunAdmin)
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class PreprocessingappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'PreprocessingApp'
+
+    def ready(self):
+        # Métricas de las tareas de Celery (solo conecta señales, no carga el pipeline)
+        from .tasks import instrumentacion  # noqa: F401
+        # Referencias a los resultados compartidos al borrar un CSV
+        from . import signals  # noqa: F401
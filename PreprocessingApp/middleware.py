@@ -0,0 +1,20 @@
+import time
+from .utils.prometheus_utils import DURACION_REQUESTS
+
+
+class MetricasMiddleware:
+    """Latencia de cada request por vista, método y status para /metrics"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        inicio = time.perf_counter()
+        response = self.get_response(request)
+        # Las rutas inexistentes comparten una etiqueta para no multiplicar las series
+        coincidencia = getattr(request, 'resolver_match', None)
+        vista = coincidencia.view_name if coincidencia else 'sin_ruta'
+        DURACION_REQUESTS.observar(
+            time.perf_counter() - inicio, view=vista, method=request.method, status=response.status_code
+        )
+        return response
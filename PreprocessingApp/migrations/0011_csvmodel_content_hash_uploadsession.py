@@ -0,0 +1,39 @@
+# Generated by Django 5.2.3 on 2026-10-18 12:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('PreprocessingApp', '0010_csvmodel_original_filename'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='csvmodel',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.CreateModel(
+            name='UploadSession',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_filename', models.CharField(max_length=255)),
+                ('processing_type', models.TextField()),
+                ('target_column', models.TextField()),
+                ('drop_column', models.TextField(blank=True, null=True)),
+                ('total_size', models.BigIntegerField()),
+                ('part_size', models.IntegerField()),
+                ('received_bytes', models.BigIntegerField(default=0)),
+                ('received_parts', models.IntegerField(default=0)),
+                ('content_hash', models.CharField(blank=True, default='', max_length=64)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('csv', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='upload_sessions', to='PreprocessingApp.csvmodel')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='upload_sessions', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-18 12:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('PreprocessingApp', '0011_csvmodel_content_hash_uploadsession'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessedResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('file_path', models.CharField(max_length=1024)),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='csvmodel',
+            name='result_key',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='csvmodel',
+            name='result',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='csvs', to='PreprocessingApp.processedresult'),
+        ),
+    ]
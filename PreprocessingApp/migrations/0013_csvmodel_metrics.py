@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 12:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('PreprocessingApp', '0012_processedresult_csvmodel_result'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='csvmodel',
+            name='metrics',
+            field=models.JSONField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='csvmodel',
+            name='metrics_version',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
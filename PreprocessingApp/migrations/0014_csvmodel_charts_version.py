@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 12:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('PreprocessingApp', '0013_csvmodel_metrics'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='csvmodel',
+            name='charts_version',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2 on 2026-10-18 12:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('PreprocessingApp', '0014_csvmodel_charts_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProcessingRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mode', models.CharField(max_length=20)),
+                ('status', models.CharField(choices=[('procesando', 'Procesando'), ('listo', 'Listo'), ('error', 'Error')], default='procesando', max_length=20)),
+                ('from_cache', models.BooleanField(default=False)),
+                ('worker', models.CharField(blank=True, default='', max_length=255)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('duration_seconds', models.FloatField(blank=True, null=True)),
+                ('error_message', models.TextField(blank=True, null=True)),
+                ('csv', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='runs', to='PreprocessingApp.csvmodel')),
+            ],
+            options={
+                'ordering': ['-started_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='StageRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stage', models.CharField(db_index=True, max_length=50)),
+                ('worker', models.CharField(blank=True, default='', max_length=255)),
+                ('started_at', models.DateTimeField(db_index=True)),
+                ('finished_at', models.DateTimeField()),
+                ('duration_seconds', models.FloatField()),
+                ('rows_in', models.BigIntegerField(blank=True, null=True)),
+                ('columns_in', models.IntegerField(blank=True, null=True)),
+                ('rows_out', models.BigIntegerField(blank=True, null=True)),
+                ('columns_out', models.IntegerField(blank=True, null=True)),
+                ('peak_rss_bytes', models.BigIntegerField(blank=True, null=True)),
+                ('bytes_read', models.BigIntegerField(blank=True, null=True)),
+                ('bytes_written', models.BigIntegerField(blank=True, null=True)),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stages', to='PreprocessingApp.processingrun')),
+            ],
+            options={
+                'ordering': ['started_at', 'id'],
+            },
+        ),
+    ]
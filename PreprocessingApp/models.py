@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 import os
 import shutil
@@ -15,6 +15,34 @@ def user_directory_path(instance, filename):
     user_folder_path = get_user_directory_path(instance.user)
     return os.path.join(user_folder_path, file_name, filename)
 
+class ProcessedResult(models.Model):
+    """
+    Entrada de la caché de resultados: un csv_procesado.csv compartido por todos
+    los CSVModel con el mismo contenido y configuración (ver
+    pipeline.clave_resultado). El archivo se borra cuando ref_count llega a 0.
+    """
+    key = models.CharField(max_length=64, unique=True)
+    file_path = models.CharField(max_length=1024)
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Resultado {self.key[:12]} ({self.ref_count} referencias)"
+
+    def liberar(self):
+        """Descuenta una referencia y borra el resultado si no queda ninguna"""
+        with transaction.atomic():
+            resultado = ProcessedResult.objects.select_for_update().filter(id=self.id).first()
+            if resultado is None:
+                return
+            resultado.ref_count = max(resultado.ref_count - 1, 0)
+            if resultado.ref_count:
+                resultado.save(update_fields=['ref_count'])
+                return
+            resultado.delete()
+        shutil.rmtree(os.path.dirname(self.file_path), ignore_errors=True)
+
+
 class CSVModel(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='csvs')
     file = models.FileField(upload_to=user_directory_path)  # Archivo CSV original
@@ -28,6 +56,16 @@ class CSVModel(models.Model):
                     # Columna opcional a eliminar
     drop_column = models.TextField(blank=True, null=True)  
     original_filename = models.CharField(max_length=255, default='')
+    # Hash de contenido del original (ver utils/upload_utils.py)
+    content_hash = models.CharField(max_length=64, blank=True, null=True)
+    # Caché de resultados: clave calculada al procesar y resultado compartido que usa processed_file
+    result_key = models.CharField(max_length=64, blank=True, null=True)
+    result = models.ForeignKey(ProcessedResult, on_delete=models.SET_NULL, blank=True, null=True, related_name='csvs')
+    # Métricas comparativas calculadas al terminar el pipeline y hash del csv_procesado.csv del que salieron
+    metrics = models.JSONField(blank=True, null=True)
+    metrics_version = models.CharField(max_length=64, blank=True, null=True)
+    # Versión de los datos con los que se generaron los gráficos de imgs/calidad (ver tasks/graficos.py)
+    charts_version = models.CharField(max_length=64, blank=True, null=True)
     def __str__(self):
         return f"CSV de {self.user.username} - {self.uploaded_at.date()}"
 
@@ -38,6 +76,7 @@ class CSVModel(models.Model):
         super().save(*args, **kwargs)
          # Guardar el modelo antes de hacer cualquier cambio adicional.
     def delete(self, *args, **kwargs):
+        # El csv_procesado.csv puede ser compartido: su referencia se suelta en post_delete (ver signals.py)
         # Obtén la ruta absoluta de la carpeta del CSV usando el archivo existente
         if self.file and hasattr(self.file, 'path'):
             # Usar la carpeta donde está el archivo original
@@ -57,4 +96,92 @@ class CSVModel(models.Model):
                 if os.path.isdir(user_folder):
                     shutil.rmtree(user_folder, ignore_errors=True)
 
-        super().delete(*args, **kwargs)
\ No newline at end of file
+        super().delete(*args, **kwargs)
+
+
+class UploadSession(models.Model):
+    """
+    Subida reanudable por partes: el cliente manda partes de part_size bytes en
+    orden y, si se corta, retoma desde received_bytes. Al completarse se crea el
+    CSVModel y se lanza el procesamiento como en una subida normal.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='upload_sessions')
+    original_filename = models.CharField(max_length=255)
+    processing_type = models.TextField()
+    target_column = models.TextField()
+    drop_column = models.TextField(blank=True, null=True)
+    total_size = models.BigIntegerField()
+    part_size = models.IntegerField()
+    received_bytes = models.BigIntegerField(default=0)
+    received_parts = models.IntegerField(default=0)
+    # Hash de contenido encadenado hasta la última parte confirmada
+    content_hash = models.CharField(max_length=64, default='', blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    csv = models.ForeignKey(CSVModel, on_delete=models.SET_NULL, blank=True, null=True, related_name='upload_sessions')
+
+    def __str__(self):
+        return f"Subida de {self.original_filename} ({self.received_bytes}/{self.total_size} bytes)"
+
+    def final_path(self):
+        """Donde queda el csv_original.csv al completar la sesión"""
+        csv_name = os.path.splitext(self.original_filename)[0]
+        return os.path.join(get_user_directory_path(self.user), csv_name, 'csv_original.csv')
+
+    def temp_path(self):
+        # Con el id de la sesión: otra sesión abierta para el mismo nombre no comparte el archivo
+        return f'{self.final_path()}.{self.id}.subiendo'
+
+
+class ProcessingRun(models.Model):
+    """
+    Una ejecución del pipeline sobre un CSV (ver tasks/telemetria.py). Se abre
+    al empezar procesar_csv y se cierra al marcar el CSV como procesado o con error.
+    """
+    STATUS_RUNNING = 'procesando'
+    STATUS_DONE = 'listo'
+    STATUS_ERROR = 'error'
+    STATUS_CHOICES = [(STATUS_RUNNING, 'Procesando'), (STATUS_DONE, 'Listo'), (STATUS_ERROR, 'Error')]
+
+    csv = models.ForeignKey(CSVModel, on_delete=models.CASCADE, related_name='runs')
+    mode = models.CharField(max_length=20)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=STATUS_RUNNING)
+    # Servido desde la caché de resultados, sin correr ninguna etapa
+    from_cache = models.BooleanField(default=False)
+    worker = models.CharField(max_length=255, blank=True, default='')
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+    duration_seconds = models.FloatField(blank=True, null=True)
+    error_message = models.TextField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-started_at']
+
+    def __str__(self):
+        return f"Ejecución {self.id} del CSV {self.csv_id} ({self.mode}, {self.status})"
+
+
+class StageRun(models.Model):
+    """
+    Una etapa de una ejecución, medida en el worker que la corrió. peak_rss_bytes
+    es el pico de memoria residente del proceso durante la etapa; bytes_read y
+    bytes_written cuentan toda la E/S del proceso (archivos, artefactos y broker).
+    """
+    run = models.ForeignKey(ProcessingRun, on_delete=models.CASCADE, related_name='stages')
+    stage = models.CharField(max_length=50, db_index=True)
+    worker = models.CharField(max_length=255, blank=True, default='')
+    started_at = models.DateTimeField(db_index=True)
+    finished_at = models.DateTimeField()
+    duration_seconds = models.FloatField()
+    rows_in = models.BigIntegerField(blank=True, null=True)
+    columns_in = models.IntegerField(blank=True, null=True)
+    rows_out = models.BigIntegerField(blank=True, null=True)
+    columns_out = models.IntegerField(blank=True, null=True)
+    peak_rss_bytes = models.BigIntegerField(blank=True, null=True)
+    bytes_read = models.BigIntegerField(blank=True, null=True)
+    bytes_written = models.BigIntegerField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['started_at', 'id']
+
+    def __str__(self):
+        return f"{self.stage} ({self.duration_seconds:.3f}s) de la ejecución {self.run_id}"
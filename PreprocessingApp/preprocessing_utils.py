@@ -1,13 +1,9 @@
 import pandas as pd
-from sklearn.preprocessing import StandardScaler
-from sklearn.impute import SimpleImputer
-from scipy import stats
-import seaborn as sns
-import matplotlib.pyplot as plt
 import base64
 import io
 import os
 from django.conf import settings 
+from PreprocessingApp.utils.outlier_utils import METODO_ZSCORE, detectar_outliers, filas_validas
 class PreProcessor:
     def __init__(self, data: pd.DataFrame):
         self.data = data
@@ -29,22 +25,26 @@ class PreProcessor:
 
     def impute_data(self, df: pd.DataFrame) -> pd.DataFrame:
         """Imputa los valores nulos con la media de la columna"""
+        from sklearn.impute import SimpleImputer
         imputer = SimpleImputer(strategy='mean')
         df[df.select_dtypes(include=['float64', 'int64']).columns] = imputer.fit_transform(df.select_dtypes(include=['float64', 'int64']))
         return df
     
     def remove_outliers(self, df: pd.DataFrame) -> pd.DataFrame:
-        """Elimina los outliers usando z-score"""
-        z_scores = stats.zscore(df.select_dtypes(include=['float64', 'int64']))
-        return df[(abs(z_scores) < 3).all(axis=1)]
+        """Elimina los outliers usando z-score (|z| > 3)"""
+        resultado = detectar_outliers(df.select_dtypes(include=['float64', 'int64']), METODO_ZSCORE)
+        return df[filas_validas(resultado)]
     
     def normalize_data(self, df: pd.DataFrame) -> pd.DataFrame:
         """Normaliza el DataFrame recibido, escalando las características"""
+        from sklearn.preprocessing import StandardScaler
         df[df.select_dtypes(include=['float64', 'int64']).columns] = StandardScaler().fit_transform(df[df.select_dtypes(include=['float64', 'int64']).columns])
         return df
     
     def plot_comparative(self, df_original: pd.DataFrame, df_processed: pd.DataFrame, column: str, plot_type: str) -> str:
         """Genera gráficos comparativos entre datos originales y procesados en base64 (outliers o distribuciones)"""
+        import matplotlib.pyplot as plt
+        import seaborn as sns
         fig, axes = plt.subplots(1, 2, figsize=(12, 5))
 
         # Gráficos de outliers
@@ -62,6 +62,8 @@ class PreProcessor:
 
     def plot_missing_values(self, df_original: pd.DataFrame, df_processed: pd.DataFrame) -> str:
         """Genera un gráfico de heatmap comparativo entre valores nulos en base64"""
+        import matplotlib.pyplot as plt
+        import seaborn as sns
         fig, axes = plt.subplots(1, 2, figsize=(12, 6))
         sns.heatmap(df_original.isnull(), cbar=False, cmap='viridis', ax=axes[0])
         sns.heatmap(df_processed.isnull(), cbar=False, cmap='viridis', ax=axes[1])
@@ -70,6 +72,7 @@ class PreProcessor:
 
     def fig_to_base64(self, figure) -> str:
         """Convierte una figura de matplotlib a base64"""
+        import matplotlib.pyplot as plt
         buf = io.BytesIO()
         figure.savefig(buf, format='png', bbox_inches='tight')
         plt.close(figure)
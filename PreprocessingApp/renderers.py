@@ -0,0 +1,26 @@
+import json
+from rest_framework.renderers import BaseRenderer
+
+
+def evento_sse(datos, tipo='progreso', id_evento=None):
+    """Un evento en el formato de Server-Sent Events"""
+    lineas = []
+    if id_evento is not None:
+        lineas.append(f'id: {id_evento}')
+    lineas.append(f'event: {tipo}')
+    lineas.append(f'data: {json.dumps(datos)}')
+    return '\n'.join(lineas) + '\n\n'
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Permite negociar text/event-stream (o ?format=sse). Las vistas responden el
+    stream con un StreamingHttpResponse; este renderer solo se usa para las
+    respuestas comunes (p. ej. un 404), que se envían como un evento 'error'.
+    """
+    media_type = 'text/event-stream'
+    format = 'sse'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return evento_sse(data, 'error').encode(self.charset)
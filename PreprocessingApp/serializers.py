@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import CSVModel
+from .models import CSVModel, ProcessingRun, StageRun
 
 class CSVUploadSerializer(serializers.ModelSerializer):
     class Meta:
@@ -34,3 +34,41 @@ class CSVResultSerializer(serializers.ModelSerializer):
             'is_ready',
             'error_message',
         ]
+
+
+class StageRunSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = StageRun
+        fields = [
+            'stage',
+            'worker',
+            'started_at',
+            'finished_at',
+            'duration_seconds',
+            'rows_in',
+            'columns_in',
+            'rows_out',
+            'columns_out',
+            'peak_rss_bytes',
+            'bytes_read',
+            'bytes_written',
+        ]
+
+
+class ProcessingRunSerializer(serializers.ModelSerializer):
+    stages = StageRunSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = ProcessingRun
+        fields = [
+            'id',
+            'mode',
+            'status',
+            'from_cache',
+            'worker',
+            'started_at',
+            'finished_at',
+            'duration_seconds',
+            'error_message',
+            'stages',
+        ]
@@ -0,0 +1,22 @@
+"""
+Señales de los modelos. Se conectan desde PreprocessingappConfig.ready().
+
+La referencia de un CSVModel a su resultado compartido (ProcessedResult) se
+suelta en post_delete y no en CSVModel.delete(): así también la sueltan los
+borrados de querysets y en cascada (p. ej. al borrar el usuario), que no llaman
+a delete() de cada instancia.
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from .models import CSVModel, ProcessedResult
+
+
+@receiver(post_delete, sender=CSVModel)
+def _liberar_resultado(sender, instance, **kwargs):
+    if not instance.result_id:
+        return
+    resultado = ProcessedResult.objects.filter(id=instance.result_id).first()
+    if resultado is not None:
+        # Solo si el borrado se confirma: con un rollback la referencia sigue en pie
+        transaction.on_commit(resultado.liberar)
@@ -1,5 +1,17 @@
 from .base_imports import *
 from celery import shared_task
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F
+from PreprocessingApp.models import ProcessedResult, ProcessingRun
+from PreprocessingApp.tasks.graficos import lanzar_graficos
+from PreprocessingApp.tasks.progreso import publicar_error, publicar_fin
+from PreprocessingApp.tasks.telemetria import cerrar_ejecucion
+from PreprocessingApp.utils.resumen_utils import CLAVE_ORIGINAL, CLAVE_PROCESADO, guardar_metricas, guardar_resumen
+from PreprocessingApp.utils.upload_utils import preparar_original
+
+CARPETA_RESULTADOS = os.path.join('csv_uploads', '_resultados')
+
 @shared_task
 def actualizar_estado_csv(csv_id):
     try:
@@ -14,3 +26,116 @@ def actualizar_estado_csv(csv_id):
     except Exception as e:
         logger.error(f"Error actualizando estado de CSV ID: {csv_id}: {str(e)}")
 
+def ruta_csv_procesado(obj):
+    """Ruta del csv_procesado.csv, en la misma carpeta donde está el csv_original.csv"""
+    project_directory = os.path.dirname(obj.file.path)
+    os.makedirs(project_directory, exist_ok=True)
+    return os.path.join(project_directory, 'csv_procesado.csv')
+
+def ruta_resultado(clave):
+    """Ruta del csv_procesado.csv compartido de una entrada de la caché de resultados"""
+    return default_storage.path(os.path.join(CARPETA_RESULTADOS, clave, 'csv_procesado.csv'))
+
+def vincular_resultado(obj, resultado):
+    """Apunta el CSV al resultado compartido, tomando una referencia y soltando la anterior"""
+    anterior = obj.result if obj.result_id and obj.result_id != resultado.id else None
+    if obj.result_id != resultado.id:
+        ProcessedResult.objects.filter(id=resultado.id).update(ref_count=F('ref_count') + 1)
+    obj.result = resultado
+    obj.processed_file.name = resultado.file_path
+    obj.save()
+    if anterior is not None:
+        anterior.liberar()
+
+def buscar_resultado(clave):
+    """Entrada de la caché con esa clave, si su archivo sigue existiendo"""
+    resultado = ProcessedResult.objects.filter(key=clave).first()
+    if resultado is not None and os.path.exists(resultado.file_path):
+        return resultado
+    return None
+
+def publicar_resultado(obj, processed_file_path):
+    """
+    Mueve el csv_procesado.csv recién generado a la caché de resultados bajo la
+    clave del CSV y lo vincula. Devuelve la ruta final del archivo.
+    """
+    if not obj.result_key or not settings.PREPROCESSING_RESULT_CACHE:
+        return processed_file_path
+    destino = ruta_resultado(obj.result_key)
+    with transaction.atomic():
+        resultado, creado = ProcessedResult.objects.select_for_update().get_or_create(
+            key=obj.result_key, defaults={'file_path': destino}
+        )
+        if not creado and os.path.exists(resultado.file_path) and resultado.file_path != processed_file_path:
+            # Otro CSV publicó el mismo resultado mientras este se procesaba
+            os.remove(processed_file_path)
+        elif processed_file_path != destino:
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            os.replace(processed_file_path, destino)
+            resultado.file_path = destino
+            resultado.save(update_fields=['file_path'])
+    vincular_resultado(obj, resultado)
+    return resultado.file_path
+
+def marcar_procesado(obj, processed_file_path, run_id=None):
+    processed_file_path = publicar_resultado(obj, processed_file_path)
+    obj.processed_file.name = processed_file_path
+    guardar_metricas_seguro(obj)
+    obj.is_ready = True
+    obj.save()
+    cerrar_ejecucion(run_id, ProcessingRun.STATUS_DONE)
+    publicar_fin(obj.id)
+    lanzar_graficos(obj)
+
+def guardar_metricas_seguro(obj):
+    """
+    Deja calculadas las métricas para CSVMetricasView, a partir de los resúmenes
+    persistidos (en los modos por bloques y shards, los que juntaron sus pasadas).
+    """
+    try:
+        guardar_metricas(obj)
+    except Exception as e:
+        logger.warning(f"No se pudieron calcular las métricas del CSV ID {obj.id}: {str(e)}")
+
+def guardar_csv_procesado(obj, df_final, run_id=None):
+    """Guarda el csv_procesado.csv, su resumen para métricas y gráficos, y marca el CSV como listo"""
+    processed_file_path = ruta_csv_procesado(obj)
+    df_final.to_csv(processed_file_path, index=False)
+    obj.processed_file.name = processed_file_path
+    guardar_resumen_seguro(obj, CLAVE_PROCESADO, df_final)
+    marcar_procesado(obj, processed_file_path, run_id)
+
+def guardar_resumen_seguro(obj, clave, df=None, resumen=None):
+    """El resumen es una caché: si falla se recalcula al consultarlo, sin cortar el procesamiento"""
+    try:
+        guardar_resumen(obj, clave, df, resumen)
+    except Exception as e:
+        logger.warning(f"No se pudo guardar el resumen '{clave}' del CSV ID {obj.id}: {str(e)}")
+
+def registrar_error(csv_id, error, run_id=None):
+    """
+    Marca el CSV como no listo, guarda el mensaje de error, lo publica como
+    evento de progreso y cierra la ejecución run_id con el error
+    """
+    publicar_error(csv_id, error)
+    cerrar_ejecucion(run_id, ProcessingRun.STATUS_ERROR, error)
+    try:
+        obj = CSVModel.objects.get(id=csv_id)
+        obj.is_ready = False
+        obj.error_message = str(error)
+        obj.save()
+    except Exception as inner_e:
+        logger.error(f"Error guardando mensaje de error: {inner_e}")
+
+def guardar_resumenes_por_bloques(obj, processed_file_path, resumen_original, resumen_procesado):
+    """
+    Persiste los resúmenes que los modos por bloques y shards juntaron en sus
+    pasadas (ver streaming.ResumenPorBloques), sin releer ninguno de los CSV.
+    """
+    obj.processed_file.name = processed_file_path
+    preparar = {CLAVE_ORIGINAL: lambda df: preparar_original(df, obj.target_column), CLAVE_PROCESADO: None}
+    for clave, resumen in ((CLAVE_ORIGINAL, resumen_original), (CLAVE_PROCESADO, resumen_procesado)):
+        try:
+            guardar_resumen(obj, clave, resumen=resumen.resumir(obj.target_column, preparar[clave]))
+        except Exception as e:
+            logger.warning(f"No se pudo guardar el resumen '{clave}' del CSV ID {obj.id}: {str(e)}")
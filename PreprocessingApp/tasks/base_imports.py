@@ -1,14 +1,9 @@
 import pandas as pd
-from sklearn.preprocessing import StandardScaler
-from sklearn.impute import SimpleImputer
-from scipy import stats
-import seaborn as sns
-import matplotlib.pyplot as plt
-import base64
-import io
 import os
 from django.conf import settings
 from PreprocessingApp.models import CSVModel
 import logging
 
+# scikit-learn, scipy y las librerías de gráficos se importan en las funciones
+# que las usan: el worker y manage.py no las cargan hasta que hacen falta
 logger = logging.getLogger(__name__)
@@ -0,0 +1,69 @@
+"""
+Generación de los gráficos de calidad fuera del request.
+
+Se lanza al terminar el procesamiento (ver marcar_procesado) o desde
+CSVImagesView, con solicitar_graficos, si los gráficos no corresponden a los
+datos actuales. Los PNG quedan en imgs/calidad y CSVModel.charts_version guarda
+la versión de los datos con la que se generaron; si no cambió, la tarea no hace
+nada. La vista solo compara tamaño y mtime de los CSV: si cambiaron, el hash lo
+recalcula esta tarea al pedir los resúmenes (ver obtener_resumen).
+
+Las vistas importan este módulo, por eso usa su propio logger en vez del de
+base_imports (que carga pandas).
+"""
+import logging
+import os
+import sys
+from celery import shared_task
+from PreprocessingApp.models import CSVModel
+from PreprocessingApp.utils.graph_utils import generar_graficos_desde_resumenes, graficos_existentes
+from PreprocessingApp.utils.pendientes_utils import liberar_pendiente, marcar_pendiente
+from PreprocessingApp.utils.resumen_utils import CLAVE_ORIGINAL, CLAVE_PROCESADO, obtener_resumen, version_graficos
+
+logger = logging.getLogger(__name__)
+
+
+def _clave_pendiente(csv_id):
+    return f'graficos_pendientes:{csv_id}'
+
+
+def graficos_vigentes(obj, version=None):
+    base_dir = os.path.dirname(obj.file.path)
+    version = version or version_graficos(obj)
+    return version is not None and obj.charts_version == version and bool(graficos_existentes(base_dir))
+
+
+@shared_task
+def generar_graficos(csv_id):
+    try:
+        obj = CSVModel.objects.get(id=csv_id)
+        # Primero los resúmenes: si un CSV cambió de mtime se rehashea acá y se actualiza su huella
+        resumen_orig = obtener_resumen(obj, CLAVE_ORIGINAL)
+        # Si no hay archivo procesado, compara con sí mismo
+        resumen_proc = obtener_resumen(obj, CLAVE_PROCESADO) or resumen_orig
+        version = version_graficos(obj)
+        if graficos_vigentes(obj, version):
+            return csv_id
+        generar_graficos_desde_resumenes(resumen_orig, resumen_proc, os.path.dirname(obj.file.path))
+        # update(): no pisar los campos que el pipeline haya cambiado mientras tanto
+        CSVModel.objects.filter(id=csv_id).update(charts_version=version)
+        logger.info(f"Gráficos de calidad generados para CSV ID: {csv_id}")
+        return csv_id
+    except Exception as e:
+        # Los gráficos no afectan el estado del procesamiento: se reintentan al pedirlos
+        logger.error(f"Error generando gráficos para CSV ID {csv_id}: {str(e)}")
+        return None
+    finally:
+        liberar_pendiente(_clave_pendiente(csv_id))
+
+
+def solicitar_graficos(csv_id):
+    """Encola generar_graficos salvo que ya haya una pendiente para el CSV"""
+    if marcar_pendiente(_clave_pendiente(csv_id)):
+        generar_graficos.delay(csv_id)
+
+
+def lanzar_graficos(obj):
+    if 'test' in sys.argv:
+        return generar_graficos.apply(args=[obj.id])
+    return generar_graficos.apply_async(args=[obj.id])
@@ -1,36 +1,62 @@
 from celery import shared_task
 import pandas as pd
 from .base_imports import *
-from sklearn.impute import SimpleImputer
 import numpy as np
-from io import StringIO
+from PreprocessingApp.utils.artifact_utils import cargar_artefacto, guardar_siguiente_artefacto
+from PreprocessingApp.tasks.telemetria import etapa, registrar_fallo_etapa
+from PreprocessingApp.utils.sketch_utils import CUANTILES_APROXIMADOS, cuantiles
+from PreprocessingApp.utils.parallel_utils import ejecutar_por_columnas, usar_paralelo
+from PreprocessingApp.utils.dtype_utils import a_flotante, conservar_tipos
+from django.conf import settings
 
-@shared_task
-def preprocesar_imputacion(df_serialized):
-    try:
-        logger.info("Iniciando imputación de valores faltantes")
+def _imputar_mediana(df):
+    """Imputación por mediana de un rango de columnas (usada por el pool de procesos)"""
+    medianas = cuantiles(df, [0.5]).iloc[0]
+    return a_flotante(df).fillna(medianas)
 
-        df = pd.read_json(StringIO(df_serialized), orient='split')
-        logger.info(f"DataFrame shape: {df.shape}")
+def imputar(df):
+    """Imputa con la mediana los valores faltantes de las columnas numéricas"""
+    logger.info(f"DataFrame shape: {df.shape}")
 
-        # Trabajar con TODAS las columnas numéricas (incluidas categóricas)
-        numeric_columns = df.select_dtypes(include=[np.number]).columns
-        
-        if len(numeric_columns) == 0:
-            logger.info("No hay columnas numéricas para imputar")
-            return df.to_json(orient='split')
+    # Trabajar con TODAS las columnas numéricas (incluidas categóricas)
+    numeric_columns = df.select_dtypes(include=[np.number]).columns
 
-        df_imputed = df.copy()
-        
-        # Imputar valores faltantes con mediana (mejor para categóricas numéricas)
+    if len(numeric_columns) == 0:
+        logger.info("No hay columnas numéricas para imputar")
+        return df
+
+    df_imputed = df.copy()
+
+    # Imputar valores faltantes con mediana (mejor para categóricas numéricas)
+    if usar_paralelo(len(numeric_columns)):
+        df_imputed[numeric_columns] = ejecutar_por_columnas(df[numeric_columns], _imputar_mediana, escribir=True)
+    elif settings.PREPROCESSING_QUANTILES == CUANTILES_APROXIMADOS:
+        medianas = cuantiles(df[numeric_columns], [0.5]).iloc[0]
+        df_imputed[numeric_columns] = a_flotante(df[numeric_columns]).fillna(medianas)
+    else:
+        from sklearn.impute import SimpleImputer
         imputer = SimpleImputer(strategy='median')
-        df_imputed[numeric_columns] = imputer.fit_transform(df[numeric_columns])
+        df_imputed[numeric_columns] = imputer.fit_transform(a_flotante(df[numeric_columns]))
 
-        logger.info("Imputación completada")
-        logger.info(f"Columnas procesadas: {numeric_columns.tolist()}")
-        
-        return df_imputed.to_json(orient='split')
+    logger.info("Imputación completada")
+    logger.info(f"Columnas procesadas: {numeric_columns.tolist()}")
+    # Los tipos compactos de la entrada (ver dtype_utils) no vuelven a 64 bits
+    return conservar_tipos(df_imputed, df.dtypes)
+
+@shared_task
+def preprocesar_imputacion(artefacto, csv_id=None, run_id=None):
+    try:
+        logger.info("Iniciando imputación de valores faltantes")
+
+        with etapa('imputacion', csv_id, run_id) as medicion:
+            df = cargar_artefacto(artefacto)
+            df_imputed = imputar(df)
+            medicion.formas(df, df_imputed)
+            if df_imputed is df:
+                return artefacto
+            return guardar_siguiente_artefacto(df_imputed, artefacto, 'imputacion')
         
     except Exception as e:
         logger.error(f"Error en imputación: {str(e)}")
-        raise Exception("Error en imputación")
\ No newline at end of file
+        registrar_fallo_etapa(csv_id, 'imputacion', e, run_id)
+        raise Exception("Error en imputación")
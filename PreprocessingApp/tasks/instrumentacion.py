@@ -0,0 +1,25 @@
+"""
+Duración y resultado de cada tarea de Celery para /metrics (ver
+utils/prometheus_utils.py). Las señales corren en el proceso que ejecuta la
+tarea, así que cada hijo del pool prefork suma en los mismos contadores de Redis.
+Se conecta desde PreprocessingappConfig.ready().
+"""
+import time
+from celery.signals import task_postrun, task_prerun
+from PreprocessingApp.utils.prometheus_utils import DURACION_TAREAS, TAREAS
+
+_inicios = {}
+
+
+@task_prerun.connect
+def _inicio_tarea(task_id=None, **kwargs):
+    _inicios[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def _fin_tarea(task_id=None, task=None, state=None, **kwargs):
+    inicio = _inicios.pop(task_id, None)
+    nombre = task.name.rsplit('.', 1)[-1]
+    if inicio is not None:
+        DURACION_TAREAS.observar(time.perf_counter() - inicio, task=nombre)
+    TAREAS.inc(task=nombre, state=(state or 'desconocido').lower())
@@ -5,69 +5,157 @@ from PreprocessingApp.tasks.imputacion import preprocesar_imputacion
 from PreprocessingApp.tasks.outliers import preprocesar_outliers
 from PreprocessingApp.tasks.normalizacion import preprocesar_normalizacion
 from PreprocessingApp.tasks.registros_duplicados import preprocesar_duplicados
+from PreprocessingApp.tasks.actualizar_estado_csv import (
+    buscar_resultado,
+    guardar_csv_procesado,
+    guardar_resumen_seguro,
+    guardar_resumenes_por_bloques,
+    marcar_procesado,
+    registrar_error,
+    ruta_csv_procesado,
+)
+from PreprocessingApp.tasks.progreso import publicar_etapa, publicar_inicio
+from PreprocessingApp.tasks.telemetria import ejecucion_desde_cache, etapa, iniciar_ejecucion
+from PreprocessingApp.tasks.pipeline import (
+    MODO_BLOQUES,
+    MODO_INLINE,
+    MODO_SHARDS,
+    clave_resultado,
+    ejecutar_pipeline,
+    elegir_modo,
+)
+from PreprocessingApp.tasks.streaming import ResumenPorBloques, procesar_por_bloques
+from PreprocessingApp.tasks.shards import lanzar_por_shards
 from celery import chain
+from django.conf import settings
 from PreprocessingApp.models import CSVModel
+from PreprocessingApp.utils.resumen_utils import CLAVE_ORIGINAL
+from PreprocessingApp.utils.upload_utils import columnas_a_eliminar, hash_archivo, preparar_original
+from PreprocessingApp.utils.artifact_utils import (
+    cargar_artefacto,
+    directorio_artefactos,
+    eliminar_artefactos,
+    guardar_artefacto,
+)
 import pandas as pd
 import os
-from io import StringIO
 import sys
 
 @shared_task
-def finalizar_procesamiento(df_json, csv_id):
+def finalizar_procesamiento(artefacto, csv_id, run_id=None):
     """Tarea final que guarda el archivo procesado en la misma carpeta que el original"""
     try:
         logger.info(f"Finalizando procesamiento para CSV ID: {csv_id}")
         obj = CSVModel.objects.get(id=csv_id)
-        # Usar la misma carpeta donde está el csv_original.csv
-        project_directory = os.path.dirname(obj.file.path)
-        os.makedirs(project_directory, exist_ok=True)
-        df_final = pd.read_json(StringIO(df_json), orient='split')
-        processed_file_path = os.path.join(project_directory, 'csv_procesado.csv')
-        df_final.to_csv(processed_file_path, index=False)
-        obj.processed_file.name = processed_file_path
-        obj.is_ready = True
-        obj.save()
+        with etapa('guardado', run_id=run_id) as medicion:
+            df_final = cargar_artefacto(artefacto)
+            medicion.formas(df_final, df_final)
+            guardar_csv_procesado(obj, df_final, run_id)
+        eliminar_artefactos(artefacto)
         logger.info(f"Procesamiento completado para CSV ID: {csv_id}")
         return csv_id
     except Exception as e:
         logger.error(f"Error en finalización para CSV ID {csv_id}: {str(e)}")
-        try:
-            obj = CSVModel.objects.get(id=csv_id)
-            obj.is_ready = False
-            obj.error_message = str(e)
-            obj.save()
-        except Exception as inner_e:
-            logger.error(f"Error guardando mensaje de error: {inner_e}")
+        registrar_error(csv_id, e, run_id)
         raise
 
 @shared_task(bind=True)
-def procesar_csv(self, csv_id, drop_column=None):
+def procesar_csv(self, csv_id, drop_column=None, modo=None):
+    """
+    Lanza el preprocesamiento del CSV. modo='inline' ejecuta todas las etapas
+    en esta misma tarea; modo='cadena' las encadena como tareas de Celery;
+    modo='bloques' recorre el archivo por bloques sin cargarlo entero;
+    modo='shards' lo reparte en shards de filas entre todos los workers.
+    Si no se indica, se elige según el tamaño del archivo.
+    """
+    run_id = None
     try:
         logger.info(f"Iniciando tarea principal para CSV ID: {csv_id}")
         obj = CSVModel.objects.get(id=csv_id)
+        publicar_inicio(csv_id)
+        target_column = obj.target_column
+        modo = modo or elegir_modo(obj.file.path)
+        run_id = iniciar_ejecucion(obj, modo)
+        # Las columnas elegidas en la subida se eliminan acá, no en el request
+        drop_column = columnas_a_eliminar(obj.drop_column) + columnas_a_eliminar(drop_column)
+
+        if settings.PREPROCESSING_RESULT_CACHE:
+            # Mismo contenido y configuración que un resultado ya calculado: no se corre ninguna etapa
+            if not obj.content_hash:
+                obj.content_hash = hash_archivo(obj.file.path)
+            obj.result_key = clave_resultado(obj.content_hash, target_column, drop_column, obj.processing_type)
+            obj.save()
+            resultado = buscar_resultado(obj.result_key)
+            if resultado is not None:
+                ejecucion_desde_cache(run_id)
+                marcar_procesado(obj, resultado.file_path, run_id)
+                logger.info(f"CSV ID {csv_id} servido desde la caché de resultados ({obj.result_key[:12]})")
+                return f"Procesamiento completado para CSV ID: {csv_id}"
+
+        if modo == MODO_SHARDS:
+            lanzar_por_shards(obj, drop_column, settings.PREPROCESSING_SHARD_BYTES, {
+                'chunk_size': settings.PREPROCESSING_CHUNK_SIZE,
+                'tamano_muestra': settings.PREPROCESSING_STREAMING_SAMPLE_ROWS,
+                'tamano_resumen': settings.PREPROCESSING_SUMMARY_SAMPLE_ROWS,
+                'modo_cuantiles': settings.PREPROCESSING_QUANTILES,
+                'error_cuantiles': settings.PREPROCESSING_QUANTILE_ERROR,
+                'run_id': run_id,
+            })
+            logger.info(f"Procesamiento por shards iniciado para CSV ID: {csv_id}")
+            return f"Procesamiento iniciado para CSV ID: {csv_id}"
+
+        if modo == MODO_BLOQUES:
+            processed_file_path = ruta_csv_procesado(obj)
+            resumenes = (
+                ResumenPorBloques(settings.PREPROCESSING_SUMMARY_SAMPLE_ROWS, semilla=0),
+                ResumenPorBloques(settings.PREPROCESSING_SUMMARY_SAMPLE_ROWS, semilla=1),
+            )
+            with etapa(MODO_BLOQUES, run_id=run_id) as medicion:
+                medicion.filas_salida = procesar_por_bloques(
+                    obj.file.path, processed_file_path, target_column, drop_column,
+                    chunk_size=settings.PREPROCESSING_CHUNK_SIZE,
+                    tamano_muestra=settings.PREPROCESSING_STREAMING_SAMPLE_ROWS,
+                    modo_cuantiles=settings.PREPROCESSING_QUANTILES,
+                    error_cuantiles=settings.PREPROCESSING_QUANTILE_ERROR,
+                    progreso=lambda nombre, porcentaje: publicar_etapa(csv_id, nombre, porcentaje=porcentaje),
+                    resumenes=resumenes,
+                )
+            guardar_resumenes_por_bloques(obj, processed_file_path, *resumenes)
+            marcar_procesado(obj, processed_file_path, run_id)
+            logger.info(f"Procesamiento por bloques completado para CSV ID: {csv_id}")
+            return f"Procesamiento completado para CSV ID: {csv_id}"
         
-        # Cargar el DataFrame original
-        df = pd.read_csv(obj.file.path)
-        
-        # Eliminar columnas si corresponde
-        if drop_column and drop_column in df.columns:
-            logger.info(f"Eliminando columna {drop_column} del DataFrame")
-            df = df.drop(columns=[drop_column])
+        # Cargar el DataFrame original, eliminar columnas y convertir la columna objetivo
+        with etapa('lectura', run_id=run_id) as medicion:
+            df = pd.read_csv(obj.file.path)
+            if drop_column:
+                logger.info(f"Eliminando columnas {drop_column} del DataFrame")
+            df = preparar_original(df, target_column, drop_column)
+            medicion.formas(None, df)
+            # Dejar su resumen listo para las vistas de métricas
+            guardar_resumen_seguro(obj, CLAVE_ORIGINAL, df)
         
-        # Obtener target_column del modelo
-        target_column = obj.target_column
+        if modo == MODO_INLINE:
+            df_final, registros = ejecutar_pipeline(df, target_column, csv_id, run_id)
+            with etapa('guardado', run_id=run_id) as medicion:
+                medicion.formas(df_final, df_final)
+                guardar_csv_procesado(obj, df_final, run_id)
+            segundos = sum(registro['segundos'] for registro in registros)
+            logger.info(f"Procesamiento inline completado para CSV ID: {csv_id} en {segundos:.3f}s")
+            return f"Procesamiento completado para CSV ID: {csv_id}"
         
-        # Convertir el DataFrame a JSON
-        df_json = df.to_json(orient='split')
+        # Guardar el DataFrame como artefacto: por el broker solo viaja el handle
+        # Carpeta propia de esta ejecución: otra del mismo CSV puede estar corriendo a la vez
+        artefacto = guardar_artefacto(df, directorio_artefactos(obj.file.path, run_id or self.request.id), 'original')
 
         # Crear cadena de tareas PASANDO target_column desde el primer paso
         task_chain = chain(
-            preprocesar_transformacion.s(df_json, csv_id, target_column),  # ← AGREGAR target_column
-            preprocesar_duplicados.s(),
-            preprocesar_imputacion.s(),
-            preprocesar_outliers.s(),
-            preprocesar_normalizacion.s(target_column),
-            finalizar_procesamiento.s(csv_id)
+            preprocesar_transformacion.s(artefacto, csv_id, target_column, run_id),
+            preprocesar_duplicados.s(csv_id, run_id),
+            preprocesar_imputacion.s(csv_id, run_id),
+            preprocesar_outliers.s(csv_id, run_id),
+            preprocesar_normalizacion.s(target_column, csv_id, run_id),
+            finalizar_procesamiento.s(csv_id, run_id)
         )
 
         if 'test' in sys.argv:
@@ -80,11 +168,5 @@ def procesar_csv(self, csv_id, drop_column=None):
 
     except Exception as e:
         logger.error(f"Error al iniciar procesamiento para CSV ID {csv_id}: {str(e)}")
-        try:
-            obj = CSVModel.objects.get(id=csv_id)
-            obj.is_ready = False
-            obj.error_message = str(e)
-            obj.save()
-        except Exception as inner_e:
-            logger.error(f"Error guardando mensaje de error: {inner_e}")
+        registrar_error(csv_id, e, run_id)
         return None
\ No newline at end of file
@@ -0,0 +1,44 @@
+"""
+Cálculo de las métricas comparativas fuera del request.
+
+Se calculan al terminar el procesamiento (ver marcar_procesado). Si
+CSVMetricasView las pide y ya no corresponden al csv_procesado.csv actual (el
+archivo cambió o falló el cálculo en el worker) lanza esta tarea con
+solicitar_metricas y responde 202: el proceso web nunca lee los CSV, y los
+polls siguientes no vuelven a encolarla mientras está pendiente.
+
+Las vistas importan este módulo, por eso usa su propio logger en vez del de
+base_imports (que carga pandas).
+"""
+import logging
+from celery import shared_task
+from PreprocessingApp.models import CSVModel
+from PreprocessingApp.utils.pendientes_utils import liberar_pendiente, marcar_pendiente
+from PreprocessingApp.utils.resumen_utils import guardar_metricas, metricas_vigentes
+
+logger = logging.getLogger(__name__)
+
+
+def _clave_pendiente(csv_id):
+    return f'metricas_pendientes:{csv_id}'
+
+
+@shared_task
+def calcular_metricas(csv_id):
+    try:
+        obj = CSVModel.objects.get(id=csv_id)
+        if not metricas_vigentes(obj):
+            guardar_metricas(obj)
+            logger.info(f"Métricas recalculadas para CSV ID: {csv_id}")
+        return csv_id
+    except Exception as e:
+        logger.error(f"Error calculando métricas para CSV ID {csv_id}: {str(e)}")
+        return None
+    finally:
+        liberar_pendiente(_clave_pendiente(csv_id))
+
+
+def solicitar_metricas(csv_id):
+    """Encola calcular_metricas salvo que ya haya una pendiente para el CSV"""
+    if marcar_pendiente(_clave_pendiente(csv_id)):
+        calcular_metricas.delay(csv_id)
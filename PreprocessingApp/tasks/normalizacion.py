@@ -1,99 +1,96 @@
 from celery import shared_task
 from .base_imports import *
-from io import StringIO
+from PreprocessingApp.utils.artifact_utils import cargar_artefacto, guardar_siguiente_artefacto
+from PreprocessingApp.tasks.telemetria import etapa, registrar_fallo_etapa
+from PreprocessingApp.utils.parallel_utils import ejecutar_por_columnas, usar_paralelo
+from PreprocessingApp.utils.profile_utils import UMBRAL_CATEGORICO, ColumnProfile
+from PreprocessingApp.utils.dtype_utils import a_flotante, conservar_tipos
 import numpy as np
 
-def detectar_columnas_categoricas(df, target_column=None, umbral_categorico=0.05):
-    """Detecta columnas categóricas automáticamente"""
-    categoricas = []
-    
-    for col in df.columns:
-        if df[col].isnull().all():
-            continue
-            
-        # El target categórico no se normaliza
-        if col == target_column:
-            valores_unicos = df[col].nunique()
-            if valores_unicos <= 50:  # Target de clasificación
-                categoricas.append(col)
-                continue
-        
-        # Tipo object
-        if df[col].dtype == 'object':
-            categoricas.append(col)
-            continue
-        
-        # Pocos valores únicos
-        valores_unicos = df[col].nunique()
-        total_filas = len(df)
-        ratio_unicidad = valores_unicos / total_filas
-        
-        if ratio_unicidad < umbral_categorico:
-            categoricas.append(col)
-            continue
-            
-        # Enteros pequeños (categóricas codificadas)
-        if df[col].dtype in ['int64', 'int32']:
-            if valores_unicos <= 20 and df[col].min() >= 0 and df[col].max() <= 100:
-                categoricas.append(col)
-    
-    return categoricas
+def detectar_columnas_categoricas(df, target_column=None, umbral_categorico=UMBRAL_CATEGORICO):
+    """Detecta columnas categóricas automáticamente (ver ColumnProfile)"""
+    return ColumnProfile(df, target_column, umbral_categorico).categoricas
 
 def detectar_columnas_binarias(df, target_column=None):
-    """Detecta columnas binarias"""
-    binarias = []
-    
-    for col in df.columns:
-        valores_unicos = set(df[col].dropna())
-        
-        # Binarias numéricas (0/1, 0.0/1.0)
-        if valores_unicos.issubset({0, 1, 0.0, 1.0}):
-            binarias.append(col)
-            continue
-            
-        # Si es target y tiene exactamente 2 valores, es binario
-        if col == target_column and len(valores_unicos) == 2:
-            binarias.append(col)
-    
-    return binarias
+    """Detecta columnas binarias (ver ColumnProfile)"""
+    return ColumnProfile(df, target_column).binarias
+
+def _detectar_columnas(df, target_column=None):
+    # Un solo perfil para las dos detecciones
+    perfil = ColumnProfile(df, target_column)
+    return perfil.categoricas, perfil.binarias
+
+def _detectar_columnas_en_paralelo(df, target_column=None):
+    """Detección por rangos de columnas numéricas en el pool; el resto se detecta acá"""
+    numericas = df.select_dtypes(include=[np.number]).columns
+    partes = ejecutar_por_columnas(df[numericas], _detectar_columnas, target_column)
+    otras = df.drop(columns=numericas)
+    if otras.shape[1]:
+        partes.append(_detectar_columnas(otras, target_column))
+    categoricas = [col for parte_cat, _ in partes for col in parte_cat]
+    binarias = [col for _, parte_bin in partes for col in parte_bin]
+    return categoricas, binarias
+
+def _estandarizar(df):
+    from sklearn.preprocessing import StandardScaler
+    return pd.DataFrame(StandardScaler().fit_transform(a_flotante(df)), columns=df.columns, index=df.index)
+
+def normalizar(df, target_column=None):
+    """Estandariza las columnas numéricas continuas (no categóricas ni binarias)"""
+    logger.info(f"DataFrame shape: {df.shape}")
+    logger.info(f"Columnas: {df.columns.tolist()}")
+
+    # Detectar tipos de columnas
+    paralelo = usar_paralelo(df.shape[1])
+    if paralelo:
+        categoricas, binarias = _detectar_columnas_en_paralelo(df, target_column)
+    else:
+        categoricas, binarias = _detectar_columnas(df, target_column)
+
+    # Combinar columnas que NO se deben normalizar
+    no_normalizar = set(categoricas + binarias)
+
+    # Obtener columnas numéricas continuas para normalizar
+    columnas_numericas = df.select_dtypes(include=[np.number]).columns
+    columnas_a_normalizar = [col for col in columnas_numericas if col not in no_normalizar]
+
+    logger.info(f"Columnas categóricas detectadas: {categoricas}")
+    logger.info(f"Columnas binarias detectadas: {binarias}")
+    logger.info(f"Columnas a normalizar: {columnas_a_normalizar}")
+    logger.info(f"Columnas NO normalizadas: {list(no_normalizar)}")
+
+    # Normalizar solo las columnas apropiadas
+    if not columnas_a_normalizar:
+        logger.info("No hay columnas para normalizar")
+        return df
+
+    df_normalized = df.copy()
+    if paralelo:
+        df_normalized[columnas_a_normalizar] = ejecutar_por_columnas(
+            df[columnas_a_normalizar], _estandarizar, escribir=True
+        )
+    else:
+        from sklearn.preprocessing import StandardScaler
+        scaler = StandardScaler()
+        df_normalized[columnas_a_normalizar] = scaler.fit_transform(a_flotante(df[columnas_a_normalizar]))
+    logger.info(f"Normalizadas {len(columnas_a_normalizar)} columnas")
+    return conservar_tipos(df_normalized, df.dtypes)
 
 @shared_task
-def preprocesar_normalizacion(df_serialized, target_column=None):
+def preprocesar_normalizacion(artefacto, target_column=None, csv_id=None, run_id=None):
     try:
         logger.info("Iniciando normalización inteligente")
         logger.info(f"Target column: {target_column}")
         
-        df = pd.read_json(StringIO(df_serialized), orient='split')
-        logger.info(f"DataFrame shape: {df.shape}")
-        logger.info(f"Columnas: {df.columns.tolist()}")
-        
-        # Detectar tipos de columnas
-        categoricas = detectar_columnas_categoricas(df, target_column)
-        binarias = detectar_columnas_binarias(df, target_column)
-        
-        # Combinar columnas que NO se deben normalizar
-        no_normalizar = set(categoricas + binarias)
-        
-        # Obtener columnas numéricas continuas para normalizar
-        columnas_numericas = df.select_dtypes(include=[np.number]).columns
-        columnas_a_normalizar = [col for col in columnas_numericas if col not in no_normalizar]
-        
-        logger.info(f"Columnas categóricas detectadas: {categoricas}")
-        logger.info(f"Columnas binarias detectadas: {binarias}")
-        logger.info(f"Columnas a normalizar: {columnas_a_normalizar}")
-        logger.info(f"Columnas NO normalizadas: {list(no_normalizar)}")
-        
-        # Normalizar solo las columnas apropiadas
-        if columnas_a_normalizar:
-            df_normalized = df.copy()
-            scaler = StandardScaler()
-            df_normalized[columnas_a_normalizar] = scaler.fit_transform(df[columnas_a_normalizar])
-            logger.info(f"Normalizadas {len(columnas_a_normalizar)} columnas")
-            return df_normalized.to_json(orient='split')
-        else:
-            logger.info("No hay columnas para normalizar")
-            return df.to_json(orient='split')
+        with etapa('normalizacion', csv_id, run_id) as medicion:
+            df = cargar_artefacto(artefacto)
+            df_normalized = normalizar(df, target_column)
+            medicion.formas(df, df_normalized)
+            if df_normalized is df:
+                return artefacto
+            return guardar_siguiente_artefacto(df_normalized, artefacto, 'normalizacion')
         
     except Exception as e:
         logger.error(f"Error en normalización: {str(e)}")
-        raise Exception("Error en normalización inteligente")
\ No newline at end of file
+        registrar_fallo_etapa(csv_id, 'normalizacion', e, run_id)
+        raise Exception("Error en normalización inteligente")
@@ -1,29 +1,43 @@
 import numpy as np
 from celery import shared_task
 from .base_imports import *
-from io import StringIO
-from scipy import stats
+from PreprocessingApp.utils.artifact_utils import cargar_artefacto, guardar_siguiente_artefacto
+from PreprocessingApp.tasks.telemetria import etapa, registrar_fallo_etapa
+from PreprocessingApp.utils.outlier_utils import METODO_IQR, desempaquetar_mascara, detectar_outliers
+from PreprocessingApp.utils.parallel_utils import ejecutar_por_columnas, usar_paralelo
+
+def _mascara_iqr(df_num):
+    """Filas válidas (empaquetadas en bits) según los límites IQR 0.15/0.85 de cada columna"""
+    return detectar_outliers(df_num, METODO_IQR, cuantiles_iqr=(0.15, 0.85))['filas_validas']
+
+def eliminar_outliers(df):
+    """Elimina las filas con algún valor fuera de los límites IQR (cuantiles 0.15/0.85)"""
+    df_num = df.select_dtypes(include=[np.number])
+    if df_num.shape[1] == 0:
+        logger.info("No hay columnas numéricas para eliminar outliers.")
+        return df
+    if usar_paralelo(df_num.shape[1]):
+        # Cada worker devuelve la máscara empaquetada de sus columnas; una fila queda si pasa en todas
+        empaquetada = np.bitwise_and.reduce(ejecutar_por_columnas(df_num, _mascara_iqr))
+    else:
+        empaquetada = _mascara_iqr(df_num)
+    mask = desempaquetar_mascara(empaquetada, len(df_num))
+    df_cleaned = df[mask]
+    logger.info(f"Filas antes: {len(df)}, después de IQR: {len(df_cleaned)}")
+    return df_cleaned
 
 @shared_task
-def preprocesar_outliers(df_serialized):
+def preprocesar_outliers(artefacto, csv_id=None, run_id=None):
     try:
         logger.info(f"Iniciando eliminación de outliers (IQR)")
-        df = pd.read_json(StringIO(df_serialized), orient='split')
-        df_num = df.select_dtypes(include=[np.number])
-        if df_num.shape[1] == 0:
-            logger.info("No hay columnas numéricas para eliminar outliers.")
-            return df.to_json(orient='split')
-        mask = np.ones(len(df), dtype=bool)
-        for col in df_num.columns:
-            q1 = df[col].quantile(0.15)
-            q3 = df[col].quantile(0.85)
-            iqr = q3 - q1
-            lower = q1 - 1.5 * iqr
-            upper = q3 + 1.5 * iqr
-            mask &= (df[col] >= lower) & (df[col] <= upper)
-        df_cleaned = df[mask]
-        logger.info(f"Filas antes: {len(df)}, después de IQR: {len(df_cleaned)}")
-        return df_cleaned.to_json(orient='split')
+        with etapa('outliers', csv_id, run_id) as medicion:
+            df = cargar_artefacto(artefacto)
+            df_cleaned = eliminar_outliers(df)
+            medicion.formas(df, df_cleaned)
+            if df_cleaned is df:
+                return artefacto
+            return guardar_siguiente_artefacto(df_cleaned, artefacto, 'outliers')
     except Exception as e:
         logger.error(f"Error en eliminación de outliers: {str(e)}")
-        raise Exception("Error en eliminación de outliers")
\ No newline at end of file
+        registrar_fallo_etapa(csv_id, 'outliers', e, run_id)
+        raise Exception("Error en eliminación de outliers")
@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+import time
+from django.conf import settings
+from .base_imports import logger
+from PreprocessingApp.tasks.telemetria import etapa
+from PreprocessingApp.tasks.transformacion import transformar
+from PreprocessingApp.tasks.registros_duplicados import eliminar_duplicados
+from PreprocessingApp.tasks.imputacion import imputar
+from PreprocessingApp.tasks.outliers import eliminar_outliers
+from PreprocessingApp.tasks.normalizacion import normalizar
+
+MODO_INLINE = 'inline'
+MODO_CADENA = 'cadena'
+MODO_BLOQUES = 'bloques'
+MODO_SHARDS = 'shards'
+
+# Subirla al cambiar el comportamiento de cualquier etapa: invalida la caché de resultados
+VERSION_PIPELINE = 1
+
+# Mismo orden que la cadena de Celery de procesar_csv
+ETAPAS = [
+    ('transformacion', lambda df, target_column: transformar(df, target_column)),
+    ('duplicados', lambda df, target_column: eliminar_duplicados(df)),
+    ('imputacion', lambda df, target_column: imputar(df)),
+    ('outliers', lambda df, target_column: eliminar_outliers(df)),
+    ('normalizacion', lambda df, target_column: normalizar(df, target_column)),
+]
+
+
+def elegir_modo(csv_path):
+    """
+    Archivos chicos se procesan inline, los medianos con la cadena de tareas y
+    los que no entran en memoria por shards repartidos entre workers (ver
+    shards.py) o por bloques en un solo worker (ver streaming.py)
+    """
+    tamano = os.path.getsize(csv_path)
+    if tamano <= settings.PREPROCESSING_INLINE_MAX_BYTES:
+        return MODO_INLINE
+    if tamano >= settings.PREPROCESSING_STREAMING_MIN_BYTES:
+        return MODO_SHARDS if settings.PREPROCESSING_USE_SHARDS else MODO_BLOQUES
+    return MODO_CADENA
+
+
+def clave_resultado(content_hash, target_column, drop_columns, processing_type):
+    """
+    Clave de la caché de resultados: el mismo contenido con la misma
+    configuración del pipeline produce el mismo csv_procesado.csv
+    """
+    configuracion = {
+        'contenido': content_hash,
+        'target_column': target_column,
+        'drop_columns': sorted(set(drop_columns)),
+        'processing_type': processing_type,
+        'version': VERSION_PIPELINE,
+        'etapas': [nombre for nombre, _ in ETAPAS],
+        'cuantiles': settings.PREPROCESSING_QUANTILES,
+        'tipos_compactos': settings.PREPROCESSING_COMPACT_DTYPES,
+    }
+    return hashlib.sha256(json.dumps(configuracion, sort_keys=True).encode()).hexdigest()
+
+
+def ejecutar_etapa(nombre, funcion, df, target_column=None):
+    """Ejecuta una etapa y devuelve el resultado junto con su tiempo y forma de entrada/salida"""
+    filas_entrada, columnas_entrada = df.shape
+    inicio = time.perf_counter()
+    df_salida = funcion(df, target_column)
+    segundos = time.perf_counter() - inicio
+    registro = {
+        'etapa': nombre,
+        'segundos': segundos,
+        'filas_entrada': filas_entrada,
+        'columnas_entrada': columnas_entrada,
+        'filas_salida': df_salida.shape[0],
+        'columnas_salida': df_salida.shape[1],
+    }
+    logger.info(
+        f"Etapa {nombre}: {segundos:.3f}s, "
+        f"{filas_entrada}x{columnas_entrada} -> {df_salida.shape[0]}x{df_salida.shape[1]}"
+    )
+    return df_salida, registro
+
+
+def ejecutar_pipeline(df, target_column=None, csv_id=None, run_id=None):
+    """
+    Ejecuta todas las etapas en memoria sobre un único DataFrame, sin pasar
+    por el broker. Devuelve el DataFrame final y el registro de cada etapa.
+    Con csv_id publica el progreso al terminar cada etapa y con run_id la
+    registra como StageRun (ver telemetria.py).
+    """
+    registros = []
+    for nombre, funcion in ETAPAS:
+        with etapa(nombre, csv_id, run_id) as medicion:
+            df_salida, registro = ejecutar_etapa(nombre, funcion, df, target_column)
+            medicion.formas(df, df_salida)
+        df = df_salida
+        registros.append(registro)
+    return df, registros
@@ -0,0 +1,41 @@
+"""
+Eventos de progreso de las etapas del pipeline (ver utils/progreso_utils.py).
+
+El porcentaje de cada etapa sale de su posición en ETAPAS: 0 al empezar, una
+fracción igual por etapa y 100 recién cuando el csv_procesado.csv está guardado.
+"""
+from PreprocessingApp.utils.progreso_utils import ESTADO_ERROR, ESTADO_LISTO, publicar_progreso
+
+ETAPA_INICIO = 'inicio'
+ETAPA_FIN = 'fin'
+# Primera pasada de los modos por bloques y por shards: parámetros globales ya calculados
+ETAPA_ESTADISTICAS = 'estadisticas'
+
+
+def porcentaje_etapa(nombre):
+    # pipeline importa los módulos de las etapas, que a su vez importan este
+    from PreprocessingApp.tasks.pipeline import ETAPAS
+    nombres = [etapa for etapa, _ in ETAPAS]
+    return round(100 * (nombres.index(nombre) + 1) / (len(nombres) + 1))
+
+
+def publicar_inicio(csv_id, filas_entrada=None):
+    return publicar_progreso(csv_id, ETAPA_INICIO, 0, filas_entrada=filas_entrada)
+
+
+def publicar_etapa(csv_id, nombre, filas_entrada=None, filas_salida=None, porcentaje=None):
+    """Evento al terminar una etapa; sin csv_id (tareas lanzadas fuera de procesar_csv) no publica nada"""
+    if csv_id is None:
+        return None
+    porcentaje = porcentaje_etapa(nombre) if porcentaje is None else porcentaje
+    return publicar_progreso(csv_id, nombre, porcentaje, filas_entrada=filas_entrada, filas_salida=filas_salida)
+
+
+def publicar_fin(csv_id, filas_salida=None):
+    return publicar_progreso(csv_id, ETAPA_FIN, 100, ESTADO_LISTO, filas_salida=filas_salida)
+
+
+def publicar_error(csv_id, error, etapa=None):
+    if csv_id is None:
+        return None
+    return publicar_progreso(csv_id, etapa or ETAPA_FIN, None, ESTADO_ERROR, error=str(error))
@@ -1,142 +1,236 @@
 from celery import shared_task
 import pandas as pd
 from .base_imports import *
-from io import StringIO
+from PreprocessingApp.tasks.telemetria import etapa, registrar_fallo_etapa
+from PreprocessingApp.tasks.streaming import FiltroDuplicados
+from PreprocessingApp.utils.artifact_utils import (
+    cargar_artefacto,
+    esquema_artefacto,
+    guardar_artefacto_por_bloques,
+    guardar_siguiente_artefacto,
+    leer_artefacto_por_bloques,
+)
+from PreprocessingApp.utils.hash_utils import (
+    codigos_filas,
+    columnas_duplicadas,
+    filas_duplicadas,
+    hash_filas_normalizadas,
+    huellas_columnas,
+    series_iguales,
+)
+
+def eliminar_duplicados(df):
+    """Elimina columnas completamente duplicadas y filas duplicadas (keep='first')"""
+    filas_originales = len(df)
+    columnas_originales = len(df.columns)
+    
+    logger.info(f"DataFrame inicial: {filas_originales} filas, {columnas_originales} columnas")
+
+    # 1. Eliminar columnas completamente duplicadas (por huella, sin transponer)
+    df_sin_cols_dup = df.loc[:, ~columnas_duplicadas(df)]
+    columnas_eliminadas = columnas_originales - len(df_sin_cols_dup.columns)
+    
+    if columnas_eliminadas > 0:
+        logger.info(f"Columnas duplicadas eliminadas: {columnas_eliminadas}")
+    
+    # 2. Eliminar filas duplicadas
+    # Un solo hash por fila sirve para contar y para eliminar (keep='first')
+    duplicadas = filas_duplicadas(codigos_filas(df_sin_cols_dup))
+    df_final = df_sin_cols_dup[~duplicadas]
+    
+    filas_finales = len(df_final)
+    filas_eliminadas = filas_originales - filas_finales
+    
+    logger.info(f"Filas duplicadas identificadas: {int(duplicadas.sum())}")
+    logger.info(f"Filas eliminadas: {filas_eliminadas}")
+    logger.info(f"DataFrame final: {filas_finales} filas, {len(df_final.columns)} columnas")
+    
+    # Verificar que el DataFrame no esté vacío
+    if df_final.empty:
+        logger.warning("El DataFrame quedó vacío después de eliminar duplicados")
+        # Devolver el DataFrame original si el resultado está vacío
+        logger.info("Devolviendo DataFrame original para evitar pérdida total de datos")
+        return df
+    
+    # Verificar que tengamos al menos algunas filas
+    if len(df_final) < 2:
+        logger.warning(f"Solo quedan {len(df_final)} filas después de eliminar duplicados")
+    
+    logger.info(f"Columnas resultantes después de eliminar duplicados: {df_final.columns.tolist()}")
+    return df_final
+
+def _columnas_sin_duplicar_por_bloques(artefacto, chunk_size):
+    """
+    Columnas que quedan después de quitar las duplicadas, sin cargar el artefacto:
+    las huellas se suman bloque a bloque y solo las columnas con huella repetida
+    se comparan en una segunda pasada que lee únicamente esas columnas.
+    """
+    huellas = {}
+    desplazamiento = 0
+    for bloque in leer_artefacto_por_bloques(artefacto, chunk_size=chunk_size):
+        for col, huella in huellas_columnas(bloque, desplazamiento).items():
+            huellas[col] = (huellas.get(col, 0) + huella) % 2**64
+        desplazamiento += len(bloque)
+
+    # Candidata a duplicada -> primera columna con su misma huella
+    primeras = {}
+    candidatas = {}
+    for col, huella in huellas.items():
+        if huella in primeras:
+            candidatas[col] = primeras[huella]
+        else:
+            primeras[huella] = col
+
+    duplicadas = set()
+    if candidatas:
+        iguales = dict.fromkeys(candidatas, True)
+        a_leer = [col for col in huellas if col in candidatas or col in candidatas.values()]
+        for bloque in leer_artefacto_por_bloques(artefacto, a_leer, chunk_size):
+            for col, primera in candidatas.items():
+                iguales[col] = iguales[col] and series_iguales(bloque[col], bloque[primera])
+        duplicadas = {col for col, igual in iguales.items() if igual}
+    return [col for col in huellas if col not in duplicadas]
+
+
+def eliminar_duplicados_por_bloques(artefacto, chunk_size=100_000):
+    """
+    eliminar_duplicados para artefactos que no entran en memoria: recorre el
+    Parquet por bloques y filtra las filas ya vistas con un conjunto de hashes
+    acotado en memoria que se vuelca a disco (ver dedup_utils.py).
+    """
+    columnas = _columnas_sin_duplicar_por_bloques(artefacto, chunk_size)
+    logger.info(f"Columnas duplicadas eliminadas: {len(artefacto['esquema']) - len(columnas)}")
+    directorio = os.path.dirname(artefacto['path'])
+
+    with FiltroDuplicados(directorio=os.path.join(directorio, 'dedup')) as duplicados:
+        bloques = (
+            duplicados.filtrar(bloque, hash_filas_normalizadas(bloque))
+            for bloque in leer_artefacto_por_bloques(artefacto, columnas, chunk_size)
+        )
+        resultado = guardar_artefacto_por_bloques(
+            bloques, directorio, 'duplicados', esquema_artefacto(artefacto, columnas)
+        )
+    logger.info(f"Filas eliminadas: {artefacto['filas'] - resultado['filas']}")
+    return resultado
+
 
 @shared_task
-def preprocesar_duplicados(df_serialized):
+def preprocesar_duplicados(artefacto, csv_id=None, run_id=None):
     try:
         logger.info(f"Iniciando eliminación de duplicados")
 
-        # Convertir el string JSON en DataFrame
-        df = pd.read_json(StringIO(df_serialized), orient='split')
-        
-        filas_originales = len(df)
-        columnas_originales = len(df.columns)
-        
-        logger.info(f"DataFrame inicial: {filas_originales} filas, {columnas_originales} columnas")
+        with etapa('duplicados', csv_id, run_id) as medicion:
+            # Si los hashes de todas las filas no entran en el presupuesto de memoria, por bloques
+            if artefacto['filas'] * 8 > settings.PREPROCESSING_DEDUP_MEMORY_BYTES:
+                resultado = eliminar_duplicados_por_bloques(artefacto, settings.PREPROCESSING_CHUNK_SIZE)
+                medicion.filas_entrada, medicion.filas_salida = artefacto['filas'], resultado['filas']
+                return resultado
 
-        # 1. Eliminar columnas completamente duplicadas
-        df_sin_cols_dup = df.loc[:, ~df.T.duplicated()]
-        columnas_eliminadas = columnas_originales - len(df_sin_cols_dup.columns)
-        
-        if columnas_eliminadas > 0:
-            logger.info(f"Columnas duplicadas eliminadas: {columnas_eliminadas}")
-        
-        # 2. Eliminar filas duplicadas
-        # Primero identificar duplicados para logging
-        filas_duplicadas = df_sin_cols_dup.duplicated().sum()
-        
-        # Eliminar filas duplicadas manteniendo la primera ocurrencia
-        df_final = df_sin_cols_dup.drop_duplicates(keep='first')
-        
-        filas_finales = len(df_final)
-        filas_eliminadas = filas_originales - filas_finales
-        
-        logger.info(f"Filas duplicadas identificadas: {filas_duplicadas}")
-        logger.info(f"Filas eliminadas: {filas_eliminadas}")
-        logger.info(f"DataFrame final: {filas_finales} filas, {len(df_final.columns)} columnas")
-        
-        # Verificar que el DataFrame no esté vacío
-        if df_final.empty:
-            logger.warning("El DataFrame quedó vacío después de eliminar duplicados")
-            # Devolver el DataFrame original si el resultado está vacío
-            logger.info("Devolviendo DataFrame original para evitar pérdida total de datos")
-            return df.to_json(orient='split')
-        
-        # Verificar que tengamos al menos algunas filas
-        if len(df_final) < 2:
-            logger.warning(f"Solo quedan {len(df_final)} filas después de eliminar duplicados")
-        
-        logger.info(f"Eliminación de duplicados completada para CSV")
-        logger.info(f"Columnas resultantes después de eliminar duplicados: {df_final.columns.tolist()}")
-        
-        return df_final.to_json(orient='split')
+            # Cargar el DataFrame desde el artefacto
+            df = cargar_artefacto(artefacto)
+            df_final = eliminar_duplicados(df)
+            medicion.formas(df, df_final)
+            if df_final is df:
+                return artefacto
+
+            logger.info(f"Eliminación de duplicados completada para CSV")
+            return guardar_siguiente_artefacto(df_final, artefacto, 'duplicados')
         
     except Exception as e:
         logger.error(f"Error en eliminación de duplicados: {str(e)}")
+        registrar_fallo_etapa(csv_id, 'duplicados', e, run_id)
         raise Exception("Error en eliminación de duplicados")
 
 
-@shared_task
-def preprocesar_duplicados_avanzado(df_serialized, eliminar_filas=True, eliminar_columnas=True, 
-                                   subset_columns=None, keep_strategy='first'):
+def eliminar_duplicados_avanzado(df, eliminar_filas=True, eliminar_columnas=True,
+                                 subset_columns=None, keep_strategy='first'):
     """
     Versión avanzada de eliminación de duplicados con más opciones de configuración
     
     Args:
-        df_serialized: DataFrame serializado en JSON
+        df: DataFrame de entrada
         eliminar_filas: Bool, si eliminar filas duplicadas
         eliminar_columnas: Bool, si eliminar columnas duplicadas
         subset_columns: Lista de columnas a considerar para duplicados de filas (None = todas)
         keep_strategy: 'first', 'last' o False (eliminar todas las duplicadas)
     """
+    filas_originales = len(df)
+    columnas_originales = len(df.columns)
+    
+    logger.info(f"DataFrame inicial: {filas_originales} filas, {columnas_originales} columnas")
+
+    df_resultado = df.copy()
+
+    # 1. Eliminar columnas duplicadas si está habilitado
+    if eliminar_columnas:
+        df_resultado = df_resultado.loc[:, ~columnas_duplicadas(df_resultado)]
+        columnas_eliminadas = columnas_originales - len(df_resultado.columns)
+        
+        if columnas_eliminadas > 0:
+            logger.info(f"Columnas duplicadas eliminadas: {columnas_eliminadas}")
+            cols_restantes = df_resultado.columns.tolist()
+            logger.info(f"Columnas restantes: {cols_restantes}")
+
+    # 2. Eliminar filas duplicadas si está habilitado
+    if eliminar_filas:
+        # Determinar columnas a considerar para duplicados
+        columns_to_check = subset_columns if subset_columns else None
+        
+        if columns_to_check:
+            # Verificar que las columnas existan en el DataFrame
+            columns_to_check = [col for col in columns_to_check if col in df_resultado.columns]
+            if not columns_to_check:
+                logger.warning("Ninguna de las columnas especificadas existe en el DataFrame")
+                columns_to_check = None
+        
+        # Las filas se hashean una vez; el conteo y la eliminación reutilizan los códigos
+        codigos = codigos_filas(df_resultado[columns_to_check] if columns_to_check else df_resultado)
+        filas_repetidas = int(filas_duplicadas(codigos, keep=False).sum())
+        df_resultado = df_resultado[~filas_duplicadas(codigos, keep=keep_strategy)]
+        
+        filas_finales = len(df_resultado)
+        filas_eliminadas = filas_originales - filas_finales
+        
+        logger.info(f"Filas duplicadas identificadas: {filas_repetidas}")
+        logger.info(f"Filas eliminadas: {filas_eliminadas}")
+
+    logger.info(f"DataFrame final: {len(df_resultado)} filas, {len(df_resultado.columns)} columnas")
+    
+    # Verificaciones de seguridad
+    if df_resultado.empty:
+        logger.warning("El DataFrame quedó vacío después de eliminar duplicados")
+        logger.info("Devolviendo DataFrame original para evitar pérdida total de datos")
+        return df
+    
+    if len(df_resultado) < 2:
+        logger.warning(f"Solo quedan {len(df_resultado)} filas después de eliminar duplicados")
+    
+    return df_resultado
+
+
+@shared_task
+def preprocesar_duplicados_avanzado(artefacto, eliminar_filas=True, eliminar_columnas=True, 
+                                   subset_columns=None, keep_strategy='first'):
+    """
+    Tarea Celery de eliminar_duplicados_avanzado sobre un artefacto (ver artifact_utils)
+    """
     try:
         logger.info(f"Iniciando eliminación avanzada de duplicados")
         logger.info(f"Parámetros: filas={eliminar_filas}, columnas={eliminar_columnas}, "
                    f"subset={subset_columns}, keep={keep_strategy}")
 
-        # Convertir el string JSON en DataFrame
-        df = pd.read_json(StringIO(df_serialized), orient='split')
-        
-        filas_originales = len(df)
-        columnas_originales = len(df.columns)
-        
-        logger.info(f"DataFrame inicial: {filas_originales} filas, {columnas_originales} columnas")
-
-        df_resultado = df.copy()
-
-        # 1. Eliminar columnas duplicadas si está habilitado
-        if eliminar_columnas:
-            df_resultado = df_resultado.loc[:, ~df_resultado.T.duplicated()]
-            columnas_eliminadas = columnas_originales - len(df_resultado.columns)
-            
-            if columnas_eliminadas > 0:
-                logger.info(f"Columnas duplicadas eliminadas: {columnas_eliminadas}")
-                cols_restantes = df_resultado.columns.tolist()
-                logger.info(f"Columnas restantes: {cols_restantes}")
-
-        # 2. Eliminar filas duplicadas si está habilitado
-        if eliminar_filas:
-            # Determinar columnas a considerar para duplicados
-            columns_to_check = subset_columns if subset_columns else None
-            
-            if columns_to_check:
-                # Verificar que las columnas existan en el DataFrame
-                columns_to_check = [col for col in columns_to_check if col in df_resultado.columns]
-                if not columns_to_check:
-                    logger.warning("Ninguna de las columnas especificadas existe en el DataFrame")
-                    columns_to_check = None
-            
-            # Contar duplicados antes de eliminar
-            if columns_to_check:
-                filas_duplicadas = df_resultado.duplicated(subset=columns_to_check, keep=False).sum()
-                df_resultado = df_resultado.drop_duplicates(subset=columns_to_check, keep=keep_strategy)
-            else:
-                filas_duplicadas = df_resultado.duplicated(keep=False).sum()
-                df_resultado = df_resultado.drop_duplicates(keep=keep_strategy)
-            
-            filas_finales = len(df_resultado)
-            filas_eliminadas = filas_originales - filas_finales
-            
-            logger.info(f"Filas duplicadas identificadas: {filas_duplicadas}")
-            logger.info(f"Filas eliminadas: {filas_eliminadas}")
-
-        logger.info(f"DataFrame final: {len(df_resultado)} filas, {len(df_resultado.columns)} columnas")
-        
-        # Verificaciones de seguridad
-        if df_resultado.empty:
-            logger.warning("El DataFrame quedó vacío después de eliminar duplicados")
-            logger.info("Devolviendo DataFrame original para evitar pérdida total de datos")
-            return df.to_json(orient='split')
-        
-        if len(df_resultado) < 2:
-            logger.warning(f"Solo quedan {len(df_resultado)} filas después de eliminar duplicados")
+        # Cargar el DataFrame desde el artefacto
+        df = cargar_artefacto(artefacto)
+        df_resultado = eliminar_duplicados_avanzado(
+            df, eliminar_filas, eliminar_columnas, subset_columns, keep_strategy
+        )
+        if df_resultado is df:
+            return artefacto
         
         logger.info(f"Eliminación avanzada de duplicados completada")
         
-        return df_resultado.to_json(orient='split')
+        return guardar_siguiente_artefacto(df_resultado, artefacto, 'duplicados')
         
     except Exception as e:
         logger.error(f"Error en eliminación avanzada de duplicados: {str(e)}")
-        raise Exception("Error en eliminación avanzada de duplicados")
\ No newline at end of file
+        raise Exception("Error en eliminación avanzada de duplicados")
@@ -0,0 +1,306 @@
+"""
+Procesamiento por shards de filas con chords de Celery, para archivos enormes.
+
+El CSV original se parte en rangos de bytes alineados a saltos de línea (se
+asume que ningún campo entre comillas contiene saltos de línea). Fase 1: un
+group calcula en paralelo las estadísticas de cada shard (esquema, huellas de
+columnas, muestra, sketches y hashes de filas) y las deja en la carpeta
+shards/<run_id>/, propia de la ejecución. El callback del chord las une, deriva los parámetros globales del
+pipeline y marca qué filas de cada shard ya aparecieron en shards anteriores:
+recorre por lotes las corridas de hashes de cada shard contra un ConjuntoHashes
+global, así que la memoria queda acotada por PREPROCESSING_DEDUP_MEMORY_BYTES
+y no por la cantidad de filas únicas del archivo.
+Fase 2: otro group aplica los parámetros a cada shard y el callback final
+concatena las salidas en csv_procesado.csv. Si un shard falla, la tarea
+registra el error en el CSV y el errback de ambos chords (registrar_fallo_shards)
+borra la carpeta de la ejecución; las de otras ejecuciones del mismo CSV no se tocan.
+
+La salida elimina los duplicados globalmente con keep='first'. Las filas
+repetidas entre shards se quitan también de la muestra mientras esta contenga
+todas las filas del shard; en los sketches y en la muestra ya llena siguen
+contando, lo que solo afecta a parámetros que de por sí son aproximados.
+"""
+import io
+import os
+import pickle
+import shutil
+import sys
+import uuid
+import pandas as pd
+from celery import chord, group, shared_task
+from .base_imports import logger
+from PreprocessingApp.models import CSVModel, ProcessingRun
+from PreprocessingApp.tasks.actualizar_estado_csv import (
+    guardar_resumenes_por_bloques,
+    marcar_procesado,
+    registrar_error,
+    ruta_csv_procesado,
+)
+from PreprocessingApp.tasks.progreso import ETAPA_ESTADISTICAS, publicar_etapa
+from PreprocessingApp.tasks.telemetria import etapa
+from PreprocessingApp.utils.dedup_utils import ConjuntoHashes, recorrer_corrida
+from PreprocessingApp.utils.upload_utils import columnas_a_eliminar
+from PreprocessingApp.tasks.streaming import (
+    EstadisticasBloques,
+    FiltroDuplicados,
+    ResumenPorBloques,
+    aplicar_a_bloque,
+    convertir_bloque,
+    derivar_parametros,
+)
+
+NOMBRE_CARPETA_SHARDS = 'shards'
+
+
+def directorio_shards(csv_path, ejecucion=None):
+    """
+    Carpeta de archivos intermedios de una ejecución (run_id) junto al
+    csv_original.csv: shards/<ejecucion>/. Sin ejecucion se usa un identificador nuevo.
+    """
+    ejecucion = uuid.uuid4().hex if ejecucion is None else str(ejecucion)
+    return os.path.join(os.path.dirname(csv_path), NOMBRE_CARPETA_SHARDS, ejecucion)
+
+
+def eliminar_directorio_shards(directorio):
+    """Borra la carpeta de la ejecución, y shards/ si no quedan otras ejecuciones en curso"""
+    shutil.rmtree(directorio, ignore_errors=True)
+    padre = os.path.dirname(directorio)
+    if os.path.basename(padre) == NOMBRE_CARPETA_SHARDS:
+        try:
+            os.rmdir(padre)
+        except OSError:
+            # Otra ejecución del mismo CSV sigue usando su carpeta
+            pass
+
+
+def dividir_en_shards(path, tamano_shard):
+    """Rangos de bytes [inicio, fin) de unos tamano_shard bytes, alineados a fin de línea y sin el encabezado"""
+    tamano = os.path.getsize(path)
+    rangos = []
+    with open(path, 'rb') as f:
+        f.readline()
+        inicio = f.tell()
+        while inicio < tamano:
+            f.seek(min(inicio + tamano_shard, tamano))
+            f.readline()
+            fin = f.tell()
+            rangos.append((inicio, fin))
+            inicio = fin
+    return rangos
+
+
+def leer_shard(path, inicio, fin, nombres, columnas, chunk_size):
+    with open(path, 'rb') as f:
+        f.seek(inicio)
+        datos = f.read(fin - inicio)
+    return pd.read_csv(io.BytesIO(datos), header=None, names=nombres, usecols=columnas, chunksize=chunk_size)
+
+
+def _ejecutar(firma):
+    if 'test' in sys.argv:
+        return firma.apply()
+    return firma.apply_async()
+
+
+def _ruta(directorio, nombre, indice, extension=None):
+    return os.path.join(directorio, f'{nombre}_{indice}.{extension}' if extension else f'{nombre}_{indice}')
+
+
+def _corridas(directorio):
+    """Las corridas .npy que dejó conservar_corridas en `directorio`, en orden"""
+    if not os.path.isdir(directorio):
+        return []
+    nombres = sorted(nombre for nombre in os.listdir(directorio) if nombre.endswith('.npy'))
+    return [os.path.join(directorio, nombre) for nombre in nombres]
+
+
+@shared_task
+def estadisticas_shard(path, indice, inicio, fin, nombres, columnas, directorio, config, csv_id=None):
+    """Fase 1: estadísticas de un shard, guardadas en disco (solo viajan las rutas)"""
+    try:
+        estadisticas = EstadisticasBloques(
+            columnas, config['tamano_muestra'], config['modo_cuantiles'], config['error_cuantiles'], semilla=indice,
+            target_column=config.get('target_column'),
+        )
+        # Posiciones únicas por shard para que las huellas de columnas no choquen entre shards
+        desplazamiento = indice << 40
+        path_estadisticas = _ruta(directorio, 'estadisticas', indice, 'pkl')
+        path_resumen = _ruta(directorio, 'resumen_original', indice, 'pkl')
+        resumen = ResumenPorBloques(config['tamano_resumen'], semilla=[0, indice])
+        with etapa('shard_estadisticas', run_id=config.get('run_id')) as medicion:
+            with FiltroDuplicados(directorio=_ruta(directorio, 'hashes', indice)) as duplicados:
+                for bloque in leer_shard(path, inicio, fin, nombres, columnas, config['chunk_size']):
+                    resumen.agregar(bloque)
+                    convertido = convertir_bloque(bloque)
+                    estadisticas.agregar_esquema(bloque, convertido, desplazamiento + estadisticas.filas_leidas)
+                    estadisticas.agregar_filas(duplicados.filtrar(convertido))
+                # Quedan en disco como corridas ordenadas para el callback
+                corridas = duplicados.vistos.conservar_corridas()
+            with open(path_estadisticas, 'wb') as f:
+                pickle.dump(estadisticas, f)
+            with open(path_resumen, 'wb') as f:
+                pickle.dump(resumen, f)
+            medicion.filas_entrada, medicion.filas_salida = estadisticas.filas_leidas, estadisticas.filas_unicas
+        logger.info(f"Shard {indice}: {estadisticas.filas_leidas} filas, {estadisticas.filas_unicas} únicas")
+        return {'indice': indice, 'estadisticas': path_estadisticas, 'hashes': corridas, 'resumen': path_resumen}
+    except Exception as e:
+        logger.error(f"Error en estadísticas del shard {indice} para CSV ID {csv_id}: {str(e)}")
+        if csv_id is not None:
+            registrar_error(csv_id, e, config.get('run_id'))
+        raise
+
+
+@shared_task
+def combinar_estadisticas_shards(resultados, csv_id, path, rangos, nombres, columnas, directorio, config):
+    """Callback de la fase 1: parámetros globales, duplicados entre shards y lanzamiento de la fase 2"""
+    try:
+        obj = CSVModel.objects.get(id=csv_id)
+        resultados = sorted(resultados, key=lambda resultado: resultado['indice'])
+
+        estadisticas = None
+        resumen = ResumenPorBloques(config['tamano_resumen'])
+        with ConjuntoHashes(directorio=os.path.join(directorio, 'hashes_global')) as vistos:
+            for resultado in resultados:
+                with open(resultado['estadisticas'], 'rb') as f:
+                    parcial = pickle.load(f)
+                # Filas de este shard que ya aparecieron en uno anterior. Las corridas
+                # de un shard son disjuntas, así que sus hashes nuevos se agregan enseguida
+                with ConjuntoHashes(directorio=_ruta(directorio, 'repetidos', resultado['indice'])) as repetidos:
+                    for corrida in resultado['hashes']:
+                        for lote in recorrer_corrida(corrida):
+                            presentes = vistos.contiene(lote)
+                            repetidos.agregar(lote[presentes])
+                            vistos.agregar(lote[~presentes])
+                            parcial.muestra.descartar(lote[presentes])
+                        os.remove(corrida)
+                    parcial.filas_unicas -= len(repetidos)
+                    repetidos.conservar_corridas()
+                estadisticas = parcial if estadisticas is None else estadisticas.merge(parcial)
+                with open(resultado['resumen'], 'rb') as f:
+                    resumen.merge(pickle.load(f))
+
+        if estadisticas is None:
+            estadisticas = EstadisticasBloques(columnas, config['tamano_muestra'], config['modo_cuantiles'])
+        parametros = derivar_parametros(estadisticas, obj.target_column)
+        path_parametros = os.path.join(directorio, 'parametros.pkl')
+        with open(path_parametros, 'wb') as f:
+            pickle.dump(parametros, f)
+        # Resumen del original, para guardarlo junto con el del procesado al terminar
+        resumen.filas_duplicadas = estadisticas.filas_leidas - estadisticas.filas_unicas
+        with open(os.path.join(directorio, 'resumen_original.pkl'), 'wb') as f:
+            pickle.dump(resumen, f)
+        publicar_etapa(csv_id, ETAPA_ESTADISTICAS, estadisticas.filas_leidas, estadisticas.filas_unicas, porcentaje=50)
+
+        fase_2 = chord(
+            group(
+                aplicar_shard.s(path, indice, inicio, fin, nombres, columnas, directorio, config, csv_id)
+                for indice, (inicio, fin) in enumerate(rangos)
+            ),
+            concatenar_shards.s(csv_id, parametros['columnas'], directorio, config.get('run_id')),
+        ).on_error(registrar_fallo_shards.s(csv_id, directorio, config.get('run_id')))
+        _ejecutar(fase_2)
+        return csv_id
+    except Exception as e:
+        logger.error(f"Error combinando estadísticas de shards para CSV ID {csv_id}: {str(e)}")
+        registrar_error(csv_id, e, config.get('run_id'))
+        raise
+
+
+@shared_task
+def aplicar_shard(path, indice, inicio, fin, nombres, columnas, directorio, config, csv_id=None):
+    """Fase 2: aplica los parámetros globales a un shard y escribe su salida sin encabezado"""
+    try:
+        with open(os.path.join(directorio, 'parametros.pkl'), 'rb') as f:
+            parametros = pickle.load(f)
+        path_salida = _ruta(directorio, 'procesado', indice, 'csv')
+        path_resumen = _ruta(directorio, 'resumen_procesado', indice, 'pkl')
+        resumen = ResumenPorBloques(config['tamano_resumen'], semilla=[1, indice])
+        with etapa('shard_aplicacion', run_id=config.get('run_id')) as medicion, \
+                FiltroDuplicados(directorio=_ruta(directorio, 'dedup', indice)) as duplicados, \
+                open(path_salida, 'w', newline='') as salida:
+            # Las filas que ya salen en un shard anterior cuentan como vistas
+            for corrida in _corridas(_ruta(directorio, 'repetidos', indice)):
+                for lote in recorrer_corrida(corrida):
+                    duplicados.vistos.agregar(lote)
+            medicion.filas_entrada = medicion.filas_salida = 0
+            for bloque in leer_shard(path, inicio, fin, nombres, columnas, config['chunk_size']):
+                medicion.filas_entrada += len(bloque)
+                procesado = aplicar_a_bloque(duplicados.filtrar(convertir_bloque(bloque)), parametros)
+                resumen.agregar(procesado)
+                medicion.filas_salida += len(procesado)
+                procesado.to_csv(salida, header=False, index=False)
+        with open(path_resumen, 'wb') as f:
+            pickle.dump(resumen, f)
+        return {'salida': path_salida, 'resumen': path_resumen}
+    except Exception as e:
+        logger.error(f"Error aplicando parámetros al shard {indice} para CSV ID {csv_id}: {str(e)}")
+        if csv_id is not None:
+            registrar_error(csv_id, e, config.get('run_id'))
+        raise
+
+
+@shared_task
+def registrar_fallo_shards(request, exc, traceback, csv_id, directorio, run_id=None):
+    """
+    Errback de los chords: un shard falló (o su worker murió) y el callback no
+    va a correr. Deja el CSV con el error si la tarea no llegó a registrarlo y
+    borra los archivos intermedios.
+    """
+    logger.error(f"Falló el procesamiento por shards del CSV ID {csv_id}: {str(exc)}")
+    try:
+        sin_registrar = ProcessingRun.objects.filter(id=run_id, status=ProcessingRun.STATUS_RUNNING).exists()
+        if sin_registrar or not CSVModel.objects.filter(id=csv_id).exclude(error_message=None).exists():
+            registrar_error(csv_id, exc, run_id)
+    finally:
+        eliminar_directorio_shards(directorio)
+
+
+@shared_task
+def concatenar_shards(resultados, csv_id, columnas, directorio, run_id=None):
+    """Callback de la fase 2: concatena las salidas en orden, guarda los resúmenes y marca el CSV como listo"""
+    try:
+        obj = CSVModel.objects.get(id=csv_id)
+        processed_file_path = ruta_csv_procesado(obj)
+        with open(os.path.join(directorio, 'resumen_original.pkl'), 'rb') as f:
+            resumen_original = pickle.load(f)
+        resumen_procesado = ResumenPorBloques(resumen_original.capacidad)
+        with open(processed_file_path, 'w', newline='') as salida:
+            pd.DataFrame(columns=columnas).to_csv(salida, index=False)
+            for resultado in resultados:
+                with open(resultado['salida'], 'r', newline='') as parte:
+                    shutil.copyfileobj(parte, salida)
+                with open(resultado['resumen'], 'rb') as f:
+                    resumen_procesado.merge(pickle.load(f))
+        eliminar_directorio_shards(directorio)
+        guardar_resumenes_por_bloques(obj, processed_file_path, resumen_original, resumen_procesado)
+        marcar_procesado(obj, processed_file_path, run_id)
+        logger.info(f"Procesamiento por shards completado para CSV ID: {csv_id}")
+        return csv_id
+    except Exception as e:
+        logger.error(f"Error concatenando shards para CSV ID {csv_id}: {str(e)}")
+        registrar_error(csv_id, e, run_id)
+        raise
+
+
+def lanzar_por_shards(obj, drop_column=None, tamano_shard=256 * 1024 * 1024, config=None):
+    """Parte el CSV en shards y lanza la fase 1 como chord"""
+    path = obj.file.path
+    # Cada shard valida la columna objetivo en su primera pasada (ver EstadisticasBloques)
+    config = {**(config or {}), 'target_column': obj.target_column}
+    # Carpeta propia de esta ejecución: otra del mismo CSV puede estar corriendo a la vez
+    directorio = directorio_shards(path, config.get('run_id'))
+    os.makedirs(directorio, exist_ok=True)
+    nombres = list(pd.read_csv(path, nrows=0).columns)
+    eliminar = columnas_a_eliminar(drop_column)
+    columnas = [col for col in nombres if col not in eliminar]
+    rangos = dividir_en_shards(path, tamano_shard)
+    logger.info(f"CSV ID {obj.id} dividido en {len(rangos)} shards")
+
+    fase_1 = chord(
+        group(
+            estadisticas_shard.s(path, indice, inicio, fin, nombres, columnas, directorio, config, obj.id)
+            for indice, (inicio, fin) in enumerate(rangos)
+        ),
+        combinar_estadisticas_shards.s(obj.id, path, rangos, nombres, columnas, directorio, config),
+    ).on_error(registrar_fallo_shards.s(obj.id, directorio, config.get('run_id')))
+    return _ejecutar(fase_1)
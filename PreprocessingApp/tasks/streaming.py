@@ -0,0 +1,395 @@
+"""
+Motor por bloques para CSVs más grandes que la memoria del worker.
+
+Primera pasada: recorre el archivo por bloques aplicando la transformación y la
+eliminación de filas duplicadas, y junta lo que necesitan las demás etapas
+(columnas a conservar, huellas de columnas duplicadas y una muestra reservorio
+de filas sobre la que se calculan medianas, límites IQR, columnas categóricas
+y media/desvío). En modo de cuantiles aproximados, medianas y límites IQR salen
+en cambio de un KLLSketch por columna alimentado con todas las filas. Segunda
+pasada: vuelve a leer el archivo y aplica esos parámetros bloque a bloque,
+escribiendo csv_procesado.csv de forma incremental.
+
+Las mismas pasadas juntan, con ResumenPorBloques, los resúmenes del original y
+del procesado que usan métricas y gráficos, sin volver a leer los archivos.
+
+La memoria queda acotada por el tamaño de bloque y el de las muestras. Si el
+archivo tiene menos filas únicas que la muestra, el resultado es el mismo que el
+del pipeline en memoria. Si tiene más, los parámetros son estimaciones sobre la
+muestra (PREPROCESSING_STREAMING_SAMPLE_ROWS), también con
+PREPROCESSING_QUANTILES='exacto': ese modo es exacto solo en memoria. Por
+bloques y shards el modo 'aproximado' acota en cambio el error de medianas y
+límites IQR sobre todas las filas; columnas categóricas y media/desvío salen
+siempre de la muestra. derivar_parametros deja un warning cuando muestrea.
+"""
+import numpy as np
+import pandas as pd
+from .base_imports import logger
+from PreprocessingApp.tasks.progreso import ETAPA_ESTADISTICAS
+from PreprocessingApp.utils.dedup_utils import ConjuntoHashes
+from PreprocessingApp.utils.hash_utils import hash_filas, huellas_columnas
+from PreprocessingApp.utils.profile_utils import ColumnProfile
+from PreprocessingApp.utils.upload_utils import columnas_a_eliminar, convertir_objetivo
+from PreprocessingApp.utils.sketch_utils import CUANTILES_APROXIMADOS, KLLSketch
+
+
+def convertir_bloque(bloque):
+    """Aplica la conversión a numérico de la etapa de transformación a todas las columnas"""
+    return bloque.apply(pd.to_numeric, errors='coerce').astype('float64')
+
+
+class FiltroDuplicados:
+    """
+    Recuerda los hashes de las filas ya vistas para mantener keep='first' entre
+    bloques. Por encima de PREPROCESSING_DEDUP_MEMORY_BYTES los hashes se
+    vuelcan a disco (ver dedup_utils.py); usar como context manager.
+    """
+
+    def __init__(self, vistos=None, directorio=None):
+        self.vistos = ConjuntoHashes(directorio=directorio)
+        if vistos is not None:
+            self.vistos.agregar(np.unique(np.asarray(vistos, dtype=np.uint64)))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.vistos.cerrar()
+
+    def filtrar(self, bloque, hashes=None):
+        """`hashes` permite hashear otra representación de las filas (p. ej. normalizada)"""
+        hashes = hash_filas(bloque) if hashes is None else hashes
+        return bloque[self.vistos.filtrar_nuevos(hashes)]
+
+
+class MuestraReservorio:
+    """Muestra uniforme de tamaño fijo de las filas (algoritmo R vectorizado)"""
+
+    def __init__(self, columnas, capacidad, semilla=0):
+        self.columnas = list(columnas)
+        self.capacidad = capacidad
+        self.filas = np.empty((capacidad, len(self.columnas)), dtype='float64')
+        self.vistas = 0
+        self.rng = np.random.default_rng(semilla)
+
+    def agregar(self, bloque):
+        valores = bloque[self.columnas].to_numpy(dtype='float64')
+        libres = max(0, min(self.capacidad - self.vistas, len(valores)))
+        self.filas[self.vistas:self.vistas + libres] = valores[:libres]
+        resto = valores[libres:]
+        if len(resto):
+            posiciones = np.arange(self.vistas + libres, self.vistas + len(valores)) + 1
+            destinos = (self.rng.random(len(resto)) * posiciones).astype(np.int64)
+            reemplazar = destinos < self.capacidad
+            self.filas[destinos[reemplazar]] = resto[reemplazar]
+        self.vistas += len(valores)
+
+    def merge(self, otra):
+        """Une dos muestras de poblaciones disjuntas manteniendo una muestra uniforme de la unión"""
+        propias = self.filas[:min(self.vistas, self.capacidad)]
+        ajenas = otra.filas[:min(otra.vistas, otra.capacidad)]
+        total = min(self.capacidad, len(propias) + len(ajenas))
+        if total > 0:
+            desde_propias = self.rng.hypergeometric(self.vistas, otra.vistas, total) if otra.vistas else total
+            desde_propias = min(max(desde_propias, total - len(ajenas)), len(propias))
+            elegidas = np.concatenate([
+                propias[self.rng.choice(len(propias), desde_propias, replace=False)],
+                ajenas[self.rng.choice(len(ajenas), total - desde_propias, replace=False)],
+            ])
+            self.filas[:total] = elegidas
+        self.vistas += otra.vistas
+        return self
+
+    def descartar(self, hashes):
+        """
+        Quita de la muestra las filas cuyo hash está en `hashes`. Solo es exacto
+        mientras la muestra contiene todas las filas vistas; con el reservorio
+        lleno se deja como está.
+        """
+        if self.vistas > self.capacidad or len(hashes) == 0:
+            return self
+        quedan = ~np.isin(hash_filas(self.a_dataframe()), hashes)
+        restantes = self.filas[:self.vistas][quedan]
+        self.filas[:len(restantes)] = restantes
+        self.vistas = len(restantes)
+        return self
+
+    def a_dataframe(self):
+        return pd.DataFrame(self.filas[:min(self.vistas, self.capacidad)], columns=self.columnas)
+
+
+class ResumenPorBloques:
+    """
+    Lo que hace falta para el resumen de un CSV que no se carga entero (ver
+    metrics_utils.resumir_muestra): filas y nulos por columna exactos y una
+    muestra uniforme de tamaño fijo de las filas tal como vienen. La muestra
+    conserva las filas de menor clave aleatoria, así que dos resúmenes de partes
+    disjuntas del archivo (shards) se unen con merge() sin sesgo.
+    """
+
+    CLAVE = '__clave_muestra__'
+
+    def __init__(self, capacidad=100_000, semilla=0):
+        self.capacidad = capacidad
+        self.rng = np.random.default_rng(semilla)
+        self.muestra = None
+        self.filas = 0
+        self.nulos = {}
+        self.filas_duplicadas = None
+
+    def agregar(self, bloque):
+        self.filas += len(bloque)
+        for col, nulos in bloque.isnull().sum().items():
+            self.nulos[col] = self.nulos.get(col, 0) + int(nulos)
+        candidatas = bloque.assign(**{self.CLAVE: self.rng.random(len(bloque))})
+        if self.muestra is not None and len(self.muestra) >= self.capacidad:
+            # Solo pueden entrar las filas con clave menor que la mayor de la muestra
+            candidatas = candidatas[candidatas[self.CLAVE] < self.muestra[self.CLAVE].max()]
+        self._conservar(candidatas)
+
+    def _conservar(self, candidatas):
+        if self.muestra is not None:
+            candidatas = pd.concat([self.muestra, candidatas])
+        if len(candidatas) > self.capacidad:
+            candidatas = candidatas.nsmallest(self.capacidad, self.CLAVE)
+        self.muestra = candidatas
+
+    def merge(self, otro):
+        self.filas += otro.filas
+        for col, nulos in otro.nulos.items():
+            self.nulos[col] = self.nulos.get(col, 0) + nulos
+        if otro.filas_duplicadas is not None:
+            self.filas_duplicadas = (self.filas_duplicadas or 0) + otro.filas_duplicadas
+        if otro.muestra is not None:
+            self._conservar(otro.muestra)
+        return self
+
+    def a_dataframe(self):
+        if self.muestra is None:
+            return pd.DataFrame(columns=list(self.nulos))
+        return self.muestra.drop(columns=self.CLAVE).sort_index(kind='stable').reset_index(drop=True)
+
+    def resumir(self, target_column=None, preparar=None):
+        """Resumen del archivo; preparar(df), si se pasa, se aplica a la muestra antes de resumirla"""
+        from PreprocessingApp.utils.metrics_utils import resumir_muestra
+        muestra = self.a_dataframe()
+        if preparar is not None:
+            muestra = preparar(muestra)
+        return resumir_muestra(muestra, target_column, self.filas, self.nulos, self.filas_duplicadas)
+
+
+class EstadisticasBloques:
+    """
+    Acumula, bloque a bloque, lo que la primera pasada necesita para derivar los
+    parámetros del pipeline. Dos acumuladores de partes disjuntas del archivo
+    (bloques o shards) se pueden unir con merge(). Con target_column valida
+    además en cada bloque la columna objetivo, como preparar_original.
+    """
+
+    def __init__(self, columnas, tamano_muestra=200_000, modo_cuantiles=None, error_cuantiles=0.01, semilla=0,
+                 target_column=None):
+        self.columnas = list(columnas)
+        self.target_column = target_column if target_column in self.columnas else None
+        self.aproximado = modo_cuantiles == CUANTILES_APROXIMADOS
+        self.siempre_numerica = dict.fromkeys(columnas, True)
+        self.tiene_valores = dict.fromkeys(columnas, False)
+        self.huellas = dict.fromkeys(columnas, 0)
+        self.nulos = dict.fromkeys(columnas, 0)
+        self.sketches = {col: KLLSketch(error_cuantiles) for col in columnas} if self.aproximado else {}
+        self.muestra = MuestraReservorio(columnas, tamano_muestra, semilla)
+        self.filas_leidas = 0
+        self.filas_unicas = 0
+
+    def agregar_esquema(self, bloque, convertido, desplazamiento):
+        """
+        Tipos, columnas con valores y huellas de columnas, sobre todas las filas
+        leídas. Lanza ValueError si la columna objetivo no es convertible a numérica:
+        convertir_bloque la dejaría en NaN y la imputación la rellenaría.
+        """
+        target = self.target_column
+        if target is not None and not pd.api.types.is_numeric_dtype(bloque[target]):
+            convertir_objetivo(bloque[target], target)
+        for col in self.columnas:
+            self.siempre_numerica[col] &= pd.api.types.is_numeric_dtype(bloque[col])
+        for col, presente in convertido.notna().any().items():
+            self.tiene_valores[col] |= bool(presente)
+        for col, huella in huellas_columnas(convertido, desplazamiento).items():
+            self.huellas[col] = (self.huellas[col] + huella) % 2**64
+        self.filas_leidas += len(bloque)
+
+    def agregar_filas(self, unicas):
+        """Muestra, sketches y nulos, sobre las filas que quedan después de quitar duplicados"""
+        self.filas_unicas += len(unicas)
+        self.muestra.agregar(unicas)
+        for col, sketch in self.sketches.items():
+            sketch.update(unicas[col].to_numpy())
+            self.nulos[col] += int(unicas[col].isnull().sum())
+
+    def merge(self, otras):
+        for col in self.columnas:
+            self.siempre_numerica[col] &= otras.siempre_numerica[col]
+            self.tiene_valores[col] |= otras.tiene_valores[col]
+            self.huellas[col] = (self.huellas[col] + otras.huellas[col]) % 2**64
+            self.nulos[col] += otras.nulos[col]
+        for col, sketch in self.sketches.items():
+            sketch.merge(otras.sketches[col])
+        self.muestra.merge(otras.muestra)
+        self.filas_leidas += otras.filas_leidas
+        self.filas_unicas += otras.filas_unicas
+        return self
+
+
+def derivar_parametros(estadisticas, target_column=None):
+    """
+    Deriva de las estadísticas acumuladas los parámetros de cada etapa del
+    pipeline. Con más filas únicas que la muestra, los que salen de ella son
+    estimaciones (ver el docstring del módulo).
+    """
+    columnas = estadisticas.columnas
+    sketches = estadisticas.sketches
+
+    # Transformación: numéricas primero y después las convertidas, como en transformar()
+    conservadas = [col for col in columnas if estadisticas.siempre_numerica[col]]
+    conservadas += [
+        col for col in columnas
+        if not estadisticas.siempre_numerica[col] and estadisticas.tiene_valores[col]
+    ]
+
+    # Duplicados de columnas: se conserva la primera de cada huella
+    vistas = set()
+    columnas_finales = []
+    for col in conservadas:
+        if estadisticas.huellas[col] not in vistas:
+            vistas.add(estadisticas.huellas[col])
+            columnas_finales.append(col)
+
+    df_muestra = estadisticas.muestra.a_dataframe()[columnas_finales]
+
+    # Imputación
+    if estadisticas.aproximado:
+        medianas = pd.Series({col: sketches[col].cuantil(0.5) for col in columnas_finales}, dtype='float64')
+    else:
+        medianas = df_muestra.median()
+    df_muestra = df_muestra.fillna(medianas)
+
+    # Outliers: los valores imputados cuentan como nulos[col] repeticiones de la mediana
+    if estadisticas.aproximado:
+        limites = pd.DataFrame({
+            col: sketches[col].cuantiles([0.15, 0.85], extra=[(medianas[col], estadisticas.nulos[col])])
+            for col in columnas_finales
+        }, index=[0.15, 0.85])
+        q1 = limites.loc[0.15]
+        q3 = limites.loc[0.85]
+    else:
+        q1 = df_muestra.quantile(0.15)
+        q3 = df_muestra.quantile(0.85)
+    iqr = q3 - q1
+    inferior = q1 - 1.5 * iqr
+    superior = q3 + 1.5 * iqr
+    df_muestra = df_muestra[((df_muestra >= inferior) & (df_muestra <= superior)).all(axis=1)]
+
+    # Normalización
+    perfil = ColumnProfile(df_muestra, target_column)
+    no_normalizar = set(perfil.categoricas + perfil.binarias)
+    a_normalizar = [col for col in columnas_finales if col not in no_normalizar]
+    medias = df_muestra[a_normalizar].mean()
+    desvios = df_muestra[a_normalizar].std(ddof=0).replace(0, 1.0)
+
+    logger.info(
+        f"Primera pasada: {estadisticas.filas_leidas} filas leídas, {estadisticas.filas_unicas} únicas, "
+        f"muestra de {len(df_muestra)} filas, columnas finales: {columnas_finales}"
+    )
+    muestra = estadisticas.muestra
+    if muestra.vistas > muestra.capacidad:
+        estimados = 'columnas categóricas y media/desvío' if estadisticas.aproximado else \
+            'medianas, límites IQR, columnas categóricas y media/desvío'
+        logger.warning(
+            f"Parámetros muestreados: {estimados} salen de una muestra de {muestra.capacidad} "
+            f"de {muestra.vistas} filas únicas (PREPROCESSING_STREAMING_SAMPLE_ROWS)"
+        )
+    return {
+        'columnas': columnas_finales,
+        'medianas': medianas,
+        'inferior': inferior,
+        'superior': superior,
+        'a_normalizar': a_normalizar,
+        'medias': medias,
+        'desvios': desvios,
+    }
+
+
+def aplicar_a_bloque(unicas, parametros):
+    """Aplica imputación, filtro IQR y escalado a un bloque ya convertido y sin duplicados"""
+    bloque = unicas[parametros['columnas']].fillna(parametros['medianas'])
+    dentro = (bloque >= parametros['inferior']) & (bloque <= parametros['superior'])
+    bloque = bloque[dentro.all(axis=1)].copy()
+    a_normalizar = parametros['a_normalizar']
+    if a_normalizar:
+        bloque[a_normalizar] = (bloque[a_normalizar] - parametros['medias']) / parametros['desvios']
+    return bloque
+
+
+def _leer_por_bloques(path, columnas, chunk_size):
+    return pd.read_csv(path, usecols=columnas, chunksize=chunk_size)
+
+
+def recolectar_parametros(path, columnas, target_column=None, chunk_size=100_000, tamano_muestra=200_000,
+                          modo_cuantiles=None, error_cuantiles=0.01, resumen=None):
+    """
+    Primera pasada: calcula los parámetros de todas las etapas sin cargar el
+    archivo entero. Con resumen (ResumenPorBloques) junta además el del original.
+    """
+    estadisticas = EstadisticasBloques(
+        columnas, tamano_muestra, modo_cuantiles, error_cuantiles, target_column=target_column
+    )
+    with FiltroDuplicados() as duplicados:
+        for bloque in _leer_por_bloques(path, columnas, chunk_size):
+            if resumen is not None:
+                resumen.agregar(bloque)
+            convertido = convertir_bloque(bloque)
+            estadisticas.agregar_esquema(bloque, convertido, estadisticas.filas_leidas)
+            estadisticas.agregar_filas(duplicados.filtrar(convertido))
+    if resumen is not None:
+        resumen.filas_duplicadas = estadisticas.filas_leidas - estadisticas.filas_unicas
+    return derivar_parametros(estadisticas, target_column)
+
+
+def aplicar_parametros(path, columnas, parametros, path_salida, chunk_size=100_000, resumen=None):
+    """Segunda pasada: aplica los parámetros bloque a bloque y escribe el CSV de salida (y su resumen)"""
+    filas_escritas = 0
+    primero = True
+
+    with FiltroDuplicados() as duplicados:
+        for bloque in _leer_por_bloques(path, columnas, chunk_size):
+            bloque = aplicar_a_bloque(duplicados.filtrar(convertir_bloque(bloque)), parametros)
+            if resumen is not None:
+                resumen.agregar(bloque)
+            bloque.to_csv(path_salida, mode='w' if primero else 'a', header=primero, index=False)
+            filas_escritas += len(bloque)
+            primero = False
+
+    if primero:
+        pd.DataFrame(columns=parametros['columnas']).to_csv(path_salida, index=False)
+    logger.info(f"Segunda pasada: {filas_escritas} filas escritas en {path_salida}")
+    return filas_escritas
+
+
+def procesar_por_bloques(path, path_salida, target_column=None, drop_column=None,
+                         chunk_size=100_000, tamano_muestra=200_000, modo_cuantiles=None, error_cuantiles=0.01,
+                         progreso=None, resumenes=None):
+    """
+    Ejecuta el pipeline completo en dos pasadas por bloques de chunk_size filas.
+    progreso(etapa, porcentaje), si se pasa, se llama al terminar la primera pasada.
+    resumenes, si se pasa, es un par de ResumenPorBloques (original, procesado)
+    que se llenan durante las pasadas.
+    """
+    eliminar = columnas_a_eliminar(drop_column)
+    columnas = [col for col in pd.read_csv(path, nrows=0).columns if col not in eliminar]
+    resumen_original, resumen_procesado = resumenes or (None, None)
+    parametros = recolectar_parametros(
+        path, columnas, target_column, chunk_size, tamano_muestra, modo_cuantiles, error_cuantiles,
+        resumen_original,
+    )
+    if progreso is not None:
+        progreso(ETAPA_ESTADISTICAS, 50)
+    return aplicar_parametros(path, columnas, parametros, path_salida, chunk_size, resumen_procesado)
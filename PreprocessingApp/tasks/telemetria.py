@@ -0,0 +1,116 @@
+"""
+Telemetría persistente del pipeline: una ProcessingRun por ejecución de
+procesar_csv y un StageRun por etapa, con tiempos, formas y recursos medidos en
+el worker que la corrió (ver utils/telemetria_utils.py). Las mismas mediciones
+se suman a las métricas de /metrics (ver utils/prometheus_utils.py).
+
+Como el progreso, la telemetría no debe cortar el procesamiento: si no se
+puede guardar solo se registra una advertencia.
+"""
+import os
+import socket
+from contextlib import contextmanager
+from django.utils import timezone
+from .base_imports import logger
+from PreprocessingApp.models import ProcessingRun, StageRun
+from PreprocessingApp.tasks.progreso import publicar_error, publicar_etapa
+from PreprocessingApp.utils.prometheus_utils import (
+    BYTES_ENTRADA,
+    BYTES_ETAPAS,
+    CSV_PROCESADOS,
+    DURACION_ETAPAS,
+    FILAS_ETAPAS,
+)
+from PreprocessingApp.utils.telemetria_utils import MedicionRecursos
+
+
+def iniciar_ejecucion(obj, modo):
+    """Abre la ejecución del CSV y devuelve su id (None si no se pudo guardar)"""
+    if os.path.exists(obj.file.path):
+        BYTES_ENTRADA.inc(os.path.getsize(obj.file.path))
+    try:
+        return ProcessingRun.objects.create(csv=obj, mode=modo, worker=socket.gethostname()).id
+    except Exception as e:
+        logger.warning(f"No se pudo registrar la ejecución del CSV ID {obj.id}: {str(e)}")
+        return None
+
+
+def ejecucion_desde_cache(run_id):
+    if run_id is not None:
+        ProcessingRun.objects.filter(id=run_id).update(from_cache=True)
+
+
+def cerrar_ejecucion(run_id, estado, error=None):
+    """
+    Cierra la ejecución run_id con el estado final si sigue abierta; las demás
+    ejecuciones del CSV no se tocan. Solo el paso desde procesando suma a
+    CSV_PROCESADOS: si la tarea y el errback del chord la cierran los dos, cuenta
+    una vez. Devuelve si la cerró.
+    """
+    if run_id is None:
+        return False
+    try:
+        abiertas = ProcessingRun.objects.filter(id=run_id, status=ProcessingRun.STATUS_RUNNING)
+        run = abiertas.first()
+        if run is None:
+            return False
+        fin = timezone.now()
+        # update() condicionado al estado: de dos cierres concurrentes solo uno mueve la fila
+        cerrada = abiertas.update(
+            status=estado,
+            finished_at=fin,
+            duration_seconds=(fin - run.started_at).total_seconds(),
+            error_message=str(error) if error is not None else None,
+        ) > 0
+    except Exception as e:
+        logger.warning(f"No se pudo cerrar la ejecución {run_id}: {str(e)}")
+        return False
+    if cerrada:
+        CSV_PROCESADOS.inc(result=estado)
+    return cerrada
+
+
+def registrar_etapa(run_id, nombre, medicion):
+    if run_id is None:
+        return
+    try:
+        StageRun.objects.create(
+            run_id=run_id,
+            stage=nombre,
+            worker=medicion.worker,
+            started_at=medicion.inicio,
+            finished_at=medicion.fin,
+            duration_seconds=medicion.segundos,
+            rows_in=medicion.filas_entrada,
+            columns_in=medicion.columnas_entrada,
+            rows_out=medicion.filas_salida,
+            columns_out=medicion.columnas_salida,
+            peak_rss_bytes=medicion.pico_rss,
+            bytes_read=medicion.bytes_leidos,
+            bytes_written=medicion.bytes_escritos,
+        )
+    except Exception as e:
+        logger.warning(f"No se pudo registrar la etapa {nombre} de la ejecución {run_id}: {str(e)}")
+
+
+@contextmanager
+def etapa(nombre, csv_id=None, run_id=None):
+    """
+    Mide lo que corre adentro y lo registra como StageRun de run_id. Con csv_id
+    publica además el progreso de la etapa (solo para las etapas de ETAPAS).
+    """
+    medicion = MedicionRecursos()
+    with medicion:
+        yield medicion
+    registrar_etapa(run_id, nombre, medicion)
+    DURACION_ETAPAS.observar(medicion.segundos, stage=nombre)
+    FILAS_ETAPAS.inc(medicion.filas_entrada or 0, stage=nombre)
+    BYTES_ETAPAS.inc(medicion.bytes_leidos or 0, stage=nombre, direction='read')
+    BYTES_ETAPAS.inc(medicion.bytes_escritos or 0, stage=nombre, direction='written')
+    publicar_etapa(csv_id, nombre, medicion.filas_entrada, medicion.filas_salida)
+
+
+def registrar_fallo_etapa(csv_id, nombre, error, run_id=None):
+    """Una etapa de la cadena falló: se publica el error y se cierra la ejecución"""
+    publicar_error(csv_id, error, nombre)
+    cerrar_ejecucion(run_id, ProcessingRun.STATUS_ERROR, error)
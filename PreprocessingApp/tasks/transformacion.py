@@ -1,43 +1,55 @@
 from celery import shared_task
 from .base_imports import *
-from io import StringIO
 import numpy as np
+from django.conf import settings
+from PreprocessingApp.utils.dtype_utils import compactar_serie
+from PreprocessingApp.utils.artifact_utils import cargar_artefacto, guardar_siguiente_artefacto
+from PreprocessingApp.tasks.telemetria import etapa, registrar_fallo_etapa
+
+def transformar(df, target_column=None):
+    """Conserva las columnas numéricas y convierte las que sean convertibles"""
+    logger.info(f"DataFrame shape inicial: {df.shape}")
+    logger.info(f"Columnas iniciales: {df.columns.tolist()}")
+
+    # Conservar TODAS las columnas numéricas (incluidas las categóricas)
+    df_numerico = df.select_dtypes(include=['number']).copy()
+
+    # Intentar convertir columnas no numéricas a numéricas si es posible
+    columnas_convertidas = []
+    for col in df.columns:
+        if col not in df_numerico.columns:
+            try:
+                df_convertida = pd.to_numeric(df[col], errors='coerce')
+                # Solo agregar si la conversión fue exitosa (no todo NaN)
+                if not df_convertida.isnull().all():
+                    if settings.PREPROCESSING_COMPACT_DTYPES:
+                        df_convertida = compactar_serie(df_convertida)
+                    df_numerico[col] = df_convertida
+                    columnas_convertidas.append(col)
+            except:
+                continue
+
+    if columnas_convertidas:
+        logger.info(f"Columnas convertidas a numéricas: {columnas_convertidas}")
+
+    logger.info(f"Columnas finales conservadas: {df_numerico.columns.tolist()}")
+    logger.info(f"Shape final: {df_numerico.shape}")
+    return df_numerico
 
 @shared_task
-def preprocesar_transformacion(df_json, csv_id, target_column=None):
+def preprocesar_transformacion(artefacto, csv_id, target_column=None, run_id=None):
     try:
         logger.info(f"Iniciando transformación de valores para CSV ID: {csv_id}")
         logger.info(f"Target column: {target_column}")
 
-        df = pd.read_json(StringIO(df_json), orient='split')
-        logger.info(f"DataFrame shape inicial: {df.shape}")
-        logger.info(f"Columnas iniciales: {df.columns.tolist()}")
-        
-        # Conservar TODAS las columnas numéricas (incluidas las categóricas)
-        df_numerico = df.select_dtypes(include=['number']).copy()
-        
-        # Intentar convertir columnas no numéricas a numéricas si es posible
-        columnas_convertidas = []
-        for col in df.columns:
-            if col not in df_numerico.columns:
-                try:
-                    df_convertida = pd.to_numeric(df[col], errors='coerce')
-                    # Solo agregar si la conversión fue exitosa (no todo NaN)
-                    if not df_convertida.isnull().all():
-                        df_numerico[col] = df_convertida
-                        columnas_convertidas.append(col)
-                except:
-                    continue
-        
-        if columnas_convertidas:
-            logger.info(f"Columnas convertidas a numéricas: {columnas_convertidas}")
-        
-        logger.info(f"Columnas finales conservadas: {df_numerico.columns.tolist()}")
-        logger.info(f"Shape final: {df_numerico.shape}")
-        logger.info(f"Transformación completada para CSV ID: {csv_id}")
-        
-        return df_numerico.to_json(orient='split')
+        with etapa('transformacion', csv_id, run_id) as medicion:
+            df = cargar_artefacto(artefacto)
+            df_numerico = transformar(df, target_column)
+            logger.info(f"Transformación completada para CSV ID: {csv_id}")
+            medicion.formas(df, df_numerico)
+            return guardar_siguiente_artefacto(df_numerico, artefacto, 'transformacion')
 
     except Exception as e:
         logger.error(f"Error en transformación para CSV ID {csv_id}: {str(e)}")
-        raise Exception(f"Error en transformación para CSV ID {csv_id}")
\ No newline at end of file
+        registrar_fallo_etapa(csv_id, 'transformacion', e, run_id)
+        raise Exception(f"Error en transformación para CSV ID {csv_id}")
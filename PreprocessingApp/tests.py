@@ -1,13 +1,53 @@
 from django.test import TestCase
 from django.contrib.auth.models import User
-from PreprocessingApp.models import CSVModel
+from PreprocessingApp.models import CSVModel, ProcessedResult, ProcessingRun, StageRun, UploadSession
 from PreprocessingApp.tasks.transformacion import preprocesar_transformacion
 from PreprocessingApp.tasks.imputacion import preprocesar_imputacion
 from PreprocessingApp.tasks.outliers import preprocesar_outliers
 from PreprocessingApp.tasks.normalizacion import preprocesar_normalizacion
 from celery.result import AsyncResult
 from PreprocessingApp.tasks.main import procesar_csv
-from io import StringIO
+from PreprocessingApp.tasks.graficos import generar_graficos
+from PreprocessingApp.tasks.metricas import calcular_metricas
+from PreprocessingApp.tasks.pipeline import ETAPAS, MODO_BLOQUES, MODO_CADENA, MODO_INLINE, MODO_SHARDS, ejecutar_pipeline
+from PreprocessingApp.tasks.shards import dividir_en_shards
+from PreprocessingApp.tasks.streaming import procesar_por_bloques
+from PreprocessingApp.tasks.imputacion import imputar
+from PreprocessingApp.utils.sketch_utils import CUANTILES_APROXIMADOS, HyperLogLog, KLLSketch
+from PreprocessingApp.utils.profile_utils import ColumnProfile
+from PreprocessingApp.utils.kde_utils import kde_binned
+from PreprocessingApp.utils.mutual_info_utils import informacion_mutua, muestra_estratificada
+from PreprocessingApp.utils.progreso_utils import canal_progreso, ultimo_progreso
+from PreprocessingApp.utils.telemetria_utils import percentil
+from UsersApp.utils import get_redis_connection
+from PreprocessingApp.utils.resumen_utils import CLAVE_ORIGINAL, CLAVE_PROCESADO, guardar_resumen, obtener_resumen, ruta_resumen
+from PreprocessingApp.utils.metrics_utils import contar_outliers, resumir_dataset
+from PreprocessingApp.utils.hash_utils import codigos_filas, columnas_duplicadas, filas_duplicadas
+from PreprocessingApp.tasks.registros_duplicados import eliminar_duplicados, eliminar_duplicados_avanzado, preprocesar_duplicados
+from PreprocessingApp.utils.dedup_utils import ConjuntoHashes
+from PreprocessingApp.utils.upload_utils import HashPorPartes, hash_archivo, preparar_original
+from PreprocessingApp.utils.outlier_utils import METODO_MAD, METODO_ZSCORE, detectar_outliers, filas_validas
+from scipy import stats
+from sklearn.feature_selection import mutual_info_classif
+from unittest import mock
+import hashlib
+import json
+import redis
+import subprocess
+import sys
+from django.conf import settings
+from django.db import transaction
+from rest_framework.test import APIClient
+from django.test.utils import override_settings
+import numpy as np
+import tempfile
+from PreprocessingApp.utils.artifact_utils import (
+    NOMBRE_CARPETA_ARTEFACTOS,
+    cargar_artefacto,
+    directorio_artefactos,
+    eliminar_artefactos,
+    guardar_artefacto,
+)
 import pandas as pd
 import os
 from django.core.files.uploadedfile import SimpleUploadedFile
@@ -27,25 +67,27 @@ class PreprocessingTasksTestCase(TestCase):
         )
 
         self.csv_instance = CSVModel.objects.create(user=self.user, file=self.csv_file)
+
+    def _artefacto_de_prueba(self):
+        """Guarda el CSV de prueba como artefacto, igual que procesar_csv"""
+        df = pd.read_csv(self.csv_instance.file.path)
+        return guardar_artefacto(df, directorio_artefactos(self.csv_instance.file.path), 'original')
     def test_preprocesar_transformacion(self):
         """Verificar que la tarea de transformación de datos se ejecute correctamente."""
         csv_id = self.csv_instance.id
-        df = pd.read_csv(self.csv_instance.file.path)
-        df_serialized = df.to_json(orient='split')
-        result = preprocesar_transformacion.apply(args=[df_serialized, csv_id])
+        artefacto = self._artefacto_de_prueba()
+        result = preprocesar_transformacion.apply(args=[artefacto, csv_id])
 
         # Verificar que la tarea se completó sin errores
         self.assertEqual(result.status, "SUCCESS")
 
     def test_preprocesar_imputacion(self):
         """Verificar que la tarea de imputación de datos se ejecute correctamente."""
-        # Serializar el DataFrame que se va a usar en la tarea de imputación
-        csv_id = self.csv_instance.id
-        df = pd.read_csv(self.csv_instance.file.path)
-        df_serialized = df.to_json(orient='split')
+        # Guardar el DataFrame que se va a usar en la tarea de imputación
+        artefacto = self._artefacto_de_prueba()
 
         # Ejecutar la tarea de imputación
-        result = preprocesar_imputacion.apply(args=[df_serialized])
+        result = preprocesar_imputacion.apply(args=[artefacto])
 
         # Verificar que la tarea de imputación se completó sin errores
         self.assertEqual(result.status, "SUCCESS")
@@ -56,12 +98,10 @@ class PreprocessingTasksTestCase(TestCase):
     def test_preprocesar_outliers(self):
         """Verificar que la tarea de eliminación de outliers se ejecute correctamente."""
         # Crear un DataFrame de prueba
-        csv_id = self.csv_instance.id
-        df = pd.read_csv(self.csv_instance.file.path)
-        df_serialized = df.to_json(orient='split')
+        artefacto = self._artefacto_de_prueba()
 
         # Ejecutar la tarea de eliminación de outliers
-        result = preprocesar_outliers.apply(args=[df_serialized])
+        result = preprocesar_outliers.apply(args=[artefacto])
 
         # Verificar que la tarea de outliers se completó sin errores
         self.assertEqual(result.status, "SUCCESS")
@@ -72,12 +112,10 @@ class PreprocessingTasksTestCase(TestCase):
     def test_preprocesar_normalizacion(self):
         """Verificar que la tarea de normalización se ejecute correctamente."""
         # Crear un DataFrame de prueba
-        csv_id = self.csv_instance.id
-        df = pd.read_csv(self.csv_instance.file.path)
-        df_serialized = df.to_json(orient='split')
+        artefacto = self._artefacto_de_prueba()
 
         # Ejecutar la tarea de normalización
-        result = preprocesar_normalizacion.apply(args=[df_serialized])
+        result = preprocesar_normalizacion.apply(args=[artefacto])
 
         # Verificar que la tarea de normalización se completó sin errores
         self.assertEqual(result.status, "SUCCESS")
@@ -98,6 +136,953 @@ class PreprocessingTasksTestCase(TestCase):
         self.assertEqual(processed_name, 'csv_procesado.csv')
         self.assertTrue(processed_name.endswith('.csv'))
 
+    def test_artefacto_handle(self):
+        """Verificar que entre etapas solo viaja un handle y que el contenido se recupera intacto."""
+        artefacto = self._artefacto_de_prueba()
+        self.assertEqual(set(artefacto), {'path', 'hash', 'esquema', 'filas'})
+        self.assertEqual(artefacto['filas'], 2)
+        self.assertTrue(artefacto['path'].endswith('.parquet'))
+
+        result = preprocesar_transformacion.apply(args=[artefacto, self.csv_instance.id])
+        df = cargar_artefacto(result.get())
+        self.assertEqual(df['column1'].tolist(), [1, 3])
+
+    def test_artefactos_eliminados_al_finalizar(self):
+        """Verificar que los artefactos intermedios se borran al terminar la cadena."""
+        carpeta = os.path.join(os.path.dirname(self.csv_instance.file.path), NOMBRE_CARPETA_ARTEFACTOS)
+
+        def ejecuciones():
+            return set(os.listdir(carpeta)) if os.path.exists(carpeta) else set()
+
+        # Otras pruebas del mismo usuario pueden haber dejado sus carpetas
+        antes = ejecuciones()
+        procesar_csv.apply(args=[self.csv_instance.id], kwargs={'modo': MODO_CADENA})
+        self.assertEqual(ejecuciones(), antes)
+
+        # Cada ejecución usa su carpeta: terminar una no borra los artefactos de otra en curso
+        df = pd.read_csv(self.csv_instance.file.path)
+        primera = guardar_artefacto(df, directorio_artefactos(self.csv_instance.file.path, 1), 'original')
+        segunda = guardar_artefacto(df, directorio_artefactos(self.csv_instance.file.path, 2), 'original')
+        self.assertNotEqual(os.path.dirname(primera['path']), os.path.dirname(segunda['path']))
+        eliminar_artefactos(primera)
+        self.assertFalse(os.path.exists(primera['path']))
+        pd.testing.assert_frame_equal(cargar_artefacto(segunda), df)
+        eliminar_artefactos(segunda)
+        self.assertEqual(ejecuciones(), antes)
+
+    @override_settings(PREPROCESSING_RESULT_CACHE=False)
+    def test_modo_inline_equivalente_a_cadena(self):
+        """Verificar que el modo inline produce el mismo CSV que la cadena de tareas."""
+        csv_id = self.csv_instance.id
+        procesar_csv.apply(args=[csv_id], kwargs={'modo': MODO_CADENA})
+        df_cadena = pd.read_csv(CSVModel.objects.get(id=csv_id).processed_file.path)
+
+        procesar_csv.apply(args=[csv_id], kwargs={'modo': MODO_INLINE})
+        df_inline = pd.read_csv(CSVModel.objects.get(id=csv_id).processed_file.path)
+
+        pd.testing.assert_frame_equal(df_cadena, df_inline)
+
+    def test_cache_de_resultados_compartida(self):
+        """Verificar que una resubida idéntica reutiliza el resultado y que se borra con la última referencia."""
+        procesar_csv.apply(args=[self.csv_instance.id], kwargs={'modo': MODO_INLINE})
+        self.csv_instance.refresh_from_db()
+        path_resultado = self.csv_instance.processed_file.path
+
+        copia_file = SimpleUploadedFile('copia.csv', b"column1,column2\n1,2\n3,4\n", content_type='text/csv')
+        copia = CSVModel.objects.create(user=self.user, file=copia_file)
+        with mock.patch('PreprocessingApp.tasks.main.ejecutar_pipeline') as pipeline:
+            procesar_csv.apply(args=[copia.id], kwargs={'modo': MODO_INLINE})
+        pipeline.assert_not_called()
+        copia.refresh_from_db()
+        self.assertTrue(copia.is_ready)
+        self.assertEqual(copia.processed_file.path, path_resultado)
+        self.assertEqual(copia.result.ref_count, 2)
+
+        # Otra configuración no comparte el resultado
+        otra = CSVModel.objects.create(user=self.user, file=copia_file, drop_column='column2')
+        procesar_csv.apply(args=[otra.id], kwargs={'modo': MODO_INLINE})
+        otra.refresh_from_db()
+        self.assertNotEqual(otra.result_id, copia.result_id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.csv_instance.delete()
+        self.assertTrue(os.path.exists(path_resultado))
+        # Los borrados de querysets no pasan por delete() pero también sueltan la referencia
+        with self.captureOnCommitCallbacks(execute=True):
+            CSVModel.objects.filter(id=copia.id).delete()
+        self.assertFalse(os.path.exists(path_resultado))
+        self.assertFalse(ProcessedResult.objects.filter(id=copia.result_id).exists())
+
+        # Con un rollback la referencia sigue en pie
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    otra.delete()
+                    raise RuntimeError('rollback')
+            except RuntimeError:
+                pass
+        self.assertEqual(callbacks, [])
+        self.assertEqual(ProcessedResult.objects.get(id=otra.result_id).ref_count, 1)
+
+    def test_ejecutar_pipeline_registra_etapas(self):
+        """Verificar que el pipeline inline registra tiempo y forma de cada etapa."""
+        df = pd.DataFrame({'a': [1.0, 2.0, 2.0, None], 'b': ['1', '2', '2', 'x']})
+        df_final, registros = ejecutar_pipeline(df)
+
+        self.assertEqual([r['etapa'] for r in registros], [nombre for nombre, _ in ETAPAS])
+        self.assertEqual((registros[0]['filas_entrada'], registros[0]['columnas_entrada']), (4, 2))
+        self.assertEqual(registros[1]['filas_salida'], 3)
+        self.assertEqual(registros[-1]['filas_salida'], len(df_final))
+        self.assertTrue(all(r['segundos'] >= 0 for r in registros))
+
+    def test_procesar_por_bloques_equivalente_a_inline(self):
+        """Verificar que el motor por bloques da el mismo resultado que el pipeline en memoria."""
+        rng = np.random.default_rng(0)
+        df = pd.DataFrame({
+            'x': rng.normal(size=300),
+            'cat': rng.integers(0, 3, 300),
+            'texto': [str(v) for v in rng.normal(size=300)],
+            'y': rng.normal(size=300),
+        })
+        df.loc[::7, 'x'] = np.nan
+        df['x_copia'] = df['x']
+        df.loc[0, 'y'] = 100
+        df = pd.concat([df, df.iloc[:30]], ignore_index=True)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'entrada.csv')
+            df.to_csv(path, index=False)
+            df_inline, _ = ejecutar_pipeline(pd.read_csv(path), 'y')
+
+            path_salida = os.path.join(tmp, 'salida.csv')
+            procesar_por_bloques(path, path_salida, 'y', chunk_size=17, tamano_muestra=1000)
+            df_bloques = pd.read_csv(path_salida)
+
+        pd.testing.assert_frame_equal(df_inline.reset_index(drop=True), df_bloques)
+
+    def test_procesar_por_bloques_con_mas_filas_que_la_muestra(self):
+        """Verificar que con más filas que la muestra el resultado queda cerca del inline y se avisa."""
+        rng = np.random.default_rng(8)
+        n = 20_000
+        df = pd.DataFrame({
+            'x': rng.normal(size=n),
+            'z': rng.lognormal(size=n),
+            'cat': rng.integers(0, 3, n),
+            'y': rng.integers(0, 2, n),
+        })
+        df.loc[::11, 'x'] = np.nan
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'entrada.csv')
+            df.to_csv(path, index=False)
+            df_inline, _ = ejecutar_pipeline(pd.read_csv(path), 'y')
+
+            path_salida = os.path.join(tmp, 'salida.csv')
+            with self.assertLogs('PreprocessingApp.tasks.base_imports', 'WARNING') as avisos:
+                procesar_por_bloques(path, path_salida, 'y', chunk_size=5000, tamano_muestra=2000)
+            df_bloques = pd.read_csv(path_salida)
+
+        self.assertIn('muestra de 2000 de 20000 filas', avisos.output[0])
+        self.assertEqual(list(df_bloques.columns), list(df_inline.columns))
+        # Tolerancia: 2 % de filas conservadas y 0.05 desvíos en media y desvío de cada columna
+        self.assertAlmostEqual(len(df_bloques), len(df_inline), delta=len(df_inline) * 0.02)
+        for col in df_inline.columns:
+            self.assertAlmostEqual(df_bloques[col].mean(), df_inline[col].mean(), delta=0.05, msg=col)
+            self.assertAlmostEqual(df_bloques[col].std(), df_inline[col].std(), delta=0.05, msg=col)
+
+    def test_kll_sketch_error_y_merge(self):
+        """Verificar que el sketch respeta el error de rango y que el merge equivale a un solo sketch."""
+        valores = np.random.default_rng(0).lognormal(size=200_000)
+        mitad_a = KLLSketch(0.01).update(valores[:100_000])
+        mitad_b = KLLSketch.from_dict(KLLSketch(0.01).update(valores[100_000:]).to_dict())
+        sketch = mitad_a.merge(mitad_b)
+
+        self.assertEqual(sketch.n, len(valores))
+        for q in (0.15, 0.5, 0.85):
+            rango = np.mean(valores <= sketch.cuantil(q))
+            self.assertAlmostEqual(rango, q, delta=0.02)
+
+    @override_settings(PREPROCESSING_QUANTILES=CUANTILES_APROXIMADOS)
+    def test_cuantiles_aproximados(self):
+        """Verificar imputación y conteo de outliers en modo de cuantiles aproximados."""
+        rng = np.random.default_rng(1)
+        df = pd.DataFrame({'a': rng.normal(size=5000), 'b': rng.standard_t(2, size=5000)})
+        df.loc[::10, 'a'] = np.nan
+
+        df_imputado = imputar(df)
+        self.assertEqual(int(df_imputado.isnull().sum().sum()), 0)
+        self.assertAlmostEqual(df_imputado['a'].iloc[0], df['a'].median(), delta=0.1)
+
+        with override_settings(PREPROCESSING_QUANTILES='exacto'):
+            exactos = contar_outliers(df)
+        self.assertAlmostEqual(contar_outliers(df), exactos, delta=exactos * 0.2)
+
+    @override_settings(PREPROCESSING_PARALLEL_PROCESSES=2, PREPROCESSING_PARALLEL_MIN_COLUMNS=2)
+    def test_pipeline_por_columnas_en_paralelo(self):
+        """Verificar que el pool por columnas da el mismo resultado que la ejecución serial."""
+        rng = np.random.default_rng(2)
+        df = pd.DataFrame(rng.normal(size=(200, 6)), columns=[f'c{i}' for i in range(6)])
+        df['cat'] = rng.integers(0, 3, 200)
+        df['bin'] = rng.integers(0, 2, 200)
+        df.loc[::9, 'c1'] = np.nan
+
+        df_paralelo, _ = ejecutar_pipeline(df, 'c0')
+        with override_settings(PREPROCESSING_PARALLEL_PROCESSES=1):
+            df_serial, _ = ejecutar_pipeline(df, 'c0')
+
+        pd.testing.assert_frame_equal(df_serial, df_paralelo)
+
+    def test_duplicados_por_hash(self):
+        """Verificar que la detección por hash coincide con df.T.duplicated() y df.duplicated()."""
+        rng = np.random.default_rng(4)
+        df = pd.DataFrame(rng.integers(0, 3, size=(60, 4)).astype(float), columns=list('abcd'))
+        df['e'] = df['a'].astype(int)
+        df['f'] = rng.choice(['x', 'y', None], 60)
+        df.loc[::7, 'b'] = np.nan
+
+        self.assertTrue((columnas_duplicadas(df) == df.T.duplicated().to_numpy()).all())
+        codigos = codigos_filas(df)
+        for keep in ['first', 'last', False]:
+            self.assertTrue((filas_duplicadas(codigos, keep) == df.duplicated(keep=keep).to_numpy()).all())
+        pd.testing.assert_frame_equal(
+            eliminar_duplicados_avanzado(df, subset_columns=['a', 'b'], keep_strategy='last'),
+            df.loc[:, ~df.T.duplicated()].drop_duplicates(subset=['a', 'b'], keep='last'),
+        )
+
+    def test_duplicados_con_colision_de_hash(self):
+        """Verificar que filas distintas con el mismo hash no se eliminan."""
+        df = pd.DataFrame({'a': [1.0, 2.0, 1.0, 2.0, 3.0], 'b': [np.nan, 1.0, np.nan, 1.0, 5.0]})
+        colision = np.zeros(len(df), dtype=np.uint64)
+        with mock.patch('PreprocessingApp.utils.hash_utils.hash_filas', return_value=colision):
+            codigos = codigos_filas(df)
+        self.assertEqual(list(filas_duplicadas(codigos)), [False, False, True, True, False])
+
+    def test_conjunto_hashes_con_volcado_a_disco(self):
+        """Verificar que el conjunto de hashes mantiene keep='first' aunque vuelque corridas a disco."""
+        rng = np.random.default_rng(5)
+        hashes = rng.integers(0, 2**63, 5000, dtype=np.uint64)
+        hashes = np.concatenate([hashes, hashes[:1000]])
+        rng.shuffle(hashes)
+        with ConjuntoHashes(memoria_max=4000, bloom_bits=1 << 16) as conjunto:
+            nuevos = np.concatenate([conjunto.filtrar_nuevos(lote) for lote in np.array_split(hashes, 20)])
+            self.assertGreater(len(conjunto.corridas), 1)
+            directorio = conjunto.directorio
+        self.assertTrue((nuevos == ~pd.Series(hashes).duplicated().to_numpy()).all())
+        self.assertFalse(os.path.exists(directorio))
+
+    @override_settings(PREPROCESSING_DEDUP_MEMORY_BYTES=800, PREPROCESSING_CHUNK_SIZE=250)
+    def test_preprocesar_duplicados_por_bloques(self):
+        """Verificar que la etapa por bloques da lo mismo que eliminar_duplicados en memoria."""
+        rng = np.random.default_rng(6)
+        df = pd.DataFrame(rng.integers(0, 4, size=(3000, 3)), columns=list('abc'))
+        df['d'] = df['a']
+        df['e'] = df['b'].astype(float)
+        df.loc[5, 'e'] = np.nan
+        df['s'] = rng.choice(['x', 'y'], 3000)
+
+        artefacto = guardar_artefacto(df, directorio_artefactos(self.csv_instance.file.path), 'original')
+        resultado = preprocesar_duplicados(artefacto)
+        pd.testing.assert_frame_equal(
+            cargar_artefacto(resultado), eliminar_duplicados(df).reset_index(drop=True), check_dtype=False
+        )
+
+    def test_detectar_outliers_metodos(self):
+        """Verificar el kernel de outliers contra el cálculo por columnas de pandas/scipy."""
+        rng = np.random.default_rng(7)
+        df = pd.DataFrame(rng.standard_t(3, size=(2000, 5)), columns=list('abcde'))
+        df.loc[::40, 'c'] = np.nan
+
+        resultado = detectar_outliers(df, cuantiles_iqr=(0.15, 0.85))
+        q = df.quantile([0.15, 0.85])
+        iqr = q.loc[0.85] - q.loc[0.15]
+        dentro = (df >= q.loc[0.15] - 1.5 * iqr) & (df <= q.loc[0.85] + 1.5 * iqr)
+        self.assertTrue((filas_validas(resultado) == dentro.all(axis=1).to_numpy()).all())
+        self.assertEqual(len(resultado['filas_validas']), (len(df) + 7) // 8)
+
+        completo = df.fillna(0)
+        z = np.abs(stats.zscore(completo))
+        self.assertEqual(detectar_outliers(completo, METODO_ZSCORE)['por_columna'].sum(), int((z > 3).sum().sum()))
+        mediana = completo.median()
+        mad = (completo - mediana).abs().median()
+        z_modificada = 0.6745 * (completo - mediana).abs() / mad
+        self.assertEqual(detectar_outliers(completo, METODO_MAD)['por_columna'].sum(), int((z_modificada > 3.5).sum().sum()))
+
+    def test_column_profile(self):
+        """Verificar el perfil de columnas contra los cálculos de pandas."""
+        rng = np.random.default_rng(8)
+        df = pd.DataFrame({
+            'continua': rng.normal(size=300),
+            'codificada': rng.integers(0, 5, 300),
+            'binaria': rng.integers(0, 2, 300).astype(float),
+            'texto': rng.choice(['a', 'b', None], 300),
+            'vacia': np.nan,
+        })
+        df.loc[::11, 'continua'] = np.nan
+
+        perfil = ColumnProfile(df, target_column='codificada')
+        pd.testing.assert_series_equal(perfil.nulos, df.isnull().sum(), check_names=False)
+        pd.testing.assert_series_equal(perfil.unicos, df.nunique(), check_names=False)
+        pd.testing.assert_series_equal(perfil.desvios[perfil.numericas], df[perfil.numericas].std(), check_names=False)
+        self.assertEqual(perfil.categoricas, ['codificada', 'binaria', 'texto'])
+        self.assertEqual(perfil.binarias, ['binaria', 'vacia'])
+
+        aproximado = ColumnProfile(df, umbral_hll=1)
+        self.assertTrue(aproximado.unicos_aproximados)
+        self.assertEqual(aproximado.unicos['codificada'], 5)
+
+    def test_hyperloglog(self):
+        """Verificar que HyperLogLog estima la cardinalidad con error chico y se puede unir."""
+        a = HyperLogLog().update(np.arange(0, 60_000))
+        b = HyperLogLog().update(np.arange(40_000, 100_000))
+        self.assertAlmostEqual(a.merge(b).cardinalidad(), 100_000, delta=3_000)
+
+    def test_informacion_mutua_muestreada(self):
+        """Verificar el modo exacto, la muestra estratificada y que el resultado no depende de los hilos."""
+        rng = np.random.default_rng(6)
+        X = pd.DataFrame(rng.normal(size=(2000, 3)), columns=['a', 'b', 'c'])
+        y = (X['a'] > 1).astype(int).to_numpy()
+
+        exacta = informacion_mutua(X, y, discreta=True, max_filas=0)
+        self.assertTrue(exacta['exacta'])
+        self.assertEqual(exacta['filas'], 2000)
+        self.assertAlmostEqual(exacta['valores']['b'], mutual_info_classif(X[['b']], y, random_state=0)[0])
+
+        muestra = informacion_mutua(X, y, discreta=True, max_filas=500, hilos=1)
+        self.assertFalse(muestra['exacta'])
+        self.assertAlmostEqual(muestra['filas'], 500, delta=2)
+        self.assertEqual(muestra, informacion_mutua(X, y, discreta=True, max_filas=500, hilos=3))
+        self.assertGreater(muestra['valores']['a'], muestra['valores']['b'])
+
+        posiciones = muestra_estratificada(y, 500, discreta=True)
+        self.assertAlmostEqual(y[posiciones].mean(), y.mean(), delta=0.005)
+
+    def test_kde_binned_equivalente_a_gaussian_kde(self):
+        """Verificar que la KDE por binning y FFT coincide con gaussian_kde (la que usa seaborn)."""
+        rng = np.random.default_rng(8)
+        valores = np.concatenate([rng.standard_t(3, size=5000), [np.nan, np.inf, 30.0]])
+        bloques = lambda: np.array_split(valores, 7)
+        curva = kde_binned(bloques)
+
+        finitos = valores[np.isfinite(valores)]
+        referencia = stats.gaussian_kde(finitos)
+        x = np.asarray(curva['x'])
+        self.assertEqual(len(x), 200)
+        self.assertAlmostEqual(x[0], finitos.min() - 3 * np.sqrt(referencia.covariance[0, 0]))
+        np.testing.assert_allclose(curva['densidad'], referencia(x), atol=1e-3 * referencia(x).max())
+        self.assertIsNone(kde_binned(lambda: [np.ones(10)]))
+
+    def test_resumen_persistido_y_versionado(self):
+        """Verificar que el resumen se guarda al procesar y se invalida si cambia el archivo."""
+        rng = np.random.default_rng(9)
+        df = pd.DataFrame({'x': rng.normal(size=50), 'y': rng.integers(0, 2, 50)})
+        csv_file = SimpleUploadedFile('resumen.csv', df.to_csv(index=False).encode(), content_type='text/csv')
+        csv_instance = CSVModel.objects.create(user=self.user, file=csv_file, target_column='y')
+        procesar_csv.apply(args=[csv_instance.id], kwargs={'modo': MODO_INLINE})
+        csv_instance.refresh_from_db()
+        self.assertTrue(os.path.exists(ruta_resumen(csv_instance)))
+
+        with mock.patch('PreprocessingApp.utils.metrics_utils.resumir_dataset') as resumir:
+            original = obtener_resumen(csv_instance, CLAVE_ORIGINAL)
+            procesado = obtener_resumen(csv_instance, CLAVE_PROCESADO)
+        resumir.assert_not_called()
+        self.assertEqual(original['perfil']['filas'], 50)
+        self.assertEqual(procesado['nulos'], 0)
+
+        # Reprocesar cambia el csv_procesado.csv: el resumen viejo deja de valer
+        pd.read_csv(csv_instance.processed_file.path).head(10).to_csv(csv_instance.processed_file.path, index=False)
+        self.assertEqual(obtener_resumen(csv_instance, CLAVE_PROCESADO)['perfil']['filas'], 10)
+
+    def test_subida_sin_parsear_y_columnas_eliminadas_en_worker(self):
+        """Verificar que la subida guarda el archivo tal cual y el worker elimina las columnas."""
+        cliente = APIClient()
+        cliente.force_authenticate(self.user)
+        contenido = b"x,y,id\n1.5, 1 ,a\n2.5,0,b\n3.5,1,c\n"
+
+        with mock.patch('PreprocessingApp.tasks.main.procesar_csv.apply_async', new=mock.Mock(return_value=mock.Mock(id='tarea'))) as lanzar:
+            invalida = cliente.post('/api/preprocessing/upload/', {
+                'csv': SimpleUploadedFile('invalida.csv', contenido, content_type='text/csv'),
+                'processing_type': 'completo', 'target_column': 'id',
+            }, format='multipart')
+            respuesta = cliente.post('/api/preprocessing/upload/', {
+                'csv': SimpleUploadedFile('subida.csv', contenido, content_type='text/csv'),
+                'processing_type': 'completo', 'target_column': 'y', 'drop_columns': 'id',
+            }, format='multipart')
+        self.assertEqual(invalida.status_code, 400)
+        self.assertEqual(respuesta.status_code, 201)
+        lanzar.assert_called_once()
+
+        csv_instance = CSVModel.objects.get(id=respuesta.data['csv_id'])
+        self.assertEqual(csv_instance.drop_column, 'id')
+        with open(csv_instance.file.path, 'rb') as f:
+            self.assertEqual(f.read(), contenido)
+
+        procesar_csv.apply(args=[csv_instance.id], kwargs={'modo': MODO_INLINE})
+        csv_instance.refresh_from_db()
+        self.assertTrue(csv_instance.is_ready)
+        self.assertNotIn('id', pd.read_csv(csv_instance.processed_file.path).columns)
+        self.assertEqual(list(obtener_resumen(csv_instance, CLAVE_ORIGINAL)['perfil']['columnas']), ['x', 'y'])
+
+    @override_settings(PREPROCESSING_UPLOAD_PART_BYTES=16)
+    def test_sesion_de_subida_reanudable(self):
+        """Verificar la subida por partes: checksum, reanudación, armado y hash de contenido."""
+        cliente = APIClient()
+        cliente.force_authenticate(self.user)
+        contenido = b"x,y\n1.5,1\n2.5,0\n3.5,1\n4.5,0\n5.5,1\n"
+        partes = [contenido[i:i + 16] for i in range(0, len(contenido), 16)]
+
+        def subir(sesion_id, offset, parte, checksum=None):
+            return cliente.post(f'/api/preprocessing/upload/sesion/{sesion_id}/parte/', {
+                'parte': SimpleUploadedFile('parte', parte),
+                'offset': offset,
+                'sha256': checksum or hashlib.sha256(parte).hexdigest(),
+            }, format='multipart')
+
+        sesion = cliente.post('/api/preprocessing/upload/sesion/', {
+            'filename': 'por_partes.csv', 'total_size': len(contenido),
+            'processing_type': 'completo', 'target_column': 'y',
+        }).data
+        sesion_id = sesion['session_id']
+        self.assertEqual(subir(sesion_id, 0, partes[0]).status_code, 200)
+        # Checksum incorrecto y offset fuera de orden
+        self.assertEqual(subir(sesion_id, 16, partes[1], checksum='0' * 64).status_code, 400)
+        self.assertEqual(subir(sesion_id, 32, partes[2]).status_code, 409)
+
+        # Se reanuda desde el offset confirmado
+        offset = cliente.get(f'/api/preprocessing/upload/sesion/{sesion_id}/').data['offset']
+        self.assertEqual(offset, 16)
+        for indice in range(1, len(partes)):
+            estado = subir(sesion_id, indice * 16, partes[indice]).data
+        self.assertEqual(estado['offset'], len(contenido))
+
+        with mock.patch('PreprocessingApp.tasks.main.procesar_csv.apply_async',
+                        new=mock.Mock(return_value=mock.Mock(id='tarea'))) as lanzar:
+            respuesta = cliente.post(f'/api/preprocessing/upload/sesion/{sesion_id}/completar/', {
+                'content_hash': estado['content_hash'],
+            })
+        self.assertEqual(respuesta.status_code, 201)
+        lanzar.assert_called_once()
+
+        csv_instance = CSVModel.objects.get(id=respuesta.data['csv_id'])
+        with open(csv_instance.file.path, 'rb') as f:
+            self.assertEqual(f.read(), contenido)
+        # El hash encadenado por partes es el mismo que el del archivo entero
+        self.assertEqual(csv_instance.content_hash, hash_archivo(csv_instance.file.path))
+        hash_contenido = HashPorPartes()
+        for i in range(0, len(contenido), 7):
+            hash_contenido.actualizar(contenido[i:i + 7])
+        self.assertEqual(hash_contenido.hexdigest(), csv_instance.content_hash)
+
+    def test_sesiones_de_subida_con_el_mismo_nombre(self):
+        """Verificar que dos sesiones abiertas para el mismo archivo no comparten el temporal."""
+        cliente = APIClient()
+        cliente.force_authenticate(self.user)
+        contenido = b"x,y\n1.5,1\n2.5,0\n3.5,1\n"
+
+        def abrir():
+            return cliente.post('/api/preprocessing/upload/sesion/', {
+                'filename': 'repetido.csv', 'total_size': len(contenido),
+                'processing_type': 'completo', 'target_column': 'y',
+            }).data['session_id']
+
+        def subir(sesion_id, parte):
+            return cliente.post(f'/api/preprocessing/upload/sesion/{sesion_id}/parte/', {
+                'parte': SimpleUploadedFile('parte', parte), 'offset': 0,
+                'sha256': hashlib.sha256(parte).hexdigest(),
+            }, format='multipart')
+
+        # El cliente perdió el id de la primera sesión y abrió otra
+        abandonada, actual = abrir(), abrir()
+        self.assertEqual(subir(abandonada, contenido.replace(b'1.5', b'9.9')).status_code, 200)
+        self.assertEqual(subir(actual, contenido).status_code, 200)
+        self.assertNotEqual(UploadSession.objects.get(id=abandonada).temp_path(),
+                            UploadSession.objects.get(id=actual).temp_path())
+        self.assertEqual(cliente.delete(f'/api/preprocessing/upload/sesion/{abandonada}/').status_code, 204)
+
+        with mock.patch('PreprocessingApp.tasks.main.procesar_csv.apply_async',
+                        new=mock.Mock(return_value=mock.Mock(id='tarea'))):
+            respuesta = cliente.post(f'/api/preprocessing/upload/sesion/{actual}/completar/')
+        self.assertEqual(respuesta.status_code, 201)
+        with open(CSVModel.objects.get(id=respuesta.data['csv_id']).file.path, 'rb') as f:
+            self.assertEqual(f.read(), contenido)
+
+    def test_metricas_precalculadas_e_invalidadas(self):
+        """Verificar que las métricas se calculan en el worker y se invalidan al reprocesar."""
+        rng = np.random.default_rng(4)
+        df = pd.DataFrame({'x': rng.normal(size=40), 'y': rng.integers(0, 2, 40)})
+        csv_file = SimpleUploadedFile('metricas.csv', df.to_csv(index=False).encode(), content_type='text/csv')
+        csv_instance = CSVModel.objects.create(user=self.user, file=csv_file, target_column='y')
+        procesar_csv.apply(args=[csv_instance.id], kwargs={'modo': MODO_INLINE})
+        csv_instance.refresh_from_db()
+        self.assertIsNotNone(csv_instance.metrics)
+
+        cliente = APIClient()
+        cliente.force_authenticate(self.user)
+        with mock.patch('PreprocessingApp.utils.metrics_utils.metricas_desde_resumenes') as calcular:
+            respuesta = cliente.get(f'/api/preprocessing/metricas/{csv_instance.id}/')
+        calcular.assert_not_called()
+        self.assertEqual(respuesta.data, csv_instance.metrics)
+
+        with mock.patch('PreprocessingApp.tasks.main.procesar_csv.delay'):
+            cliente.post('/api/preprocessing/process/', {'csv_id': csv_instance.id, 'target_column': 'y'})
+        csv_instance.refresh_from_db()
+        self.assertIsNone(csv_instance.metrics)
+
+        # Si el procesado cambia por fuera del pipeline, las métricas guardadas dejan de valer:
+        # la vista no las calcula, lanza la tarea y responde 202
+        procesar_csv.apply(args=[csv_instance.id], kwargs={'modo': MODO_INLINE})
+        csv_instance.refresh_from_db()
+        pd.read_csv(csv_instance.processed_file.path).head(5).to_csv(csv_instance.processed_file.path, index=False)
+        get_redis_connection().delete(f'metricas_pendientes:{csv_instance.id}')
+        with mock.patch('PreprocessingApp.tasks.metricas.calcular_metricas.delay') as lanzar, \
+                mock.patch('PreprocessingApp.utils.metrics_utils.resumir_dataset') as resumir, \
+                mock.patch('PreprocessingApp.utils.resumen_utils._hash_archivo') as hashear:
+            pendiente = cliente.get(f'/api/preprocessing/metricas/{csv_instance.id}/')
+            # Los polls siguientes no encolan otra tarea mientras esa está pendiente
+            self.assertEqual(cliente.get(f'/api/preprocessing/metricas/{csv_instance.id}/').status_code, 202)
+        resumir.assert_not_called()
+        hashear.assert_not_called()
+        self.assertEqual(pendiente.status_code, 202)
+        lanzar.assert_called_once_with(csv_instance.id)
+        calcular_metricas.apply(args=[csv_instance.id])
+        respuesta = cliente.get(f'/api/preprocessing/metricas/{csv_instance.id}/')
+        csv_instance.refresh_from_db()
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.data, csv_instance.metrics)
+        self.assertEqual(obtener_resumen(csv_instance, CLAVE_PROCESADO)['perfil']['filas'], 5)
+
+        # Si solo cambia el mtime la vista responde 202 sin hashear; el worker comprueba el
+        # hash, reutiliza el resumen y deja la huella al día
+        os.utime(csv_instance.processed_file.path, ns=(0, 0))
+        with mock.patch('PreprocessingApp.tasks.metricas.calcular_metricas.delay'):
+            self.assertEqual(cliente.get(f'/api/preprocessing/metricas/{csv_instance.id}/').status_code, 202)
+        with mock.patch('PreprocessingApp.utils.metrics_utils.resumir_dataset') as resumir:
+            calcular_metricas.apply(args=[csv_instance.id])
+        resumir.assert_not_called()
+        self.assertEqual(cliente.get(f'/api/preprocessing/metricas/{csv_instance.id}/').status_code, 200)
+
+    def test_graficos_en_segundo_plano_con_etag(self):
+        """Verificar que los gráficos se generan al procesar y se sirven con ETag y Last-Modified."""
+        cliente = APIClient()
+        cliente.force_authenticate(self.user)
+        get_redis_connection().delete(f'graficos_pendientes:{self.csv_instance.id}')
+        with mock.patch('PreprocessingApp.tasks.graficos.generar_graficos.delay') as lanzar, \
+                mock.patch('PreprocessingApp.utils.resumen_utils._hash_archivo') as hashear:
+            pendiente = cliente.get(f'/api/preprocessing/imagenes/{self.csv_instance.id}/')
+            # Los polls siguientes no encolan otra tarea mientras esa está pendiente
+            self.assertEqual(cliente.get(f'/api/preprocessing/imagenes/{self.csv_instance.id}/').status_code, 202)
+        hashear.assert_not_called()
+        self.assertEqual(pendiente.status_code, 202)
+        self.assertEqual(pendiente.data['estado'], 'pendiente')
+        lanzar.assert_called_once_with(self.csv_instance.id)
+
+        procesar_csv.apply(args=[self.csv_instance.id], kwargs={'modo': MODO_INLINE})
+        respuesta = cliente.get(f'/api/preprocessing/imagenes/{self.csv_instance.id}/')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(len(respuesta.data['images']), 4)
+        etag = respuesta['ETag']
+        self.assertEqual(cliente.get(f'/api/preprocessing/imagenes/{self.csv_instance.id}/',
+                                     HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        url_imagen = respuesta.data['images'][0]
+        imagen = cliente.get(url_imagen)
+        self.assertEqual(imagen.status_code, 200)
+        self.assertEqual(imagen['Content-Type'], 'image/png')
+        self.assertEqual(cliente.get(url_imagen, HTTP_IF_NONE_MATCH=imagen['ETag']).status_code, 304)
+        self.assertEqual(cliente.get(url_imagen, HTTP_IF_MODIFIED_SINCE=imagen['Last-Modified']).status_code, 304)
+
+        # Reprocesar con los mismos datos no regenera los gráficos
+        with mock.patch('PreprocessingApp.tasks.graficos.generar_graficos_desde_resumenes') as generar:
+            procesar_csv.apply(args=[self.csv_instance.id], kwargs={'modo': MODO_INLINE})
+        generar.assert_not_called()
+
+        # Si solo cambia el mtime la vista responde 202 sin hashear; la tarea comprueba el hash
+        # y, con el mismo contenido, no regenera los gráficos
+        self.csv_instance.refresh_from_db()
+        os.utime(self.csv_instance.processed_file.path, ns=(0, 0))
+        with mock.patch('PreprocessingApp.tasks.graficos.generar_graficos.delay'), \
+                mock.patch('PreprocessingApp.utils.resumen_utils._hash_archivo') as hashear:
+            self.assertEqual(cliente.get(f'/api/preprocessing/imagenes/{self.csv_instance.id}/').status_code, 202)
+        hashear.assert_not_called()
+        with mock.patch('PreprocessingApp.tasks.graficos.generar_graficos_desde_resumenes') as generar:
+            generar_graficos.apply(args=[self.csv_instance.id])
+        generar.assert_not_called()
+        self.assertEqual(cliente.get(f'/api/preprocessing/imagenes/{self.csv_instance.id}/')['ETag'], etag)
+
+    @override_settings(PREPROCESSING_RESULT_CACHE=False)
+    def test_progreso_publicado_por_etapa(self):
+        """Verificar que cada etapa de la cadena publica su progreso en el canal del CSV, en orden."""
+        csv_id = self.csv_instance.id
+        suscripcion = get_redis_connection().pubsub()
+        suscripcion.subscribe(canal_progreso(csv_id))
+        try:
+            procesar_csv.apply(args=[csv_id], kwargs={'modo': MODO_CADENA})
+            eventos = []
+            while (mensaje := suscripcion.get_message(timeout=0.5)) is not None:
+                if mensaje['type'] == 'message':
+                    eventos.append(json.loads(mensaje['data']))
+        finally:
+            suscripcion.close()
+
+        self.assertEqual([evento['etapa'] for evento in eventos],
+                         ['inicio'] + [nombre for nombre, _ in ETAPAS] + ['fin'])
+        secuencias = [evento['secuencia'] for evento in eventos]
+        self.assertEqual(secuencias, sorted(secuencias))
+        porcentajes = [evento['porcentaje'] for evento in eventos]
+        self.assertEqual(porcentajes, sorted(porcentajes))
+        self.assertEqual((porcentajes[0], porcentajes[-1]), (0, 100))
+        self.assertEqual(eventos[1]['filas_entrada'], 2)
+        self.assertEqual(eventos[-1]['estado'], 'listo')
+        self.assertEqual(ultimo_progreso(csv_id), eventos[-1])
+
+    def test_progreso_por_sse_y_long_poll(self):
+        """Verificar el stream SSE, el long-poll y el estado de la base cuando Redis no tiene eventos."""
+        cliente = APIClient()
+        cliente.force_authenticate(self.user)
+        url = f'/api/preprocessing/progreso/{self.csv_instance.id}/'
+        procesar_csv.apply(args=[self.csv_instance.id], kwargs={'modo': MODO_INLINE})
+        ultimo = ultimo_progreso(self.csv_instance.id)
+
+        respuesta = cliente.get(url, HTTP_ACCEPT='text/event-stream')
+        self.assertEqual(respuesta['Content-Type'], 'text/event-stream')
+        contenido = b''.join(respuesta.streaming_content).decode()
+        self.assertIn(f"id: {ultimo['secuencia']}\nevent: progreso\n", contenido)
+        self.assertIn('"estado": "listo"', contenido)
+
+        self.assertEqual(cliente.get(url).data['secuencia'], ultimo['secuencia'])
+        self.assertEqual(cliente.get(url, {'despues_de': ultimo['secuencia'], 'espera': 0}).status_code, 204)
+
+        with mock.patch('PreprocessingApp.views.ultimo_progreso', return_value=None):
+            self.assertEqual(cliente.get(url).data['estado'], 'listo')
+
+    @override_settings(PREPROCESSING_RESULT_CACHE=False)
+    def test_telemetria_de_ejecucion_por_etapa(self):
+        """Verificar que cada etapa de la cadena queda registrada como StageRun y se expone por CSV."""
+        procesar_csv.apply(args=[self.csv_instance.id], kwargs={'modo': MODO_CADENA})
+        run = ProcessingRun.objects.get(csv=self.csv_instance)
+        self.assertEqual(run.status, ProcessingRun.STATUS_DONE)
+        self.assertIsNotNone(run.duration_seconds)
+        etapas = list(run.stages.all())
+        self.assertEqual([etapa.stage for etapa in etapas],
+                         ['lectura'] + [nombre for nombre, _ in ETAPAS] + ['guardado'])
+        self.assertEqual((etapas[1].rows_in, etapas[1].columns_in), (2, 2))
+        for etapa in etapas:
+            self.assertGreaterEqual(etapa.duration_seconds, 0)
+            self.assertGreater(etapa.peak_rss_bytes, 0)
+            self.assertTrue(etapa.worker)
+
+        cliente = APIClient()
+        cliente.force_authenticate(self.user)
+        respuesta = cliente.get(f'/api/preprocessing/ejecuciones/{self.csv_instance.id}/')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.data[0]['mode'], MODO_CADENA)
+        self.assertEqual(len(respuesta.data[0]['stages']), len(etapas))
+
+        # Un CSV que falla cierra su ejecución con el error
+        vacio = CSVModel.objects.create(user=self.user, file=SimpleUploadedFile("vacio.csv", b""))
+        procesar_csv.apply(args=[vacio.id])
+        self.assertEqual(ProcessingRun.objects.get(csv=vacio).status, ProcessingRun.STATUS_ERROR)
+
+    def test_cerrar_ejecucion_solo_la_propia(self):
+        """Verificar que cerrar una ejecución no cierra otra del mismo CSV y que el contador suma una vez."""
+        from PreprocessingApp.tasks.telemetria import cerrar_ejecucion
+
+        primera = ProcessingRun.objects.create(csv=self.csv_instance, mode=MODO_INLINE)
+        segunda = ProcessingRun.objects.create(csv=self.csv_instance, mode=MODO_INLINE)
+        with mock.patch('PreprocessingApp.tasks.telemetria.CSV_PROCESADOS') as contador:
+            self.assertTrue(cerrar_ejecucion(primera.id, ProcessingRun.STATUS_ERROR, 'falló'))
+            # La tarea y el errback del chord cierran la misma ejecución: la segunda vez no cuenta
+            self.assertFalse(cerrar_ejecucion(primera.id, ProcessingRun.STATUS_ERROR, 'falló'))
+            self.assertFalse(cerrar_ejecucion(None, ProcessingRun.STATUS_DONE))
+        contador.inc.assert_called_once_with(result=ProcessingRun.STATUS_ERROR)
+        primera.refresh_from_db()
+        segunda.refresh_from_db()
+        self.assertEqual((primera.status, primera.error_message), (ProcessingRun.STATUS_ERROR, 'falló'))
+        self.assertIsNotNone(primera.duration_seconds)
+        self.assertEqual(segunda.status, ProcessingRun.STATUS_RUNNING)
+
+    def test_percentiles_por_etapa(self):
+        """Verificar los percentiles por etapa sobre todas las ejecuciones y que solo los ve un administrador."""
+        self.assertAlmostEqual(percentil([1.0, 2.0, 3.0, 10.0], 95), np.percentile([1.0, 2.0, 3.0, 10.0], 95))
+        procesar_csv.apply(args=[self.csv_instance.id], kwargs={'modo': MODO_INLINE})
+        with override_settings(PREPROCESSING_RESULT_CACHE=False):
+            procesar_csv.apply(args=[self.csv_instance.id], kwargs={'modo': MODO_INLINE})
+
+        cliente = APIClient()
+        cliente.force_authenticate(self.user)
+        self.assertEqual(cliente.get('/api/preprocessing/ejecuciones/etapas/').status_code, 403)
+        cliente.force_authenticate(User.objects.create_user(username='admin', password='x', is_staff=True))
+        respuesta = cliente.get('/api/preprocessing/ejecuciones/etapas/', {'modo': MODO_INLINE})
+        self.assertEqual(respuesta.status_code, 200)
+        imputacion = respuesta.data['etapas']['imputacion']
+        duraciones = sorted(StageRun.objects.filter(stage='imputacion').values_list('duration_seconds', flat=True))
+        self.assertEqual(imputacion['ejecuciones'], 2)
+        self.assertAlmostEqual(imputacion['duration_seconds']['p50'], np.percentile(duraciones, 50))
+        self.assertAlmostEqual(imputacion['duration_seconds']['p95'], np.percentile(duraciones, 95))
+
+    def test_metricas_prometheus(self):
+        """Verificar que /metrics expone tareas, etapas, requests y colas agregados en Redis."""
+        procesar_csv.apply(args=[self.csv_instance.id])
+        cliente = APIClient()
+        cliente.force_authenticate(self.user)
+        cliente.get(f'/api/preprocessing/ejecuciones/{self.csv_instance.id}/')
+
+        # Sin token configurado /metrics solo responde con DEBUG
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        with override_settings(DEBUG=True):
+            respuesta = self.client.get('/metrics')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertTrue(respuesta['Content-Type'].startswith('text/plain; version=0.0.4'))
+        texto = respuesta.content.decode()
+        self.assertIn('celery_task_duration_seconds_bucket{task="procesar_csv",le="+Inf"}', texto)
+        self.assertIn('celery_tasks_total{task="procesar_csv",state="success"}', texto)
+        self.assertIn('http_request_duration_seconds_count{view="csv-ejecuciones",method="GET",status="200"}', texto)
+        self.assertIn('preprocessing_stage_duration_seconds_count{stage="lectura"}', texto)
+        self.assertIn('preprocessing_csv_total{result="listo"}', texto)
+        self.assertIn('celery_queue_length{queue="celery"}', texto)
+
+        with override_settings(PREPROCESSING_METRICS_TOKEN='secreto'):
+            self.assertEqual(self.client.get('/metrics').status_code, 401)
+            self.assertEqual(self.client.get('/metrics', HTTP_AUTHORIZATION='Bearer secreto').status_code, 200)
+
+        # Con Redis caído la observación se descarta y las siguientes se suspenden, sin demorar el request
+        from PreprocessingApp.utils import prometheus_utils
+        conexion = mock.Mock()
+        conexion.pipeline.return_value.execute.side_effect = redis.TimeoutError('colgado')
+        with mock.patch.object(prometheus_utils, '_conexion', conexion), \
+                mock.patch.object(prometheus_utils, '_suspendido_hasta', 0.0):
+            prometheus_utils.CSV_PROCESADOS.inc(result='listo')
+            prometheus_utils.CSV_PROCESADOS.inc(result='listo')
+            self.assertEqual(conexion.pipeline.call_count, 1)
+        self.assertEqual(prometheus_utils._redis().connection_pool.connection_kwargs['socket_timeout'],
+                         settings.PREPROCESSING_METRICS_REDIS_TIMEOUT)
+
+    def test_proceso_web_sin_librerias_pesadas(self):
+        """Verificar que importar las URLs (y con ellas las vistas) no carga el stack científico."""
+        codigo = (
+            "import json, sys, django; django.setup(); import PreprocessingApp.urls; "
+            "print(json.dumps([m for m in ('pandas', 'sklearn', 'scipy', 'matplotlib', 'seaborn') if m in sys.modules]))"
+        )
+        entorno = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'backend.settings'}
+        salida = subprocess.run([sys.executable, '-c', codigo], cwd=settings.BASE_DIR, env=entorno,
+                                capture_output=True, text=True, check=True).stdout
+        self.assertEqual(json.loads(salida.strip().splitlines()[-1]), [])
+
+    def test_benchmark_pipeline_datos_sinteticos(self):
+        """Verificar el generador sintético y una corrida chica del benchmark contra la línea base."""
+        from benchmarks import pipeline as benchmark
+
+        df = benchmark.generar_dataset(1000, 11, nulos=0.1, duplicados=0.05, categoricas=0.2)
+        self.assertEqual(df.shape, (1000, 11))
+        self.assertEqual(sum(col.startswith('cat_') for col in df.columns), 2)
+        self.assertEqual(df.duplicated().sum(), 50)
+        self.assertAlmostEqual(df['num_0'].isna().mean(), 0.1, delta=0.03)
+
+        tiempos = benchmark.medir_tamano(200, 6, repeticiones=1, graficos=False)
+        self.assertEqual(set(tiempos), {'lectura', 'pipeline', 'cadena', 'metricas'}
+                         | {f'etapa:{nombre}' for nombre, _ in ETAPAS})
+        # Solo cuenta como regresión si supera la tolerancia y el piso de ruido
+        base = {'tamanos': {'200x6': {'tiempos': {'pipeline': 1.0, 'cadena': 1.0, 'metricas': 0.01}}}}
+        actual = {'200x6': {'pipeline': 2.0, 'cadena': 1.1, 'metricas': 0.03, 'graficos': 1.0}}
+        self.assertEqual([fila[1] for fila in benchmark.comparar(actual, base, 1.25) if fila[-1]], ['pipeline'])
+
+    def test_memoria_por_etapa_dentro_del_presupuesto(self):
+        """Verificar que el pico y el neto de memoria de cada etapa respetan los presupuestos versionados."""
+        from benchmarks import memoria
+        from benchmarks.pipeline import generar_dataset
+
+        df = generar_dataset(20000, 20)
+        mediciones = memoria.perfilar_etapas(df, 'target')
+        presupuestos = memoria.cargar_presupuestos()
+        self.assertEqual(set(mediciones), set(presupuestos))
+        self.assertEqual(memoria.excedidos(mediciones, presupuestos), [])
+        self.assertEqual(memoria.excedidos(mediciones, {'normalizacion': {'pico': 0.01}})[0][:2],
+                         ('normalizacion', 'pico'))
+
+    @override_settings(PREPROCESSING_SHARD_BYTES=64, PREPROCESSING_CHUNK_SIZE=5)
+    def test_procesar_csv_modo_shards(self):
+        """Verificar que el procesamiento por shards equivale al pipeline en memoria."""
+        rng = np.random.default_rng(3)
+        df = pd.DataFrame({'x': rng.normal(size=60).round(3), 'y': rng.normal(size=60).round(3)})
+        df.loc[::5, 'x'] = np.nan
+        df = pd.concat([df, df.iloc[:10]], ignore_index=True)
+        csv_file = SimpleUploadedFile('shards.csv', df.to_csv(index=False).encode(), content_type='text/csv')
+        csv_instance = CSVModel.objects.create(user=self.user, file=csv_file, target_column='y')
+
+        rangos = dividir_en_shards(csv_instance.file.path, 64)
+        self.assertGreater(len(rangos), 1)
+        self.assertEqual(rangos[-1][1], os.path.getsize(csv_instance.file.path))
+
+        procesar_csv.apply(args=[csv_instance.id], kwargs={'modo': MODO_SHARDS})
+        csv_instance.refresh_from_db()
+        self.assertTrue(csv_instance.is_ready)
+
+        df_inline, _ = ejecutar_pipeline(pd.read_csv(csv_instance.file.path), 'y')
+        df_shards = pd.read_csv(csv_instance.processed_file.path)
+        pd.testing.assert_frame_equal(df_inline.reset_index(drop=True), df_shards)
+        with open(ruta_resumen(csv_instance)) as f:
+            resumenes = json.load(f)
+        self.assertEqual(resumenes[CLAVE_ORIGINAL]['resumen']['filas_duplicadas'], 10)
+        self.assertEqual(resumenes[CLAVE_PROCESADO]['resumen']['perfil']['filas'], len(df_shards))
+
+        # Con un presupuesto mínimo los hashes se unen por corridas en disco con el mismo resultado
+        otro = CSVModel.objects.create(user=self.user, target_column='y', file=SimpleUploadedFile(
+            'shards_disco.csv', df.to_csv(index=False).encode(), content_type='text/csv'))
+        with override_settings(PREPROCESSING_DEDUP_MEMORY_BYTES=32, PREPROCESSING_RESULT_CACHE=False):
+            procesar_csv.apply(args=[otro.id], kwargs={'modo': MODO_SHARDS})
+        otro.refresh_from_db()
+        pd.testing.assert_frame_equal(pd.read_csv(otro.processed_file.path), df_shards)
+
+    @override_settings(PREPROCESSING_SHARD_BYTES=64)
+    def test_procesar_csv_modo_shards_con_error(self):
+        """Verificar que un shard que falla deja el CSV y la ejecución con el error."""
+        from PreprocessingApp.tasks.shards import directorio_shards, registrar_fallo_shards
+
+        df = pd.DataFrame({'x': np.arange(40, dtype=float), 'y': np.arange(40) % 2})
+        csv_file = SimpleUploadedFile('shards_error.csv', df.to_csv(index=False).encode(), content_type='text/csv')
+        csv_instance = CSVModel.objects.create(user=self.user, file=csv_file, target_column='y')
+        with mock.patch('PreprocessingApp.tasks.shards.convertir_bloque', side_effect=ValueError('shard roto')):
+            procesar_csv.apply(args=[csv_instance.id], kwargs={'modo': MODO_SHARDS})
+        csv_instance.refresh_from_db()
+        self.assertFalse(csv_instance.is_ready)
+        self.assertIn('shard roto', csv_instance.error_message)
+        self.assertEqual(ProcessingRun.objects.get(csv=csv_instance).status, ProcessingRun.STATUS_ERROR)
+
+        # El errback de los chords registra el error si la tarea no llegó a hacerlo y borra solo
+        # la carpeta de su ejecución, no la de otra ejecución del mismo CSV
+        otro = CSVModel.objects.create(user=self.user, file=SimpleUploadedFile(
+            'shards_errback.csv', df.to_csv(index=False).encode(), content_type='text/csv'), target_column='y')
+        directorio, en_curso = directorio_shards(otro.file.path, 1), directorio_shards(otro.file.path, 2)
+        for carpeta in (directorio, en_curso):
+            os.makedirs(carpeta, exist_ok=True)
+        registrar_fallo_shards(None, RuntimeError('worker perdido'), None, otro.id, directorio)
+        otro.refresh_from_db()
+        self.assertEqual(otro.error_message, 'worker perdido')
+        self.assertFalse(os.path.exists(directorio))
+        self.assertTrue(os.path.isdir(en_curso))
+
+    def test_objetivo_no_numerico_por_bloques_y_shards(self):
+        """Verificar que por bloques y shards un objetivo no numérico falla como en memoria, sin imputarlo."""
+        df = pd.DataFrame({'x': np.arange(40, dtype=float), 'y': (np.arange(40) % 2).astype(str)})
+        df.loc[30, 'y'] = 'abc'
+        for modo in (MODO_BLOQUES, MODO_SHARDS):
+            csv_file = SimpleUploadedFile(f'objetivo_{modo}.csv', df.to_csv(index=False).encode(),
+                                          content_type='text/csv')
+            csv_instance = CSVModel.objects.create(user=self.user, file=csv_file, target_column='y')
+            procesar_csv.apply(args=[csv_instance.id], kwargs={'modo': modo})
+            csv_instance.refresh_from_db()
+            self.assertFalse(csv_instance.is_ready, modo)
+            self.assertEqual(csv_instance.error_message,
+                             'La columna objetivo "y" no es numérica ni convertible a numérica.', modo)
+            self.assertEqual(ProcessingRun.objects.get(csv=csv_instance).status, ProcessingRun.STATUS_ERROR, modo)
+
+    @override_settings(PREPROCESSING_CHUNK_SIZE=1)
+    def test_tipos_compactos(self):
+        """Verificar la elección de tipos compactos y que las etapas no vuelvan a 64 bits."""
+        from PreprocessingApp.utils.dtype_utils import compactar, conservar_tipos
+
+        df = compactar(pd.DataFrame({
+            'entero': [1, 2, 3, 4],
+            'flotante': [0.5, np.nan, 2.25, 1.0],
+            'enorme': [1e300, 1.0, 2.0, 3.0],
+            'diminuto': [1e-40, 1.0, 2.0, 3.0],
+            'categoria': ['a', 'b', 'a', 'a'],
+            'texto': ['w', 'x', 'y', 'z'],
+        }))
+        self.assertEqual(df.dtypes.astype(str).to_dict(), {
+            'entero': 'int8', 'flotante': 'float32', 'enorme': 'float64',
+            'diminuto': 'float64', 'categoria': 'category', 'texto': 'object',
+        })
+        agrandado = df[['entero', 'flotante']].astype('float64')
+        agrandado['flotante'] = agrandado['flotante'].fillna(1.0)
+        self.assertEqual(conservar_tipos(agrandado, df.dtypes).dtypes.astype(str).tolist(), ['int8', 'float32'])
+        self.assertEqual(str(conservar_tipos(agrandado / 2, df.dtypes)['entero'].dtype), 'float32')
+
+    def test_modo_compacto_conserva_ids_y_timestamps(self):
+        """Verificar que las columnas tipo ID/timestamp no pasan a float32 ni crean duplicados."""
+        from PreprocessingApp.utils.dtype_utils import compactar
+
+        filas = 200
+        df = pd.DataFrame({
+            'timestamp': 1.7e9 + np.arange(filas, dtype='float64'),
+            'medida': np.linspace(0, 1, filas),
+            'cercanos': 1.0 + np.arange(filas) * 1e-9,
+            'target': np.arange(filas) % 2,
+        })
+        df.loc[3, 'timestamp'] = np.nan
+        tipos = compactar(df).dtypes.astype(str).to_dict()
+        self.assertEqual(tipos['timestamp'], 'float64')
+        self.assertEqual(tipos['cercanos'], 'float64')
+        self.assertEqual(tipos['medida'], 'float32')
+
+        filas_resultado = {}
+        for compacto in (False, True):
+            with override_settings(PREPROCESSING_COMPACT_DTYPES=compacto):
+                filas_resultado[compacto] = len(ejecutar_pipeline(preparar_original(df, 'target'), 'target')[0])
+        self.assertEqual(filas_resultado[True], filas_resultado[False])
+
+    def test_modo_compacto_equivalente(self):
+        """Verificar que el pipeline en modo compacto da el mismo resultado dentro de la tolerancia."""
+        from benchmarks.pipeline import generar_dataset
+
+        resultados = {}
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'compacto.csv')
+            generar_dataset(3000, 12).to_csv(path, index=False)
+            for compacto in (False, True):
+                with override_settings(PREPROCESSING_COMPACT_DTYPES=compacto):
+                    df = preparar_original(pd.read_csv(path), 'target')
+                    resultados[compacto] = (df.memory_usage(deep=True).sum(), ejecutar_pipeline(df, 'target')[0])
+        (memoria, normal), (memoria_compacta, compacto) = resultados[False], resultados[True]
+        self.assertLess(memoria_compacta, memoria / 2)
+        self.assertTrue(normal.index.equals(compacto.index))
+        # Las columnas donde dos valores distintos coinciden en float32 quedan en float64
+        self.assertIn('float32', set(compacto.dtypes.astype(str)))
+        self.assertLessEqual(set(compacto.dtypes.astype(str)), {'float32', 'float64', 'int8'})
+        np.testing.assert_allclose(compacto.to_numpy('float64'), normal.to_numpy('float64'), rtol=1e-5, atol=1e-5)
+
+        # La cadena con artefactos Parquet conserva los tipos hasta el CSV procesado
+        with override_settings(PREPROCESSING_COMPACT_DTYPES=True):
+            procesar_csv.apply(args=[self.csv_instance.id], kwargs={'modo': MODO_CADENA})
+        self.assertTrue(CSVModel.objects.get(id=self.csv_instance.id).is_ready)
+
+    def test_procesar_csv_modo_bloques(self):
+        """Verificar que procesar_csv completa el flujo en modo por bloques."""
+        csv_id = self.csv_instance.id
+        procesar_csv.apply(args=[csv_id], kwargs={'modo': MODO_BLOQUES})
+
+        csv_instance = CSVModel.objects.get(id=csv_id)
+        self.assertTrue(csv_instance.is_ready)
+        self.assertEqual(len(pd.read_csv(csv_instance.processed_file.path)), 2)
+
+        # Los resúmenes salen de las pasadas por bloques; con un archivo más chico que la muestra son los exactos
+        rng = np.random.default_rng(5)
+        df = pd.DataFrame({'x': rng.normal(size=80), 'z': rng.normal(size=80), 'y': rng.integers(0, 2, 80)})
+        df.loc[::7, 'x'] = np.nan
+        df = pd.concat([df, df.iloc[:6]], ignore_index=True)
+        otro = CSVModel.objects.create(user=self.user, target_column='y', file=SimpleUploadedFile(
+            'resumen_bloques.csv', df.to_csv(index=False).encode(), content_type='text/csv'))
+        with override_settings(PREPROCESSING_CHUNK_SIZE=16):
+            procesar_csv.apply(args=[otro.id], kwargs={'modo': MODO_BLOQUES})
+        otro.refresh_from_db()
+        with open(ruta_resumen(otro)) as f:
+            resumenes = json.load(f)
+        self.assertEqual(set(resumenes), {CLAVE_ORIGINAL, CLAVE_PROCESADO})
+        exacto = resumir_dataset(preparar_original(df, 'y'), 'y')
+        original = resumenes[CLAVE_ORIGINAL]['resumen']
+        for clave in ('celdas', 'nulos', 'filas_duplicadas', 'outliers', 'valores_numericos'):
+            self.assertEqual(original[clave], exacto[clave], clave)
+        procesado = resumenes[CLAVE_PROCESADO]['resumen']
+        self.assertEqual(procesado['perfil']['filas'], len(pd.read_csv(otro.processed_file.path)))
+        self.assertEqual(procesado['nulos'], 0)
+        # Las métricas quedan calculadas en el worker, sin leer los CSV enteros
+        self.assertEqual(otro.metrics['Valores faltantes']['csv_normal'], exacto['nulos'])
+
+        # Recalcular el resumen de un archivo grande también es por bloques, con muestra
+        with override_settings(PREPROCESSING_STREAMING_MIN_BYTES=1, PREPROCESSING_SUMMARY_SAMPLE_ROWS=20):
+            recalculado = guardar_resumen(otro, CLAVE_ORIGINAL)
+        self.assertEqual(recalculado['muestra'], {'filas': 20, 'filas_totales': len(df)})
+        self.assertEqual(recalculado['nulos'], exacto['nulos'])
+
     def test_preprocesamiento_no_error(self):
         """Verificar que no haya errores en el flujo de preprocesamiento."""
         csv_id = self.csv_instance.id
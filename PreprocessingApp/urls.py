@@ -1,11 +1,21 @@
 from django.urls import path
 from .views import UploadCSVView, LaunchProcessingView, MyCSVListView, CSVStatusView,CSVMetricasView,CSVImagesView
+from .views import CSVImageView, CSVProgresoView, CSVEjecucionesView, EstadisticasEtapasView
+from .views import UploadSessionView, UploadSessionDetailView, UploadPartView, UploadSessionCompleteView
 
 urlpatterns = [
     path('upload/', UploadCSVView.as_view(), name='upload_csv'),
+    path('upload/sesion/', UploadSessionView.as_view(), name='upload_session'),
+    path('upload/sesion/<int:session_id>/', UploadSessionDetailView.as_view(), name='upload_session_detail'),
+    path('upload/sesion/<int:session_id>/parte/', UploadPartView.as_view(), name='upload_part'),
+    path('upload/sesion/<int:session_id>/completar/', UploadSessionCompleteView.as_view(), name='upload_session_complete'),
     path('process/', LaunchProcessingView.as_view(), name='launch_processing'),
     path('csvlist/', MyCSVListView.as_view(), name='my_csv_list'),
     path('status/<int:csv_id>/', CSVStatusView.as_view(), name='csv-status'),
+    path('progreso/<int:csv_id>/', CSVProgresoView.as_view(), name='csv-progreso'),
+    path('ejecuciones/<int:csv_id>/', CSVEjecucionesView.as_view(), name='csv-ejecuciones'),
+    path('ejecuciones/etapas/', EstadisticasEtapasView.as_view(), name='estadisticas-etapas'),
     path('metricas/<int:csv_id>/', CSVMetricasView.as_view(), name='csv-metricas'),
     path('imagenes/<int:csv_id>/', CSVImagesView.as_view(), name='csv-imagenes'),
+    path('imagenes/<int:csv_id>/<str:nombre>/', CSVImageView.as_view(), name='csv-imagen'),
 ]
\ No newline at end of file
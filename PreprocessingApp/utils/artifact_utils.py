@@ -0,0 +1,127 @@
+import hashlib
+import os
+import shutil
+import uuid
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+NOMBRE_CARPETA_ARTEFACTOS = 'artefactos'
+
+
+def calcular_hash_archivo(path, tamano_bloque=1024 * 1024):
+    """Calcula el SHA-256 de un archivo leyéndolo por bloques"""
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for bloque in iter(lambda: f.read(tamano_bloque), b''):
+            sha.update(bloque)
+    return sha.hexdigest()
+
+
+def directorio_artefactos(csv_path, ejecucion=None):
+    """
+    Carpeta de artefactos intermedios de una ejecución (run_id o id de tarea)
+    junto al csv_original.csv: artefactos/<ejecucion>/. Dos ejecuciones del
+    mismo CSV no comparten archivos ni se borran la carpeta entre sí. Sin
+    ejecucion se usa un identificador nuevo.
+    """
+    ejecucion = uuid.uuid4().hex if ejecucion is None else str(ejecucion)
+    return os.path.join(os.path.dirname(csv_path), NOMBRE_CARPETA_ARTEFACTOS, ejecucion)
+
+
+def _preparar_para_parquet(df):
+    """
+    Parquet exige un tipo por columna: las columnas object con tipos mezclados
+    (p.ej. números y texto leídos por bloques en read_csv) se guardan como texto.
+    """
+    mezcladas = [
+        col for col in df.select_dtypes(include=['object']).columns
+        if pd.api.types.infer_dtype(df[col], skipna=True) not in ('string', 'empty')
+    ]
+    if not mezcladas:
+        return df
+    df = df.copy()
+    for col in mezcladas:
+        df[col] = df[col].where(df[col].isnull(), df[col].astype(str))
+    return df
+
+
+def guardar_artefacto(df, directorio, etapa):
+    """
+    Escribe el DataFrame como Parquet y devuelve un handle liviano (claim-check)
+    que es lo único que viaja por el broker entre tareas de la cadena.
+    """
+    os.makedirs(directorio, exist_ok=True)
+    path = os.path.join(directorio, f'{etapa}.parquet')
+    _preparar_para_parquet(df).to_parquet(path, index=False)
+    return {
+        'path': path,
+        'hash': calcular_hash_archivo(path),
+        'esquema': {str(col): str(dtype) for col, dtype in df.dtypes.items()},
+        'filas': len(df),
+    }
+
+
+def guardar_artefacto_por_bloques(bloques, directorio, etapa, esquema_arrow):
+    """
+    Como guardar_artefacto, pero escribiendo de a un DataFrame por vez con un
+    esquema de Arrow fijo (p. ej. el del artefacto de entrada, ver esquema_artefacto)
+    """
+    os.makedirs(directorio, exist_ok=True)
+    path = os.path.join(directorio, f'{etapa}.parquet')
+    filas = 0
+    esquema = {}
+    with pq.ParquetWriter(path, esquema_arrow) as escritor:
+        for bloque in bloques:
+            bloque = _preparar_para_parquet(bloque)
+            escritor.write_table(pa.Table.from_pandas(bloque, schema=esquema_arrow, preserve_index=False))
+            esquema = esquema or {str(col): str(dtype) for col, dtype in bloque.dtypes.items()}
+            filas += len(bloque)
+    return {'path': path, 'hash': calcular_hash_archivo(path), 'esquema': esquema, 'filas': filas}
+
+
+def esquema_artefacto(artefacto, columnas=None):
+    """Esquema de Arrow del artefacto, opcionalmente restringido a algunas columnas"""
+    esquema = pq.read_schema(artefacto['path'])
+    if columnas is None:
+        return esquema
+    return pa.schema([esquema.field(col) for col in columnas])
+
+
+def guardar_siguiente_artefacto(df, artefacto, etapa):
+    """Guarda la salida de una etapa en la misma carpeta que el artefacto de entrada"""
+    return guardar_artefacto(df, os.path.dirname(artefacto['path']), etapa)
+
+
+def cargar_artefacto(artefacto):
+    """Lee el DataFrame referenciado por el handle verificando su hash de contenido"""
+    path = artefacto['path']
+    if calcular_hash_archivo(path) != artefacto['hash']:
+        raise ValueError(f"El artefacto {path} no coincide con su hash")
+    return pd.read_parquet(path)
+
+
+def leer_artefacto_por_bloques(artefacto, columnas=None, chunk_size=100_000):
+    """Itera el artefacto en DataFrames de hasta chunk_size filas, verificando antes su hash"""
+    path = artefacto['path']
+    if calcular_hash_archivo(path) != artefacto['hash']:
+        raise ValueError(f"El artefacto {path} no coincide con su hash")
+    for lote in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=columnas):
+        yield lote.to_pandas()
+
+
+def eliminar_artefactos(artefacto):
+    """
+    Borra la carpeta de artefactos de la ejecución una vez terminado el
+    procesamiento, y artefactos/ si no quedan otras ejecuciones en curso
+    """
+    directorio = os.path.dirname(artefacto['path'])
+    padre = os.path.dirname(directorio)
+    if os.path.basename(padre) != NOMBRE_CARPETA_ARTEFACTOS:
+        return
+    shutil.rmtree(directorio, ignore_errors=True)
+    try:
+        os.rmdir(padre)
+    except OSError:
+        # Otra ejecución del mismo CSV sigue usando su carpeta
+        pass
@@ -0,0 +1,188 @@
+"""
+Conjunto de hashes de filas con memoria acotada, para deduplicar por bloques.
+
+Los hashes de 64 bits se guardan en memoria como arrays ordenados (los lotes
+recientes se juntan con el principal cada MAX_LOTES_PENDIENTES lotes, para no
+reordenar todo en cada bloque). Cuando superan el presupuesto
+(PREPROCESSING_DEDUP_MEMORY_BYTES) se vuelcan a disco como una corrida ordenada
+(.npy) que se consulta con np.load(mmap_mode='r') y búsqueda binaria, así que
+la memoria residente no crece con el archivo. Opcionalmente un filtro de Bloom
+sobre los hashes volcados evita leer las corridas para los hashes que seguro
+no están; se crea recién con el primer volcado.
+
+Las corridas de un conjunto son disjuntas y cada una está ordenada, así que
+otro proceso puede recorrerlas por lotes (recorrer_corrida) sin cargarlas
+enteras, p. ej. para unir los hashes de varios shards (ver tasks/shards.py).
+
+La deduplicación no es exacta: se compara solo el hash de 64 bits, no el
+contenido de las filas (que ya no están en memoria), así que dos filas
+distintas con el mismo hash cuentan como duplicadas y se descarta la segunda.
+Con n filas únicas la cantidad esperada de colisiones es de n²/2⁶⁵: unas
+3·10⁻⁶ con 10⁷ filas y 0.03 con 10⁹. El pipeline en memoria (df.duplicated)
+sí es exacto.
+"""
+import os
+import shutil
+import tempfile
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+MAX_LOTES_PENDIENTES = 8
+# Hashes por lote al recorrer una corrida desde disco (8 MB)
+TAMANO_LOTE_CORRIDA = 1 << 20
+
+
+class FiltroBloom:
+    """Filtro de Bloom sobre hashes de 64 bits, con k posiciones por doble hashing"""
+
+    def __init__(self, bits, k=4):
+        self.bits = max(64, int(bits))
+        self.k = k
+        self.tabla = np.zeros((self.bits + 7) // 8, dtype=np.uint8)
+
+    def _posiciones(self, hashes):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        h1 = hashes & np.uint64(0xFFFFFFFF)
+        h2 = (hashes >> np.uint64(32)) | np.uint64(1)
+        return [(h1 + np.uint64(i) * h2) % np.uint64(self.bits) for i in range(self.k)]
+
+    def agregar(self, hashes):
+        for posiciones in self._posiciones(hashes):
+            bits = (np.uint64(1) << (posiciones & np.uint64(7))).astype(np.uint8)
+            np.bitwise_or.at(self.tabla, (posiciones >> np.uint64(3)).astype(np.int64), bits)
+
+    def puede_contener(self, hashes):
+        resultado = np.ones(len(hashes), dtype=bool)
+        for posiciones in self._posiciones(hashes):
+            bytes_tabla = self.tabla[(posiciones >> np.uint64(3)).astype(np.int64)]
+            resultado &= ((bytes_tabla >> (posiciones & np.uint64(7)).astype(np.uint8)) & 1).astype(bool)
+        return resultado
+
+
+def _contiene_ordenado(ordenado, hashes):
+    if len(ordenado) == 0 or len(hashes) == 0:
+        return np.zeros(len(hashes), dtype=bool)
+    posiciones = np.searchsorted(ordenado, hashes)
+    posiciones = np.minimum(posiciones, len(ordenado) - 1)
+    return ordenado[posiciones] == hashes
+
+
+def recorrer_corrida(path, tamano_lote=TAMANO_LOTE_CORRIDA):
+    """Los hashes de una corrida (.npy) en lotes ordenados, sin cargarla en memoria"""
+    corrida = np.load(path, mmap_mode='r')
+    for inicio in range(0, len(corrida), tamano_lote):
+        yield np.array(corrida[inicio:inicio + tamano_lote])
+
+
+class ConjuntoHashes:
+    """
+    Conjunto de hashes uint64 que vuelca corridas ordenadas a disco al superar
+    memoria_max bytes. Usar como context manager o llamar a cerrar() para borrar
+    las corridas.
+    """
+
+    def __init__(self, memoria_max=None, directorio=None, bloom_bits=None):
+        self.memoria_max = memoria_max or settings.PREPROCESSING_DEDUP_MEMORY_BYTES
+        self.bloom_bits = settings.PREPROCESSING_DEDUP_BLOOM_BITS if bloom_bits is None else bloom_bits
+        self.bloom = None
+        self.directorio = directorio
+        self._directorio_propio = False
+        self.memoria = np.empty(0, dtype=np.uint64)
+        self.pendientes = []
+        self.corridas = []
+        self.volcados = 0
+        self.tamano = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.cerrar()
+
+    def __len__(self):
+        return self.tamano
+
+    def contiene(self, hashes):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        presentes = _contiene_ordenado(self.memoria, hashes)
+        for lote in self.pendientes:
+            presentes |= _contiene_ordenado(lote, hashes)
+        if self.corridas:
+            pendientes = ~presentes
+            if self.bloom is not None:
+                pendientes &= self.bloom.puede_contener(hashes)
+            candidatos = hashes[pendientes]
+            encontrados = np.zeros(len(candidatos), dtype=bool)
+            for corrida in self.corridas:
+                encontrados |= _contiene_ordenado(np.load(corrida, mmap_mode='r'), candidatos)
+            presentes[np.flatnonzero(pendientes)[encontrados]] = True
+        return presentes
+
+    def agregar(self, hashes):
+        """Agrega hashes que no están en el conjunto (sin repetidos entre sí)"""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        if len(hashes) == 0:
+            return
+        self.pendientes.append(np.sort(hashes))
+        self.tamano += len(hashes)
+        if len(self.pendientes) >= MAX_LOTES_PENDIENTES:
+            self._juntar_pendientes()
+        if self.memoria.nbytes + sum(lote.nbytes for lote in self.pendientes) > self.memoria_max:
+            self._volcar()
+
+    def filtrar_nuevos(self, hashes):
+        """
+        Máscara de los hashes que no se vieron antes, ni en este lote ni en los
+        anteriores (keep='first'); los nuevos quedan agregados al conjunto. Una
+        fila distinta cuyo hash coincide con uno visto se toma como duplicada
+        (ver el docstring del módulo).
+        """
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        nuevos = ~pd.Series(hashes).duplicated().to_numpy()
+        nuevos[nuevos] = ~self.contiene(hashes[nuevos])
+        self.agregar(hashes[nuevos])
+        return nuevos
+
+    def _juntar_pendientes(self):
+        if self.pendientes:
+            self.memoria = np.sort(np.concatenate([self.memoria] + self.pendientes))
+            self.pendientes = []
+
+    def _volcar(self):
+        self._juntar_pendientes()
+        if self.directorio is None:
+            self.directorio = tempfile.mkdtemp(prefix='dedup_')
+            self._directorio_propio = True
+        os.makedirs(self.directorio, exist_ok=True)
+        path = os.path.join(self.directorio, f'corrida_{self.volcados}.npy')
+        self.volcados += 1
+        np.save(path, self.memoria)
+        if self.bloom is None and self.bloom_bits:
+            self.bloom = FiltroBloom(self.bloom_bits)
+        if self.bloom is not None:
+            self.bloom.agregar(self.memoria)
+        self.corridas.append(path)
+        self.memoria = np.empty(0, dtype=np.uint64)
+
+    def conservar_corridas(self):
+        """
+        Vuelca a disco lo que queda en memoria y devuelve las rutas de todas las
+        corridas, que desde ahora son de quien las pidió: cerrar() ya no las borra.
+        """
+        if len(self.memoria) or self.pendientes:
+            self._volcar()
+        corridas, self.corridas = self.corridas, []
+        self.bloom = None
+        self.tamano = 0
+        return corridas
+
+    def cerrar(self):
+        for corrida in self.corridas:
+            if os.path.exists(corrida):
+                os.remove(corrida)
+        if self._directorio_propio:
+            shutil.rmtree(self.directorio, ignore_errors=True)
+        elif self.directorio and os.path.isdir(self.directorio) and not os.listdir(self.directorio):
+            os.rmdir(self.directorio)
+        self.corridas = []
@@ -0,0 +1,122 @@
+"""
+Representación compacta de los DataFrames en memoria (PREPROCESSING_COMPACT_DTYPES).
+
+Al cargar un CSV los enteros pasan al menor ancho que contiene sus valores, los
+flotantes a float32 solo si sobreviven la ida y vuelta (ver _cabe_en_float32)
+y las columnas de texto con pocos valores distintos a category. Las etapas
+mantienen esos tipos (ver conservar_tipos) en lugar de volver a float64.
+
+Tolerancia: una columna float64 pasa a float32 solo si todos sus valores están
+en el rango normal de float32 y, de vuelta a float64, quedan exactamente iguales
+(columnas de valores enteros: IDs, timestamps, conteos) o dentro de
+rtol=1e-5/atol=1e-5 sin que dos valores distintos pasen a ser iguales. Así la
+conversión no crea duplicados ni cambia qué filas descarta la deduplicación, y
+las columnas normalizadas coinciden con las del modo normal con esa tolerancia.
+"""
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+# Columnas de texto con a lo sumo esta fracción de valores distintos pasan a category
+FRACCION_CATEGORICA = 0.5
+_FLOAT32 = np.finfo(np.float32)
+# Tolerancia de la ida y vuelta float64 -> float32 -> float64 (ver el docstring del módulo)
+RTOL_FLOAT32 = 1e-5
+ATOL_FLOAT32 = 1e-5
+
+
+def es_compacto(tipo):
+    """Tipos numéricos de numpy de menos de 64 bits (los que produce compactar)"""
+    if not isinstance(tipo, np.dtype):
+        # category y los tipos extendidos de pandas
+        return False
+    return tipo.kind in 'iuf' and tipo.itemsize < 8
+
+
+def _cabe_en_float32(valores):
+    """True si los valores pasan a float32 y vuelven sin perderse (ver el docstring del módulo)"""
+    finitos = valores[np.isfinite(valores)]
+    if not len(finitos):
+        return True
+    absolutos = np.abs(finitos)
+    distintos_de_cero = absolutos[absolutos > 0]
+    # Fuera del rango normal float32 desborda o pierde precisión (subnormales)
+    if absolutos.max() > _FLOAT32.max or (len(distintos_de_cero) and distintos_de_cero.min() < _FLOAT32.tiny):
+        return False
+    ida_y_vuelta = finitos.astype(np.float32).astype(np.float64)
+    if (np.mod(finitos, 1) == 0).all():
+        # IDs, timestamps y conteos: cualquier redondeo junta valores distintos
+        return bool((ida_y_vuelta == finitos).all())
+    if not np.allclose(ida_y_vuelta, finitos, rtol=RTOL_FLOAT32, atol=ATOL_FLOAT32):
+        return False
+    # Dos valores distintos no pueden quedar iguales: crearía duplicados
+    orden = np.argsort(finitos, kind='stable')
+    originales, redondeados = finitos[orden], ida_y_vuelta[orden]
+    return not ((redondeados[1:] == redondeados[:-1]) & (originales[1:] != originales[:-1])).any()
+
+
+def compactar_serie(serie):
+    """La columna con el tipo más chico que conserva sus valores (ver el docstring del módulo)"""
+    if pd.api.types.is_bool_dtype(serie) or isinstance(serie.dtype, pd.CategoricalDtype):
+        return serie
+    if pd.api.types.is_integer_dtype(serie):
+        return pd.to_numeric(serie, downcast='integer')
+    if pd.api.types.is_float_dtype(serie):
+        if serie.dtype == np.float64 and _cabe_en_float32(serie.to_numpy()):
+            return serie.astype(np.float32)
+        return serie
+    if serie.dtype == object and len(serie) and serie.nunique(dropna=True) <= FRACCION_CATEGORICA * len(serie):
+        return serie.astype('category')
+    return serie
+
+
+def _reemplazar(df, columnas):
+    # Copia superficial: solo se reemplazan las columnas que cambian, el resto se comparte
+    df = df.copy(deep=False)
+    for col, serie in columnas.items():
+        df[col] = serie
+    return df
+
+
+def compactar(df):
+    """Aplica compactar_serie a cada columna; devuelve el mismo df si ninguna cambia"""
+    columnas = {}
+    for col in df.columns:
+        compacta = compactar_serie(df[col])
+        if compacta.dtype != df[col].dtype:
+            columnas[col] = compacta
+    return _reemplazar(df, columnas) if columnas else df
+
+
+def aplicar_modo_compacto(df):
+    """compactar(df) si PREPROCESSING_COMPACT_DTYPES está activo; si no, df sin cambios"""
+    return compactar(df) if settings.PREPROCESSING_COMPACT_DTYPES else df
+
+
+def a_flotante(df):
+    """
+    Las columnas como flotantes para las etapas que calculan (imputación,
+    normalización): float32 las compactas y float64 el resto, como hasta ahora.
+    """
+    return df.astype({col: np.float32 if es_compacto(tipo) else np.float64 for col, tipo in df.dtypes.items()})
+
+
+def conservar_tipos(df, tipos):
+    """
+    Devuelve a su tipo compacto de entrada (tipos: columna -> dtype) las columnas
+    que una etapa agrandó: los enteros si siguen siendo enteros en rango, si no
+    float32. Las columnas con tipos de 64 bits no se tocan.
+    """
+    cambios = {}
+    for col, tipo in tipos.items():
+        if col not in df.columns or df[col].dtype == tipo or not es_compacto(tipo):
+            continue
+        valores = df[col].to_numpy()
+        if tipo.kind in 'iu':
+            limites = np.iinfo(tipo)
+            enteros = (np.isfinite(valores).all() and (np.mod(valores, 1) == 0).all()
+                       and valores.min(initial=0) >= limites.min and valores.max(initial=0) <= limites.max)
+            cambios[col] = df[col].astype(tipo if enteros else np.float32)
+        else:
+            cambios[col] = df[col].astype(tipo)
+    return _reemplazar(df, cambios) if cambios else df
@@ -1,19 +1,56 @@
-import matplotlib
-matplotlib.use('Agg')
+"""
+Gráficos de calidad de los CSV.
 
-import matplotlib.pyplot as plt
-import seaborn as sns
-import numpy as np
-from scipy import stats
+matplotlib, seaborn y scipy se importan recién al dibujar (ver _librerias_graficos):
+las vistas usan este módulo solo para listar los PNG, y el proceso web no debe
+cargarlas a menos que renderice.
+"""
 import os
 
+
+def _librerias_graficos():
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    from scipy import stats
+    return plt, sns, stats
+
+def directorio_graficos(base_dir):
+    return os.path.join(base_dir, 'imgs', 'calidad')
+
+def graficos_existentes(base_dir):
+    """Nombres de los PNG ya generados (ordenados)"""
+    img_dir = directorio_graficos(base_dir)
+    if not os.path.isdir(img_dir):
+        return []
+    return sorted(nombre for nombre in os.listdir(img_dir) if nombre.endswith('.png'))
+
+def _curva_kde(resumen):
+    """Curva KDE precalculada del resumen (los resúmenes viejos guardaban una muestra de z-scores)"""
+    if 'kde_zscores' in resumen:
+        return resumen['kde_zscores']
+    import numpy as np
+    from .kde_utils import kde_binned
+    return kde_binned(lambda: [np.asarray(resumen.get('zscores', []), dtype='float64')])
+
 def generar_graficos_calidad_comparativo(df_orig, df_proc, output_dir):
-    img_dir = os.path.join(output_dir, 'imgs', 'calidad')
+    from .metrics_utils import resumir_dataset
+    generar_graficos_desde_resumenes(resumir_dataset(df_orig), resumir_dataset(df_proc), output_dir)
+
+def _porcentaje(parte, total):
+    return (parte / total) * 100 if total > 0 else 0
+
+def generar_graficos_desde_resumenes(resumen_orig, resumen_proc, output_dir):
+    """Gráficos de calidad a partir de los resúmenes de ambos CSV (ver resumen_utils.py)"""
+    import numpy as np
+    plt, sns, stats = _librerias_graficos()
+    img_dir = directorio_graficos(output_dir)
     os.makedirs(img_dir, exist_ok=True)
 
     # Porcentaje de valores faltantes
-    perc_missing_orig = (df_orig.isnull().sum().sum() / df_orig.size) * 100 if df_orig.size > 0 else 0
-    perc_missing_proc = (df_proc.isnull().sum().sum() / df_proc.size) * 100 if df_proc.size > 0 else 0
+    perc_missing_orig = _porcentaje(resumen_orig['nulos'], resumen_orig['celdas'])
+    perc_missing_proc = _porcentaje(resumen_proc['nulos'], resumen_proc['celdas'])
     plt.figure(figsize=(6, 4))
     plt.bar(['Original', 'Procesado'], [perc_missing_orig, perc_missing_proc], color=['blue', 'green'])
     plt.title('Porcentaje de valores faltantes')
@@ -22,8 +59,8 @@ def generar_graficos_calidad_comparativo(df_orig, df_proc, output_dir):
     plt.close()
 
     # Porcentaje de filas duplicadas
-    perc_dup_orig = (df_orig.duplicated().sum() / len(df_orig)) * 100 if len(df_orig) > 0 else 0
-    perc_dup_proc = (df_proc.duplicated().sum() / len(df_proc)) * 100 if len(df_proc) > 0 else 0
+    perc_dup_orig = _porcentaje(resumen_orig['filas_duplicadas'], resumen_orig['perfil']['filas'])
+    perc_dup_proc = _porcentaje(resumen_proc['filas_duplicadas'], resumen_proc['perfil']['filas'])
     plt.figure(figsize=(6, 4))
     plt.bar(['Original', 'Procesado'], [perc_dup_orig, perc_dup_proc], color=['blue', 'green'])
     plt.title('Porcentaje de filas duplicadas')
@@ -32,21 +69,8 @@ def generar_graficos_calidad_comparativo(df_orig, df_proc, output_dir):
     plt.close()
 
     # Porcentaje de valores anómalos
-    def calc_outliers(df):
-        numeric = df.select_dtypes(include=[np.number])
-        if numeric.empty:
-            return 0
-        Q1 = numeric.quantile(0.25)
-        Q3 = numeric.quantile(0.75)
-        IQR = Q3 - Q1
-        lower = Q1 - 1.5 * IQR
-        upper = Q3 + 1.5 * IQR
-        outliers = ((numeric < lower) | (numeric > upper)).sum().sum()
-        total_values = numeric.size - numeric.isnull().sum().sum()
-        return (outliers / total_values) * 100 if total_values > 0 else 0
-
-    perc_out_orig = calc_outliers(df_orig)
-    perc_out_proc = calc_outliers(df_proc)
+    perc_out_orig = _porcentaje(resumen_orig['outliers'], resumen_orig['valores_numericos'])
+    perc_out_proc = _porcentaje(resumen_proc['outliers'], resumen_proc['valores_numericos'])
     plt.figure(figsize=(6, 4))
     plt.bar(['Original', 'Procesado'], [perc_out_orig, perc_out_proc], color=['blue', 'green'])
     plt.title('Porcentaje de valores anómalos')
@@ -54,24 +78,15 @@ def generar_graficos_calidad_comparativo(df_orig, df_proc, output_dir):
     plt.savefig(os.path.join(img_dir, 'valores_anomalos_comparativo.png'), bbox_inches='tight', dpi=300)
     plt.close()
 
-    # KDE z-scores
-    def get_zscores(df):
-        numeric = df.select_dtypes(include=[np.number])
-        if numeric.empty:
-            return np.array([])
-        z = (numeric - numeric.mean()) / numeric.std()
-        return z.values.flatten()
-
-    z_orig = get_zscores(df_orig)
-    z_proc = get_zscores(df_proc)
-    z_orig = z_orig[~np.isnan(z_orig)]
-    z_proc = z_proc[~np.isnan(z_proc)]
+    # KDE z-scores (curvas ya calculadas por binning y FFT, ver kde_utils.py)
+    curva_orig = _curva_kde(resumen_orig)
+    curva_proc = _curva_kde(resumen_proc)
 
     plt.figure(figsize=(8, 5))
-    if len(z_orig) > 0:
-        sns.kdeplot(z_orig, label='Original')
-    if len(z_proc) > 0:
-        sns.kdeplot(z_proc, label='Procesado')
+    if curva_orig:
+        plt.plot(curva_orig['x'], curva_orig['densidad'], label='Original')
+    if curva_proc:
+        plt.plot(curva_proc['x'], curva_proc['densidad'], label='Procesado')
     x = np.linspace(-5, 5, 100)
     sns.lineplot(x=x, y=stats.norm.pdf(x, 0, 1), label='Normal (0,1)', color='red')
     plt.title('KDE de z-scores comparativo')
@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+
+
+def hash_filas(df):
+    """Hash de 64 bits por fila (independiente del índice), vectorizado con pandas"""
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+
+def _valores_columna(serie):
+    """Valores de una columna para hashear y comparar: las numéricas como float64, como en df.T"""
+    if pd.api.types.is_numeric_dtype(serie):
+        return serie.to_numpy(dtype='float64', na_value=np.nan)
+    return serie.to_numpy(dtype=object)
+
+
+def hash_filas_normalizadas(df):
+    """
+    Como hash_filas, pero con las columnas numéricas como float64: una columna
+    entera leída por bloques pasa a float en los bloques que tienen nulos, y el
+    hash de una fila no debe depender de eso.
+    """
+    return hash_filas(pd.DataFrame({i: _valores_columna(df.iloc[:, i]) for i in range(df.shape[1])}))
+
+
+def _iguales(a, b):
+    """Igualdad elemento a elemento en la que dos nulos cuentan como iguales"""
+    return (a == b) | (pd.isna(a) & pd.isna(b))
+
+
+def _pesos_posiciones(desplazamiento, n):
+    return pd.util.hash_array(np.arange(desplazamiento, desplazamiento + n, dtype=np.uint64))
+
+
+def _huella(serie, pesos):
+    return int(np.sum(pd.util.hash_array(_valores_columna(serie)) * pesos, dtype=np.uint64))
+
+
+def huellas_columnas(df, desplazamiento=0):
+    """
+    Huella de 64 bits por columna que depende del valor y de la posición de cada
+    fila. Las huellas de bloques consecutivos se suman (módulo 2**64), así que
+    procesar un archivo por bloques da la misma huella que procesarlo entero si
+    se pasa como desplazamiento la posición global de la primera fila del bloque.
+    """
+    pesos = _pesos_posiciones(desplazamiento, len(df))
+    return {col: _huella(df[col], pesos) for col in df.columns}
+
+
+def series_iguales(a, b):
+    """True si las dos columnas tienen los mismos valores, con el criterio de columnas_duplicadas"""
+    return bool(_iguales(_valores_columna(a), _valores_columna(b)).all())
+
+
+def columnas_duplicadas(df):
+    """
+    Máscara equivalente a df.T.duplicated() (keep='first') sin transponer: cada
+    columna se resume en una huella de 64 bits y solo se comparan valor a valor
+    las columnas cuya huella coincide, para descartar colisiones.
+    """
+    pesos = _pesos_posiciones(0, len(df))
+    duplicadas = np.zeros(df.shape[1], dtype=bool)
+    representantes = {}
+    for i in range(df.shape[1]):
+        serie = df.iloc[:, i]
+        valores = _valores_columna(serie)
+        candidatas = representantes.setdefault(_huella(serie, pesos), [])
+        if any(_iguales(valores, otros).all() for otros in candidatas):
+            duplicadas[i] = True
+        else:
+            candidatas.append(valores)
+    return duplicadas
+
+
+def _separar_colisiones(df, codigos, colisionados):
+    """Reasigna códigos dentro de los grupos con colisión de hash comparando las filas completas"""
+    siguiente = codigos.max() + 1
+    for codigo in colisionados:
+        claves = {}
+        for posicion in np.flatnonzero(codigos == codigo):
+            # Los nulos se reemplazan por un marcador para que cuenten como iguales
+            clave = tuple(None if pd.isna(valor) else valor for valor in df.iloc[posicion])
+            if clave not in claves:
+                if claves:
+                    claves[clave] = siguiente
+                    siguiente += 1
+                else:
+                    claves[clave] = codigo
+            codigos[posicion] = claves[clave]
+    return codigos
+
+
+def codigos_filas(df):
+    """
+    Código entero por fila: dos filas tienen el mismo código si y solo si son
+    iguales (los nulos cuentan como iguales, como en df.duplicated()). Cada fila
+    se hashea una sola vez y solo las filas con hash repetido se comparan con la
+    primera de su grupo para detectar colisiones.
+    """
+    codigos, _ = pd.factorize(hash_filas(df))
+    if len(codigos) == 0:
+        return codigos
+    _, primeras = np.unique(codigos, return_index=True)
+    referencias = primeras[codigos]
+    candidatas = np.flatnonzero(referencias != np.arange(len(codigos)))
+    if len(candidatas) == 0:
+        return codigos
+
+    iguales = np.ones(len(candidatas), dtype=bool)
+    for i in range(df.shape[1]):
+        valores = df.iloc[:, i].to_numpy()
+        iguales &= _iguales(valores[candidatas], valores[referencias[candidatas]])
+    colisionados = np.unique(codigos[candidatas[~iguales]])
+    if len(colisionados):
+        codigos = _separar_colisiones(df, codigos, colisionados)
+    return codigos
+
+
+def filas_duplicadas(codigos, keep='first'):
+    """Máscara equivalente a df.duplicated(keep=keep) a partir de codigos_filas(df)"""
+    return pd.Series(codigos).duplicated(keep=keep).to_numpy()
@@ -1,12 +1,14 @@
 import os
 import numpy as np
-from sklearn.feature_selection import mutual_info_regression
-import matplotlib.pyplot as plt
-import seaborn as sns
 import pandas as pd
 
-from sklearn.feature_selection import mutual_info_regression, mutual_info_classif
-from sklearn.preprocessing import LabelEncoder
+from .dtype_utils import aplicar_modo_compacto
+from .hash_utils import codigos_filas, filas_duplicadas
+from .kde_utils import kde_binned
+from .outlier_utils import detectar_outliers, total_outliers
+from .mutual_info_utils import informacion_mutua
+from .profile_utils import ColumnProfile
+
 def max_abs_correlation(df):
     num_df = df.select_dtypes(include=[np.number])
     if num_df.shape[1] < 2:
@@ -19,73 +21,123 @@ def contar_outliers(df):
     """
     Cuenta outliers usando el criterio de 1.5*IQR para todas las columnas numéricas.
     """
-    count = 0
-    for col in df.select_dtypes(include=[np.number]).columns:
-        q1 = df[col].quantile(0.25)
-        q3 = df[col].quantile(0.75)
-        iqr = q3 - q1
-        lower = q1 - 1.5 * iqr
-        upper = q3 + 1.5 * iqr
-        count += ((df[col] < lower) | (df[col] > upper)).sum()
-    return int(count)
+    return total_outliers(df)
 def calcular_informacion_mutua(df, target_column):
+    return informacion_mutua_con_muestra(df, target_column)['valores']
+
+def informacion_mutua_con_muestra(df, target_column):
+    """
+    Información mutua de cada columna numérica con la columna objetivo, junto
+    con las filas usadas (ver mutual_info_utils.py)
+    """
+    sin_resultado = {'valores': {}, 'filas': 0, 'exacta': True}
     print("Columnas del DataFrame:", list(df.columns))
     print("Target column recibido:", repr(target_column))
     columnas = [str(col).strip() for col in df.columns]
     target_column_norm = target_column.strip()
     if target_column_norm not in columnas:
         print(f"ERROR: La columna objetivo '{target_column}' no está en el DataFrame. Columnas: {columnas}")
-        return {}
+        return sin_resultado
     real_target = df.columns[columnas.index(target_column_norm)]
     y = df[real_target]
     X = df.select_dtypes(include=[np.number]).drop(columns=[real_target], errors='ignore')
     if df.shape[0] <= 3:
         print("No se puede calcular información mutua: muy pocas filas tras el preprocesamiento.")
-        return {}
+        return sin_resultado
     try:
         # Si el target es numérico, usa mutual_info_regression
         if pd.api.types.is_numeric_dtype(y):
-            mi = mutual_info_regression(X.fillna(0), y)
-        else:
-            # Si es categórico, lo codifica y usa mutual_info_classif
-            y_encoded = LabelEncoder().fit_transform(y.astype(str))
-            mi = mutual_info_classif(X.fillna(0), y_encoded)
-        return {col: float(val) for col, val in zip(X.columns, mi)}
+            return informacion_mutua(X.fillna(0), y)
+        # Si es categórico, lo codifica y usa mutual_info_classif
+        from sklearn.preprocessing import LabelEncoder
+        y_encoded = LabelEncoder().fit_transform(y.astype(str))
+        return informacion_mutua(X.fillna(0), y_encoded, discreta=True)
     except Exception as e:
         print("Error en mutual_info:", e)
-        return {}
-def calcular_metricas_comparativas_json(path_csv_original, path_csv_preprocesado,target_column):
-    df_orig = pd.read_csv(path_csv_original)
-    df_proc = pd.read_csv(path_csv_preprocesado)
+        return sin_resultado
+def _a_float(valor):
+    return None if valor is None or pd.isna(valor) else float(valor)
+
+def resumir_dataset(df, target_column=None):
+    """
+    Perfil por columnas y agregados de calidad de un DataFrame, serializable en
+    JSON: es todo lo que necesitan las métricas comparativas y los gráficos de
+    calidad (ver resumen_utils.py para su persistencia).
+    """
+    perfil = ColumnProfile(df, target_column)
+    numericas = df[perfil.numericas]
+    medias = perfil.medias[perfil.numericas]
+    desvios = perfil.desvios[perfil.numericas]
+    outliers = detectar_outliers(df)
+    info_mutua = informacion_mutua_con_muestra(df, target_column) if target_column else None
+
+    def zscores_por_columna():
+        # Una columna por vez: nunca se arma la matriz completa de z-scores
+        for col in perfil.numericas:
+            yield (numericas[col].to_numpy(dtype='float64', na_value=np.nan) - medias[col]) / desvios[col]
 
-    def mean_absolute_deviation(df):
-        num_df = df.select_dtypes(include=[np.number])
-        return (num_df - num_df.mean()).abs().mean().mean()
+    return {
+        'perfil': perfil.a_dict(),
+        'celdas': int(df.size),
+        'nulos': int(perfil.nulos.sum()),
+        'filas_duplicadas': int(filas_duplicadas(codigos_filas(df)).sum()) if len(df) else 0,
+        'outliers': int(outliers['por_columna'].sum()),
+        'valores_numericos': outliers['valores'],
+        'desviacion_media': _a_float((numericas - medias).abs().mean().mean()),
+        'desvio_medio': _a_float(desvios.mean()),
+        'max_correlacion': _a_float(max_abs_correlation(df)),
+        'info_mutua': info_mutua['valores'] if info_mutua else {},
+        'info_mutua_filas': info_mutua['filas'] if info_mutua else 0,
+        'kde_zscores': kde_binned(zscores_por_columna),
+    }
+
+def resumir_muestra(muestra, target_column, filas, nulos, filas_duplicadas=None):
+    """
+    Resumen de un CSV que no se carga entero, a partir de una muestra uniforme
+    de sus filas (ver streaming.ResumenPorBloques). filas, nulos por columna y,
+    si se pasa, filas_duplicadas son exactos; los demás conteos se escalan de la
+    muestra al archivo y las medidas restantes son las de la muestra.
+    """
+    resumen = resumir_dataset(muestra, target_column)
+    factor = filas / len(muestra) if len(muestra) else 0
+
+    def escalar(valor):
+        return int(round(valor * factor))
 
-    metricas = {
-        "Valores faltantes": {
-            "csv_normal": int(df_orig.isnull().sum().sum()),
-            "csv_preprocesado": int(df_proc.isnull().sum().sum())
-        },
-        "Valores anómalos (outliers)": {
-            "csv_normal": contar_outliers(df_orig),
-            "csv_preprocesado": contar_outliers(df_proc)
-        },
-        "Mean Deviation": {
-            "csv_normal": float(mean_absolute_deviation(df_orig)),
-            "csv_preprocesado": float(mean_absolute_deviation(df_proc))
-        },
-        "Std Deviation Error": {
-            "csv_normal": float(df_orig.select_dtypes(include=[np.number]).std().mean()),
-            "csv_preprocesado": float(df_proc.select_dtypes(include=[np.number]).std().mean())
-        },
-        "Máxima correlación absoluta": {
-            "csv_normal": max_abs_correlation(df_orig),
-            "csv_preprocesado": max_abs_correlation(df_proc)
-        },
-        "Info mutua": {
-            "csv_normal": calcular_informacion_mutua(df_orig, target_column),
-            "csv_preprocesado": calcular_informacion_mutua(df_proc, target_column)
-        }
+    nulos = {str(col): int(cantidad) for col, cantidad in nulos.items() if col in muestra.columns}
+    for col, datos in resumen['perfil']['columnas'].items():
+        datos['nulos'] = nulos.get(col, datos['nulos'])
+    resumen['perfil']['filas'] = int(filas)
+    resumen['celdas'] = int(filas) * muestra.shape[1]
+    resumen['nulos'] = sum(nulos.values())
+    if filas_duplicadas is None:
+        filas_duplicadas = escalar(resumen['filas_duplicadas'])
+    resumen['filas_duplicadas'] = int(filas_duplicadas)
+    resumen['outliers'] = escalar(resumen['outliers'])
+    resumen['valores_numericos'] = escalar(resumen['valores_numericos'])
+    resumen['muestra'] = {'filas': len(muestra), 'filas_totales': int(filas)}
+    return resumen
+
+def metricas_desde_resumenes(resumen_orig, resumen_proc):
+    """Métricas comparativas a partir de los resúmenes de ambos CSV, sin releerlos"""
+    def par(clave):
+        # .get: los resúmenes guardados antes de agregar una clave no la tienen
+        return {"csv_normal": resumen_orig.get(clave), "csv_preprocesado": resumen_proc.get(clave)}
+
+    return {
+        "Valores faltantes": par('nulos'),
+        "Valores anómalos (outliers)": par('outliers'),
+        "Mean Deviation": par('desviacion_media'),
+        "Std Deviation Error": par('desvio_medio'),
+        "Máxima correlación absoluta": par('max_correlacion'),
+        "Info mutua": par('info_mutua'),
+        "Filas usadas para info mutua": par('info_mutua_filas'),
     }
-    return metricas
\ No newline at end of file
+
+def calcular_metricas_comparativas_json(path_csv_original, path_csv_preprocesado,target_column):
+    df_orig = aplicar_modo_compacto(pd.read_csv(path_csv_original))
+    df_proc = aplicar_modo_compacto(pd.read_csv(path_csv_preprocesado))
+    return metricas_desde_resumenes(
+        resumir_dataset(df_orig, target_column),
+        resumir_dataset(df_proc, target_column),
+    )
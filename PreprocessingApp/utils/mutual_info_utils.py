@@ -0,0 +1,64 @@
+"""
+Información mutua entre las columnas numéricas y la columna objetivo.
+
+mutual_info_regression/mutual_info_classif estiman con k vecinos, O(n log n)
+por columna. Por encima de PREPROCESSING_MI_SAMPLE_ROWS filas se calcula sobre
+una muestra estratificada por la columna objetivo (por clase si es discreta,
+por cuantiles si es continua); por debajo, sobre todas las filas (modo exacto).
+Cada columna se estima por separado en un pool de hilos, siempre con la misma
+semilla: el resultado no depende de la cantidad de hilos.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+# Estratos por cuantiles de la columna objetivo cuando es continua
+ESTRATOS_CONTINUOS = 10
+
+
+def muestra_estratificada(y, tamano, semilla=0, discreta=False):
+    """
+    Posiciones (ordenadas) de una muestra de unas tamano filas que mantiene la
+    proporción de cada estrato de y
+    """
+    y = pd.Series(np.asarray(y))
+    if len(y) <= tamano:
+        return np.arange(len(y))
+    if discreta or y.nunique() <= ESTRATOS_CONTINUOS:
+        estratos = pd.factorize(y)[0]
+    else:
+        estratos = pd.qcut(y.rank(method='first'), ESTRATOS_CONTINUOS, labels=False).to_numpy()
+    rng = np.random.default_rng(semilla)
+    fraccion = tamano / len(y)
+    posiciones = []
+    for estrato in np.unique(estratos):
+        filas = np.flatnonzero(estratos == estrato)
+        cantidad = max(1, int(round(len(filas) * fraccion)))
+        posiciones.append(rng.choice(filas, min(cantidad, len(filas)), replace=False))
+    return np.sort(np.concatenate(posiciones))
+
+
+def informacion_mutua(X, y, discreta=False, max_filas=None, hilos=None, semilla=0):
+    """
+    Información mutua de cada columna de X con y. Devuelve un dict con los
+    valores por columna, las filas usadas y si el cálculo fue exacto.
+    """
+    max_filas = settings.PREPROCESSING_MI_SAMPLE_ROWS if max_filas is None else max_filas
+    hilos = hilos or settings.PREPROCESSING_MI_THREADS
+    y = np.asarray(y)
+    exacta = not max_filas or len(y) <= max_filas
+    if not exacta:
+        posiciones = muestra_estratificada(y, max_filas, semilla, discreta)
+        X, y = X.iloc[posiciones], y[posiciones]
+
+    from sklearn.feature_selection import mutual_info_classif, mutual_info_regression
+    estimar = mutual_info_classif if discreta else mutual_info_regression
+    valores = X.to_numpy(dtype='float64')
+
+    def columna(indice):
+        return float(estimar(valores[:, [indice]], y, random_state=semilla)[0])
+
+    with ThreadPoolExecutor(max_workers=max(1, min(hilos, valores.shape[1]))) as pool:
+        mi = list(pool.map(columna, range(valores.shape[1])))
+    return {'valores': dict(zip(X.columns, mi)), 'filas': len(y), 'exacta': exacta}
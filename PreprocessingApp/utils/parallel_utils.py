@@ -0,0 +1,79 @@
+"""
+Ejecución por columnas en un pool de procesos.
+
+Las columnas numéricas se copian una sola vez a un bloque de memoria compartida
+en orden de columnas (Fortran), así cada columna es contigua. Cada proceso se
+adjunta al bloque por nombre y trabaja solo sobre su rango de columnas: nunca
+se serializa el DataFrame completo hacia los workers. Las funciones que
+transforman (imputación, escalado) escriben el resultado en el mismo bloque y
+el proceso principal lo lee al final; las que reducen (cuantiles, detección de
+columnas) devuelven resultados chicos que se combinan en el proceso principal.
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+
+def usar_paralelo(n_columnas):
+    """El pool se usa solo para DataFrames anchos y fuera de procesos daemon (prefork de Celery)"""
+    return (
+        settings.PREPROCESSING_PARALLEL_PROCESSES > 1
+        and n_columnas >= settings.PREPROCESSING_PARALLEL_MIN_COLUMNS
+        and not multiprocessing.current_process().daemon
+    )
+
+
+def _rangos(n_columnas, partes):
+    limites = np.linspace(0, n_columnas, min(partes, n_columnas) + 1, dtype=int)
+    return [(inicio, fin) for inicio, fin in zip(limites[:-1], limites[1:]) if fin > inicio]
+
+
+def _worker(nombre, forma, columnas, dtypes, inicio, fin, funcion, escribir, args):
+    bloque = shared_memory.SharedMemory(name=nombre)
+    matriz = np.ndarray(forma, dtype='float64', buffer=bloque.buf, order='F')
+    try:
+        # Solo se copia el rango de columnas de este worker, con sus dtypes originales
+        df_parte = pd.DataFrame(matriz[:, inicio:fin], columns=columnas[inicio:fin], copy=True)
+        df_parte = df_parte.astype(dict(zip(columnas[inicio:fin], dtypes[inicio:fin])), copy=False)
+        resultado = funcion(df_parte, *args)
+        if escribir:
+            matriz[:, inicio:fin] = resultado.to_numpy(dtype='float64')
+            return None
+        return resultado
+    finally:
+        del matriz
+        bloque.close()
+
+
+def ejecutar_por_columnas(df, funcion, *args, escribir=False, procesos=None):
+    """
+    Aplica funcion(df_parte, *args) a rangos de columnas de df en paralelo.
+    Con escribir=True funcion devuelve un DataFrame de la misma forma que
+    df_parte y el resultado es el DataFrame completo reensamblado; si no, se
+    devuelve la lista de resultados de cada rango, en orden de columnas.
+    """
+    procesos = procesos or settings.PREPROCESSING_PARALLEL_PROCESSES
+    columnas = list(df.columns)
+    dtypes = [str(dtype) for dtype in df.dtypes]
+    forma = df.shape
+    bloque = shared_memory.SharedMemory(create=True, size=max(1, df.size * 8))
+    matriz = np.ndarray(forma, dtype='float64', buffer=bloque.buf, order='F')
+    try:
+        matriz[:] = df.to_numpy(dtype='float64', na_value=np.nan)
+        contexto = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(max_workers=procesos, mp_context=contexto) as pool:
+            futuros = [
+                pool.submit(_worker, bloque.name, forma, columnas, dtypes, inicio, fin, funcion, escribir, args)
+                for inicio, fin in _rangos(len(columnas), procesos)
+            ]
+            resultados = [futuro.result() for futuro in futuros]
+        if escribir:
+            return pd.DataFrame(matriz.copy(), columns=columnas, index=df.index)
+        return resultados
+    finally:
+        del matriz
+        bloque.close()
+        bloque.unlink()
@@ -0,0 +1,31 @@
+"""
+Marca en Redis de las tareas que una vista ya encoló.
+
+Mientras el worker calcula (métricas, gráficos) el cliente repite el GET cada
+pocos segundos y recibe 202: solo el primer poll encola la tarea, los demás
+encuentran la marca. La tarea la borra al terminar y, si el worker la pierde,
+expira sola (PREPROCESSING_PENDING_TTL_SECONDS). Si Redis no responde se encola
+igual: las tareas no hacen nada si el resultado ya está vigente.
+"""
+import logging
+import redis
+from django.conf import settings
+from UsersApp.utils import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+
+def marcar_pendiente(clave):
+    """True si no había marca (quien llama debe encolar la tarea), False si ya hay una tarea pendiente"""
+    try:
+        return bool(get_redis_connection().set(clave, 1, nx=True, ex=settings.PREPROCESSING_PENDING_TTL_SECONDS))
+    except redis.RedisError as e:
+        logger.warning(f"No se pudo registrar la tarea pendiente {clave}: {str(e)}")
+        return True
+
+
+def liberar_pendiente(clave):
+    try:
+        get_redis_connection().delete(clave)
+    except redis.RedisError as e:
+        logger.warning(f"No se pudo liberar la tarea pendiente {clave}: {str(e)}")
@@ -0,0 +1,147 @@
+"""
+Perfil de columnas calculado en una sola pasada vectorizada.
+
+Las columnas numéricas (y booleanas) se convierten una vez a una matriz float64
+y de ella salen nulos, mínimos, máximos, medias, desvíos y valores únicos de
+todas las columnas a la vez (los únicos, ordenando la matriz por columnas).
+Por encima de PREPROCESSING_PROFILE_HLL_MIN_ROWS filas los únicos se estiman con
+HyperLogLog. Con eso se marcan las columnas binarias y categóricas con los
+mismos criterios que usaba la normalización, sin volver a recorrer el DataFrame.
+"""
+import warnings
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from .sketch_utils import HyperLogLog
+
+# Ratio de valores únicos por debajo del cual una columna se considera categórica
+UMBRAL_CATEGORICO = 0.05
+
+
+def _unicos_ordenando(valores):
+    """Valores únicos no nulos por columna de una matriz float64, ordenándola una vez"""
+    if valores.shape[0] == 0:
+        return np.zeros(valores.shape[1], dtype=np.int64)
+    ordenados = np.sort(valores, axis=0)  # los NaN quedan al final
+    validos = np.count_nonzero(~np.isnan(valores), axis=0)
+    cambios = ordenados[1:] != ordenados[:-1]
+    dentro = np.arange(valores.shape[0] - 1)[:, None] < (validos - 1)
+    return (cambios & dentro).sum(axis=0) + (validos > 0)
+
+
+def _unicos_hll(valores):
+    return HyperLogLog().update(valores).cardinalidad()
+
+
+class ColumnProfile:
+    """
+    Perfil de todas las columnas de un DataFrame: dtype, nulos, únicos, mínimo,
+    máximo, media, desvío (ddof=1, como pandas) y las listas de columnas
+    binarias y categóricas. Las estadísticas son Series indexadas por columna
+    (NaN en las no numéricas).
+    """
+
+    def __init__(self, df, target_column=None, umbral_categorico=UMBRAL_CATEGORICO, umbral_hll=None):
+        umbral_hll = settings.PREPROCESSING_PROFILE_HLL_MIN_ROWS if umbral_hll is None else umbral_hll
+        self.columnas = list(df.columns)
+        self.filas = len(df)
+        self.target_column = target_column
+        self.dtypes = df.dtypes.astype(str)
+        self.unicos_aproximados = self.filas >= umbral_hll
+
+        # Columnas numéricas sin booleanas, como select_dtypes(include=[np.number])
+        self.numericas = list(df.select_dtypes(include=[np.number]).columns)
+
+        numericas = df.select_dtypes(include=[np.number, 'bool'])
+        valores = numericas.to_numpy(dtype='float64', na_value=np.nan)
+        nulos_numericas = np.isnan(valores)
+        with warnings.catch_warnings():
+            # Columnas sin valores: estadísticas NaN, como en pandas
+            warnings.simplefilter('ignore', RuntimeWarning)
+            estadisticas = pd.DataFrame({
+                'nulos': nulos_numericas.sum(axis=0),
+                'minimo': np.nanmin(valores, axis=0) if self.filas else np.nan,
+                'maximo': np.nanmax(valores, axis=0) if self.filas else np.nan,
+                'media': np.nanmean(valores, axis=0),
+                'desvio': np.nanstd(valores, axis=0, ddof=1),
+                'binaria': ((valores == 0) | (valores == 1) | nulos_numericas).all(axis=0),
+            }, index=numericas.columns)
+        if self.unicos_aproximados:
+            estadisticas['unicos'] = [_unicos_hll(valores[:, i]) for i in range(valores.shape[1])]
+        else:
+            estadisticas['unicos'] = _unicos_ordenando(valores)
+
+        # Columnas no numéricas (texto, fechas): un recorrido por columna
+        otras = df.drop(columns=numericas.columns)
+        for col in otras.columns:
+            serie = otras[col]
+            no_nulos = serie.dropna()
+            estadisticas.loc[col, 'nulos'] = len(serie) - len(no_nulos)
+            estadisticas.loc[col, 'unicos'] = (
+                _unicos_hll(no_nulos.to_numpy()) if self.unicos_aproximados else no_nulos.nunique()
+            )
+            estadisticas.loc[col, 'binaria'] = bool(no_nulos.isin([0, 1]).all())
+
+        estadisticas = estadisticas.reindex(self.columnas)
+        self.nulos = estadisticas['nulos'].astype('int64')
+        self.unicos = estadisticas['unicos'].astype('int64')
+        self.minimos = estadisticas['minimo'].astype('float64')
+        self.maximos = estadisticas['maximo'].astype('float64')
+        self.medias = estadisticas['media'].astype('float64')
+        self.desvios = estadisticas['desvio'].astype('float64')
+        self.binarias = self._detectar_binarias(estadisticas['binaria'].astype(bool))
+        self.categoricas = self._detectar_categoricas(umbral_categorico)
+
+    @property
+    def total_nulos(self):
+        return int(self.nulos.sum())
+
+    def _detectar_binarias(self, subconjunto_01):
+        """Valores (no nulos) dentro de {0, 1}, o target con exactamente dos valores"""
+        return [
+            col for col in self.columnas
+            if subconjunto_01[col] or (col == self.target_column and self.unicos[col] == 2)
+        ]
+
+    def _detectar_categoricas(self, umbral_categorico):
+        categoricas = []
+        for col in self.columnas:
+            if self.nulos[col] == self.filas:
+                continue
+            unicos = self.unicos[col]
+            # El target categórico no se normaliza
+            if col == self.target_column and unicos <= 50:
+                categoricas.append(col)
+            elif self.dtypes[col] == 'object':
+                categoricas.append(col)
+            elif unicos / self.filas < umbral_categorico:
+                categoricas.append(col)
+            # Enteros pequeños (categóricas codificadas)
+            elif self.dtypes[col] in ('int64', 'int32') and unicos <= 20 \
+                    and self.minimos[col] >= 0 and self.maximos[col] <= 100:
+                categoricas.append(col)
+        return categoricas
+
+    def a_dict(self):
+        """Representación serializable en JSON (los NaN pasan a None)"""
+        def valor(x):
+            return None if pd.isna(x) else float(x)
+        return {
+            'filas': self.filas,
+            'unicos_aproximados': bool(self.unicos_aproximados),
+            'numericas': [str(col) for col in self.numericas],
+            'binarias': [str(col) for col in self.binarias],
+            'categoricas': [str(col) for col in self.categoricas],
+            'columnas': {
+                str(col): {
+                    'dtype': self.dtypes[col],
+                    'nulos': int(self.nulos[col]),
+                    'unicos': int(self.unicos[col]),
+                    'minimo': valor(self.minimos[col]),
+                    'maximo': valor(self.maximos[col]),
+                    'media': valor(self.medias[col]),
+                    'desvio': valor(self.desvios[col]),
+                }
+                for col in self.columnas
+            },
+        }
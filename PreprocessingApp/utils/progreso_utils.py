@@ -0,0 +1,130 @@
+"""
+Eventos de progreso del procesamiento de cada CSV sobre Redis pub/sub.
+
+Las tareas publican cada evento (etapa, porcentaje, filas de entrada y salida,
+error) en el canal del CSV y guardan el último en una clave con TTL, numerado
+con una secuencia creciente. Quien se suscribe lee primero el último evento y
+después los que llegan por el canal, descartando los que ya vio por número de
+secuencia: no se pierde el estado aunque la suscripción llegue tarde.
+
+Las vistas (SSE y long-poll) esperan en Redis, no en la base de datos.
+"""
+import json
+import logging
+import time
+import redis
+from django.conf import settings
+from UsersApp.utils import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+ESTADO_PROCESANDO = 'procesando'
+ESTADO_LISTO = 'listo'
+ESTADO_ERROR = 'error'
+ESTADOS_FINALES = (ESTADO_LISTO, ESTADO_ERROR)
+
+
+def canal_progreso(csv_id):
+    return f'progreso_csv:{csv_id}:eventos'
+
+
+def _clave_ultimo(csv_id):
+    return f'progreso_csv:{csv_id}:ultimo'
+
+
+def _clave_secuencia(csv_id):
+    return f'progreso_csv:{csv_id}:secuencia'
+
+
+def es_final(evento):
+    return evento is not None and evento['estado'] in ESTADOS_FINALES
+
+
+def publicar_progreso(csv_id, etapa, porcentaje, estado=ESTADO_PROCESANDO,
+                      filas_entrada=None, filas_salida=None, error=None):
+    """
+    Publica un evento de progreso. Si Redis no está disponible solo se registra
+    una advertencia: el progreso no debe cortar el procesamiento.
+    """
+    try:
+        conexion = get_redis_connection()
+        ttl = settings.PREPROCESSING_PROGRESS_TTL_SECONDS
+        secuencia = conexion.incr(_clave_secuencia(csv_id))
+        conexion.expire(_clave_secuencia(csv_id), ttl)
+        evento = {
+            'csv_id': csv_id,
+            'secuencia': secuencia,
+            'etapa': etapa,
+            'porcentaje': porcentaje,
+            'estado': estado,
+            'filas_entrada': filas_entrada,
+            'filas_salida': filas_salida,
+            'error': error,
+            'fecha': time.time(),
+        }
+        datos = json.dumps(evento)
+        # Primero el último evento y después el mensaje: quien se suscribe y lee
+        # la clave no puede perderse un evento entre ambas operaciones
+        pipe = conexion.pipeline()
+        pipe.setex(_clave_ultimo(csv_id), ttl, datos)
+        pipe.publish(canal_progreso(csv_id), datos)
+        pipe.execute()
+        return evento
+    except redis.RedisError as e:
+        logger.warning(f"No se pudo publicar el progreso del CSV ID {csv_id}: {str(e)}")
+        return None
+
+
+def ultimo_progreso(csv_id, conexion=None):
+    """Último evento publicado para el CSV, o None si no hay (o ya expiró)"""
+    datos = (conexion or get_redis_connection()).get(_clave_ultimo(csv_id))
+    return json.loads(datos) if datos else None
+
+
+def escuchar_progreso(csv_id, despues_de=0, duracion=None, latido=None):
+    """
+    Genera los eventos del CSV con secuencia mayor a despues_de hasta el evento
+    final o hasta que pasen duracion segundos. Cada latido segundos sin eventos
+    genera None, para que quien consume pueda mantener viva la conexión.
+    Lanza redis.RedisError si Redis no está disponible.
+    """
+    duracion = settings.PREPROCESSING_PROGRESS_STREAM_SECONDS if duracion is None else duracion
+    latido = latido or settings.PREPROCESSING_PROGRESS_HEARTBEAT_SECONDS
+    conexion = get_redis_connection()
+    suscripcion = conexion.pubsub()
+    suscripcion.subscribe(canal_progreso(csv_id))
+    try:
+        # Suscripto antes de leer el último evento: lo que se publique desde ahora llega por el canal
+        evento = ultimo_progreso(csv_id, conexion)
+        if evento is not None and evento['secuencia'] > despues_de:
+            despues_de = evento['secuencia']
+            yield evento
+            if es_final(evento):
+                return
+        limite = time.monotonic() + duracion
+        while (restante := limite - time.monotonic()) > 0:
+            mensaje = suscripcion.get_message(timeout=min(latido, restante))
+            if mensaje is None:
+                yield None
+                continue
+            if mensaje['type'] != 'message':
+                # Confirmación de la suscripción
+                continue
+            evento = json.loads(mensaje['data'])
+            if evento['secuencia'] <= despues_de:
+                continue
+            despues_de = evento['secuencia']
+            yield evento
+            if es_final(evento):
+                return
+    finally:
+        suscripcion.close()
+
+
+def esperar_progreso(csv_id, despues_de=0, espera=None):
+    """Long-poll: el primer evento con secuencia mayor a despues_de, o None si no llega ninguno en espera segundos"""
+    espera = settings.PREPROCESSING_PROGRESS_LONGPOLL_SECONDS if espera is None else espera
+    for evento in escuchar_progreso(csv_id, despues_de, duracion=espera, latido=max(espera, 0.01)):
+        if evento is not None:
+            return evento
+    return None
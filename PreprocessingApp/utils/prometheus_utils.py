@@ -0,0 +1,170 @@
+"""
+Métricas en el formato de texto de Prometheus, guardadas en Redis.
+
+Cada proceso (los workers de gunicorn y los hijos del pool prefork de Celery)
+suma sus observaciones en hashes de Redis con HINCRBYFLOAT en un solo round
+trip, así que /metrics ve el agregado de todos los procesos sin un collector
+aparte y los contadores no se reinician cuando un hijo del pool se recicla. Las
+longitudes de las colas de Celery se leen del broker al exponer.
+
+Una observación que no se puede escribir (Redis caído) se pierde sin error. El
+cliente tiene timeouts cortos (PREPROCESSING_METRICS_REDIS_TIMEOUT) y, después
+de un error, las escrituras se suspenden PAUSA_TRAS_ERROR segundos: un Redis
+colgado no puede demorar los requests que pasan por MetricasMiddleware.
+"""
+import logging
+import math
+import time
+import redis
+from django.conf import settings
+from UsersApp.utils import get_redis_connection
+
+logger = logging.getLogger(__name__)
+
+PREFIJO_CLAVE = 'metricas:'
+BUCKETS_HTTP = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_TAREAS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+PAUSA_TRAS_ERROR = 30
+
+REGISTRO = []
+_conexion = None
+_suspendido_hasta = 0.0
+
+
+def _timeouts():
+    timeout = settings.PREPROCESSING_METRICS_REDIS_TIMEOUT
+    return {'socket_timeout': timeout, 'socket_connect_timeout': timeout}
+
+
+def _redis():
+    # Un cliente por proceso: redis-py rehace el pool de conexiones si detecta un fork
+    global _conexion
+    if _conexion is None:
+        _conexion = get_redis_connection(**_timeouts())
+    return _conexion
+
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _etiquetas(nombres, valores):
+    return ','.join(f'{nombre}="{_escapar(valores.get(nombre, ""))}"' for nombre in nombres)
+
+
+def _numero(valor):
+    valor = float(valor)
+    if math.isinf(valor):
+        return '+Inf' if valor > 0 else '-Inf'
+    return str(int(valor)) if valor.is_integer() else repr(valor)
+
+
+def _serie(nombre, etiquetas, valor):
+    return f'{nombre}{{{etiquetas}}} {_numero(valor)}' if etiquetas else f'{nombre} {_numero(valor)}'
+
+
+class _Metrica:
+    tipo = None
+
+    def __init__(self, nombre, ayuda, etiquetas=()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.clave = f'{PREFIJO_CLAVE}{nombre}'
+        REGISTRO.append(self)
+
+    def _escribir(self, operaciones):
+        global _suspendido_hasta
+        if time.monotonic() < _suspendido_hasta:
+            return
+        try:
+            pipe = _redis().pipeline(transaction=False)
+            for campo, valor in operaciones:
+                pipe.hincrbyfloat(self.clave, campo, valor)
+            pipe.execute()
+        except redis.RedisError as e:
+            _suspendido_hasta = time.monotonic() + PAUSA_TRAS_ERROR
+            logger.debug(f"Métrica {self.nombre} descartada: {str(e)}")
+
+    def encabezado(self):
+        return [f'# HELP {self.nombre} {self.ayuda}', f'# TYPE {self.nombre} {self.tipo}']
+
+
+class Contador(_Metrica):
+    tipo = 'counter'
+
+    def inc(self, valor=1, **etiquetas):
+        if valor:
+            self._escribir([(_etiquetas(self.etiquetas, etiquetas), valor)])
+
+    def exponer(self, valores):
+        lineas = self.encabezado()
+        for etiquetas, valor in sorted(valores.items()):
+            lineas.append(_serie(self.nombre, etiquetas, valor))
+        return lineas
+
+
+class Histograma(_Metrica):
+    """Los buckets se guardan sin acumular (un campo por bucket) y se acumulan al exponer"""
+    tipo = 'histogram'
+
+    def __init__(self, nombre, ayuda, etiquetas=(), buckets=BUCKETS_HTTP):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+
+    def observar(self, valor, **etiquetas):
+        base = _etiquetas(self.etiquetas, etiquetas)
+        indice = next(i for i, limite in enumerate(self.buckets) if valor <= limite)
+        self._escribir([(f'{base}|{indice}', 1), (f'{base}|sum', valor), (f'{base}|count', 1)])
+
+    def exponer(self, valores):
+        series = {}
+        for campo, valor in valores.items():
+            etiquetas, sufijo = campo.rsplit('|', 1)
+            series.setdefault(etiquetas, {})[sufijo] = float(valor)
+        lineas = self.encabezado()
+        for etiquetas, campos in sorted(series.items()):
+            separador = ',' if etiquetas else ''
+            acumulado = 0
+            for indice, limite in enumerate(self.buckets):
+                acumulado += campos.get(str(indice), 0)
+                lineas.append(_serie(f'{self.nombre}_bucket', f'{etiquetas}{separador}le="{_numero(limite)}"', acumulado))
+            lineas.append(_serie(f'{self.nombre}_sum', etiquetas, campos.get('sum', 0)))
+            lineas.append(_serie(f'{self.nombre}_count', etiquetas, campos.get('count', 0)))
+        return lineas
+
+
+DURACION_REQUESTS = Histograma(
+    'http_request_duration_seconds', 'Latencia de los requests por vista', ('view', 'method', 'status'))
+DURACION_TAREAS = Histograma(
+    'celery_task_duration_seconds', 'Duración de las tareas de Celery', ('task',), BUCKETS_TAREAS)
+TAREAS = Contador('celery_tasks_total', 'Tareas de Celery terminadas por estado', ('task', 'state'))
+DURACION_ETAPAS = Histograma(
+    'preprocessing_stage_duration_seconds', 'Duración de las etapas del pipeline', ('stage',), BUCKETS_TAREAS)
+FILAS_ETAPAS = Contador('preprocessing_stage_rows_total', 'Filas de entrada procesadas por etapa', ('stage',))
+BYTES_ETAPAS = Contador(
+    'preprocessing_stage_bytes_total', 'Bytes leídos y escritos por las etapas del pipeline', ('stage', 'direction'))
+BYTES_ENTRADA = Contador('preprocessing_input_bytes_total', 'Bytes de los CSV originales que entraron al pipeline')
+CSV_PROCESADOS = Contador('preprocessing_csv_total', 'CSV terminados por resultado', ('result',))
+
+
+def _longitudes_colas():
+    broker = redis.Redis.from_url(settings.CELERY_BROKER_URL, **_timeouts())
+    lineas = ['# HELP celery_queue_length Mensajes esperando en cada cola de Celery',
+              '# TYPE celery_queue_length gauge']
+    for cola in settings.PREPROCESSING_METRICS_QUEUES:
+        lineas.append(f'celery_queue_length{{queue="{_escapar(cola)}"}} {broker.llen(cola)}')
+    return lineas
+
+
+def exponer_metricas():
+    """Texto para /metrics (formato de exposición 0.0.4). Lanza redis.RedisError si Redis no está disponible."""
+    pipe = _redis().pipeline(transaction=False)
+    for metrica in REGISTRO:
+        pipe.hgetall(metrica.clave)
+    lineas = []
+    for metrica, valores in zip(REGISTRO, pipe.execute()):
+        lineas.extend(metrica.exponer(valores))
+    lineas.extend(_longitudes_colas())
+    return '\n'.join(lineas) + '\n'
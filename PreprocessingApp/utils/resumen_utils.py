@@ -0,0 +1,184 @@
+"""
+Resumen persistido de cada CSV (original y procesado) para las vistas de
+métricas e imágenes.
+
+El resumen (ver resumir_dataset en metrics_utils.py) guarda el perfil por
+columnas y los agregados que usan las métricas y los gráficos de calidad, en
+resumen.json junto al csv_original.csv. Cada entrada queda versionada por el
+SHA-256 del archivo del que salió: si el archivo cambia (p. ej. al reprocesar)
+la entrada deja de valer y se recalcula. Junto al hash se guardan tamaño y
+mtime: las vistas solo comparan esa huella (ver version_registrada) y, si no
+coincide, responden 202 y dejan al worker el hash y el recálculo.
+
+En los modos por bloques y shards el resumen sale de una muestra de filas
+juntada en las mismas pasadas del pipeline, con los conteos exactos (ver
+metrics_utils.resumir_muestra): esos archivos nunca se cargan enteros.
+
+Las métricas comparativas se calculan en el worker al terminar el pipeline y
+quedan en CSVModel.metrics, versionadas por el hash del csv_procesado.csv del
+que salieron (ver metricas_vigentes); el proceso web nunca las calcula.
+
+Las vistas importan este módulo: pandas y metrics_utils se importan dentro de
+las funciones que calculan, para no cargarlos al arrancar el proceso web.
+"""
+import json
+import os
+
+NOMBRE_RESUMEN = 'resumen.json'
+CLAVE_ORIGINAL = 'original'
+CLAVE_PROCESADO = 'procesado'
+
+
+def ruta_resumen(obj):
+    return os.path.join(os.path.dirname(obj.file.path), NOMBRE_RESUMEN)
+
+
+def _ruta_csv(obj, clave):
+    if clave == CLAVE_ORIGINAL:
+        return obj.file.path
+    return obj.processed_file.path if obj.processed_file else None
+
+
+def _hash_archivo(path):
+    from .artifact_utils import calcular_hash_archivo
+    return calcular_hash_archivo(path)
+
+
+def _huella_stat(path):
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _escribir_resumenes(obj, resumenes):
+    ruta = ruta_resumen(obj)
+    temporal = f'{ruta}.tmp'
+    with open(temporal, 'w') as f:
+        json.dump(resumenes, f)
+    os.replace(temporal, ruta)
+
+
+def _leer_resumenes(obj):
+    try:
+        with open(ruta_resumen(obj)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _por_bloques(path):
+    from django.conf import settings
+    return os.path.getsize(path) >= settings.PREPROCESSING_STREAMING_MIN_BYTES
+
+
+def _resumir_por_bloques(obj, clave, path):
+    """Resumen de un CSV demasiado grande para cargarlo: una pasada por bloques con muestra (ver resumir_muestra)"""
+    import pandas as pd
+    from django.conf import settings
+    from PreprocessingApp.tasks.streaming import ResumenPorBloques
+    from .dtype_utils import aplicar_modo_compacto
+    from .upload_utils import columnas_a_eliminar, preparar_original
+
+    resumen = ResumenPorBloques(settings.PREPROCESSING_SUMMARY_SAMPLE_ROWS)
+    eliminar = columnas_a_eliminar(obj.drop_column) if clave == CLAVE_ORIGINAL else []
+    for bloque in pd.read_csv(path, chunksize=settings.PREPROCESSING_CHUNK_SIZE):
+        resumen.agregar(bloque.drop(columns=[col for col in eliminar if col in bloque.columns]))
+    if clave == CLAVE_ORIGINAL:
+        return resumen.resumir(obj.target_column, lambda df: preparar_original(df, obj.target_column))
+    return resumen.resumir(obj.target_column, aplicar_modo_compacto)
+
+
+def guardar_resumen(obj, clave, df=None, resumen=None):
+    """
+    Calcula (con df si ya está en memoria) y persiste el resumen de uno de los
+    CSV. Los modos por bloques y shards pasan el resumen ya calculado durante
+    sus pasadas (ver streaming.ResumenPorBloques).
+    """
+    from .metrics_utils import resumir_dataset
+    path = _ruta_csv(obj, clave)
+    if resumen is None and df is None and _por_bloques(path):
+        resumen = _resumir_por_bloques(obj, clave, path)
+    elif resumen is None and df is None:
+        import pandas as pd
+        from .dtype_utils import aplicar_modo_compacto
+        from .upload_utils import preparar_original
+        df = pd.read_csv(path)
+        if clave == CLAVE_ORIGINAL:
+            # El original se resume como lo ve el pipeline (ver upload_utils.preparar_original)
+            df = preparar_original(df, obj.target_column, obj.drop_column)
+        else:
+            df = aplicar_modo_compacto(df)
+    entrada = {
+        'hash': _hash_archivo(path),
+        'stat': _huella_stat(path),
+        'resumen': resumen if resumen is not None else resumir_dataset(df, obj.target_column),
+    }
+    resumenes = _leer_resumenes(obj)
+    resumenes[clave] = entrada
+    _escribir_resumenes(obj, resumenes)
+    return entrada['resumen']
+
+
+def obtener_resumen(obj, clave):
+    """
+    Resumen vigente de uno de los CSV ('original' o 'procesado'). Si no existe o
+    el archivo cambió desde que se calculó, se recalcula y se guarda.
+    """
+    path = _ruta_csv(obj, clave)
+    if not path or not os.path.exists(path):
+        return None
+    resumenes = _leer_resumenes(obj)
+    entrada = resumenes.get(clave)
+    if entrada:
+        if entrada['stat'] == _huella_stat(path):
+            return entrada['resumen']
+        if entrada['hash'] == _hash_archivo(path):
+            # Mismo contenido con otro mtime: se actualiza la huella para no volver a hashear
+            entrada['stat'] = _huella_stat(path)
+            _escribir_resumenes(obj, resumenes)
+            return entrada['resumen']
+    return guardar_resumen(obj, clave)
+
+
+def version_registrada(obj, clave):
+    """
+    Hash del CSV guardado en el resumen si tamaño y mtime no cambiaron desde
+    entonces; None si cambiaron o no hay resumen. No lee el CSV: es lo que usan las vistas.
+    """
+    path = _ruta_csv(obj, clave)
+    if not path or not os.path.exists(path):
+        return None
+    entrada = _leer_resumenes(obj).get(clave)
+    if entrada and entrada['stat'] == _huella_stat(path):
+        return entrada['hash']
+    return None
+
+
+def version_graficos(obj):
+    """
+    Versión de los datos de los gráficos: la del procesado o, si todavía no hay,
+    la del original. None si el archivo cambió desde el último resumen (ver version_registrada).
+    """
+    if obj.processed_file and os.path.exists(obj.processed_file.path):
+        return version_registrada(obj, CLAVE_PROCESADO)
+    return version_registrada(obj, CLAVE_ORIGINAL)
+
+
+def guardar_metricas(obj):
+    """Calcula las métricas comparativas y las guarda en el CSVModel con la versión del procesado"""
+    from .metrics_utils import metricas_desde_resumenes
+    metricas = metricas_desde_resumenes(obtener_resumen(obj, CLAVE_ORIGINAL), obtener_resumen(obj, CLAVE_PROCESADO))
+    obj.metrics = metricas
+    # obtener_resumen acaba de dejar la huella al día: no hace falta volver a hashear
+    obj.metrics_version = version_registrada(obj, CLAVE_PROCESADO)
+    obj.save(update_fields=['metrics', 'metrics_version'])
+    return metricas
+
+
+def metricas_vigentes(obj):
+    """
+    Si las métricas guardadas corresponden al csv_procesado.csv actual. Solo
+    compara la huella (no lee el CSV): si el archivo se tocó, quedan pendientes
+    hasta que calcular_metricas recalcula el hash en el worker.
+    """
+    version = version_registrada(obj, CLAVE_PROCESADO)
+    return obj.metrics is not None and version is not None and obj.metrics_version == version
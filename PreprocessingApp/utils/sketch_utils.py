@@ -0,0 +1,181 @@
+import math
+import numpy as np
+import pandas as pd
+from django.conf import settings
+
+CUANTILES_EXACTOS = 'exacto'
+CUANTILES_APROXIMADOS = 'aproximado'
+
+
+def k_para_error(error):
+    """Tamaño de compactador de KLL para un error de rango aproximado de `error`"""
+    return max(8, math.ceil(2 / error))
+
+
+class KLLSketch:
+    """
+    Sketch de cuantiles KLL (Karnin, Lang, Liberty) mergeable. Cada nivel h guarda
+    ítems con peso 2**h; cuando un nivel supera su capacidad se ordena y se
+    promueve la mitad de sus ítems (pares o impares al azar) al nivel siguiente.
+    El error de rango es aproximadamente `error` con alta probabilidad, y dos
+    sketches construidos sobre bloques o shards distintos se pueden unir con merge().
+    """
+
+    def __init__(self, error=0.01, semilla=0):
+        self.error = error
+        self.k = k_para_error(error)
+        self.n = 0
+        self.niveles = [np.empty(0, dtype='float64')]
+        self.rng = np.random.default_rng(semilla)
+
+    def _capacidad(self, nivel):
+        profundidad = len(self.niveles) - nivel - 1
+        return max(2, math.ceil(self.k * (2 / 3) ** profundidad))
+
+    def _compactar(self):
+        nivel = 0
+        while nivel < len(self.niveles):
+            items = self.niveles[nivel]
+            if len(items) > self._capacidad(nivel):
+                if nivel + 1 == len(self.niveles):
+                    self.niveles.append(np.empty(0, dtype='float64'))
+                items = np.sort(items)
+                # Si la cantidad es impar, el último ítem se queda en este nivel
+                resto = items[len(items) - len(items) % 2:]
+                pares = items[:len(items) - len(items) % 2]
+                promovidos = pares[self.rng.integers(2)::2]
+                self.niveles[nivel] = resto
+                self.niveles[nivel + 1] = np.concatenate([self.niveles[nivel + 1], promovidos])
+            nivel += 1
+
+    def update(self, valores):
+        """Agrega un array de valores (los NaN se ignoran)"""
+        valores = np.asarray(valores, dtype='float64')
+        valores = valores[~np.isnan(valores)]
+        if len(valores) == 0:
+            return self
+        self.n += len(valores)
+        # Compactar un bloque ordenado grande de una vez agrega a lo sumo el peso del
+        # nivel como error de rango, igual que compactarlo por tramos
+        self.niveles[0] = np.concatenate([self.niveles[0], valores])
+        self._compactar()
+        return self
+
+    def merge(self, otro):
+        """Une otro sketch (de otro bloque, shard o worker) en este"""
+        while len(self.niveles) < len(otro.niveles):
+            self.niveles.append(np.empty(0, dtype='float64'))
+        for nivel, items in enumerate(otro.niveles):
+            self.niveles[nivel] = np.concatenate([self.niveles[nivel], items])
+        self.n += otro.n
+        self._compactar()
+        return self
+
+    def _items_ponderados(self, extra=None):
+        items = np.concatenate(self.niveles)
+        pesos = np.concatenate([np.full(len(nivel), 2.0 ** h) for h, nivel in enumerate(self.niveles)])
+        for valor, peso in extra or []:
+            if peso > 0:
+                items = np.append(items, valor)
+                pesos = np.append(pesos, peso)
+        orden = np.argsort(items, kind='stable')
+        return items[orden], np.cumsum(pesos[orden])
+
+    def cuantiles(self, qs, extra=None):
+        """
+        Cuantiles aproximados. `extra` es una lista de (valor, peso) que se suman a
+        la distribución, p. ej. la mediana con el peso de los valores imputados.
+        """
+        items, acumulado = self._items_ponderados(extra)
+        if len(items) == 0:
+            return np.full(len(qs), np.nan)
+        objetivos = np.asarray(qs, dtype='float64') * acumulado[-1]
+        posiciones = np.searchsorted(acumulado, objetivos, side='left')
+        return items[np.minimum(posiciones, len(items) - 1)]
+
+    def cuantil(self, q):
+        return float(self.cuantiles([q])[0])
+
+    def to_dict(self):
+        """Representación serializable en JSON (para pasar sketches entre tareas)"""
+        return {'error': self.error, 'n': self.n, 'niveles': [nivel.tolist() for nivel in self.niveles]}
+
+    @classmethod
+    def from_dict(cls, datos):
+        sketch = cls(datos['error'])
+        sketch.n = datos['n']
+        sketch.niveles = [np.asarray(nivel, dtype='float64') for nivel in datos['niveles']]
+        return sketch
+
+
+def sketches_por_columna(df, error=None):
+    """Un KLLSketch por columna numérica del DataFrame"""
+    error = error or settings.PREPROCESSING_QUANTILE_ERROR
+    return {
+        col: KLLSketch(error).update(df[col].to_numpy(dtype='float64', na_value=np.nan))
+        for col in df.select_dtypes(include=[np.number]).columns
+    }
+
+
+def cuantiles_por_columna(sketches, qs):
+    """DataFrame con la misma forma que df.quantile(qs): índice = qs, columnas = columnas"""
+    return pd.DataFrame(
+        {col: sketch.cuantiles(qs) for col, sketch in sketches.items()},
+        index=list(qs),
+    )
+
+
+def cuantiles(df, qs, modo=None):
+    """
+    Cuantiles de las columnas numéricas. En modo exacto usa df.quantile(); en modo
+    aproximado los calcula con un KLLSketch por columna (PREPROCESSING_QUANTILES).
+    """
+    modo = modo or settings.PREPROCESSING_QUANTILES
+    numericas = df.select_dtypes(include=[np.number])
+    if modo == CUANTILES_APROXIMADOS:
+        return cuantiles_por_columna(sketches_por_columna(numericas), qs)
+    return numericas.quantile(list(qs))
+
+
+class HyperLogLog:
+    """
+    Estimador de cardinalidad HyperLogLog (Flajolet et al.) con 2**precision
+    registros sobre hashes de 64 bits. El error relativo típico es
+    1.04 / sqrt(2**precision) (~0.8% con precision=14); mergeable con merge().
+    """
+
+    def __init__(self, precision=14):
+        self.precision = precision
+        self.m = 1 << precision
+        self.registros = np.zeros(self.m, dtype=np.uint8)
+
+    def update_hashes(self, hashes):
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        if len(hashes) == 0:
+            return self
+        resto_bits = 64 - self.precision
+        indices = (hashes >> np.uint64(resto_bits)).astype(np.int64)
+        resto = hashes & np.uint64((1 << resto_bits) - 1)
+        # Posición del primer 1 en los bits restantes; frexp da la cantidad de bits significativos
+        _, bits = np.frexp(resto.astype('float64'))
+        rangos = (resto_bits - bits + 1).astype(np.uint8)
+        np.maximum.at(self.registros, indices, rangos)
+        return self
+
+    def update(self, valores):
+        """Agrega un array de valores (los nulos se ignoran)"""
+        valores = pd.Series(valores).dropna().to_numpy()
+        return self.update_hashes(pd.util.hash_array(valores))
+
+    def merge(self, otro):
+        np.maximum(self.registros, otro.registros, out=self.registros)
+        return self
+
+    def cardinalidad(self):
+        alfa = 0.7213 / (1 + 1.079 / self.m)
+        estimacion = alfa * self.m ** 2 / np.sum(np.exp2(-self.registros.astype('float64')))
+        vacios = int(np.count_nonzero(self.registros == 0))
+        # Corrección para cardinalidades chicas (linear counting)
+        if estimacion <= 2.5 * self.m and vacios:
+            estimacion = self.m * math.log(self.m / vacios)
+        return int(round(estimacion))
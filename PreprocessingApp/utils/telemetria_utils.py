@@ -0,0 +1,125 @@
+"""
+Medición de recursos de una etapa del pipeline en el proceso que la corre.
+
+En Linux el pico de memoria residente se lee de VmHWM en /proc/self/status y se
+reinicia al empezar cada etapa escribiendo 5 en /proc/self/clear_refs; si eso
+no está permitido queda el pico del proceso desde que arrancó (ru_maxrss). Los
+bytes leídos y escritos son la diferencia de rchar/wchar de /proc/self/io, es
+decir toda la E/S por read/write del proceso. Donde /proc no existe, los campos
+quedan en None.
+"""
+import socket
+import time
+from django.utils import timezone
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def _leer_proc(nombre):
+    try:
+        with open(f'/proc/self/{nombre}') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def reiniciar_pico_rss():
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def pico_rss():
+    """Pico de memoria residente en bytes (desde el último reinicio, si se pudo reiniciar)"""
+    estado = _leer_proc('status')
+    if estado:
+        for linea in estado.splitlines():
+            if linea.startswith('VmHWM:'):
+                return int(linea.split()[1]) * 1024
+    if resource is not None:
+        # Kilobytes en Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return None
+
+
+def contadores_io():
+    """(bytes leídos, bytes escritos) acumulados por el proceso, o (None, None)"""
+    io = _leer_proc('io')
+    if not io:
+        return None, None
+    valores = dict(linea.split(': ') for linea in io.splitlines() if ': ' in linea)
+    return int(valores['rchar']), int(valores['wchar'])
+
+
+class MedicionRecursos:
+    """
+    Context manager que mide tiempo, pico de RSS y E/S de lo que corre adentro.
+    Las formas de entrada y salida las informa quien lo usa con formas().
+    """
+
+    def __init__(self):
+        self.worker = socket.gethostname()
+        self.filas_entrada = self.columnas_entrada = None
+        self.filas_salida = self.columnas_salida = None
+        self.pico_rss = self.bytes_leidos = self.bytes_escritos = None
+
+    def formas(self, df_entrada=None, df_salida=None):
+        if df_entrada is not None:
+            self.filas_entrada, self.columnas_entrada = df_entrada.shape
+        if df_salida is not None:
+            self.filas_salida, self.columnas_salida = df_salida.shape
+
+    def __enter__(self):
+        reiniciar_pico_rss()
+        self._io_inicial = contadores_io()
+        self.inicio = timezone.now()
+        self._reloj = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.segundos = time.perf_counter() - self._reloj
+        self.fin = timezone.now()
+        self.pico_rss = pico_rss()
+        leidos, escritos = contadores_io()
+        if leidos is not None and self._io_inicial[0] is not None:
+            self.bytes_leidos = leidos - self._io_inicial[0]
+            self.bytes_escritos = escritos - self._io_inicial[1]
+        return False
+
+
+def percentil(valores_ordenados, p):
+    """Percentil p (0-100) con interpolación lineal, como numpy.percentile; None si no hay valores"""
+    if not valores_ordenados:
+        return None
+    posicion = (len(valores_ordenados) - 1) * p / 100
+    abajo = int(posicion)
+    arriba = min(abajo + 1, len(valores_ordenados) - 1)
+    return valores_ordenados[abajo] + (valores_ordenados[arriba] - valores_ordenados[abajo]) * (posicion - abajo)
+
+
+def resumen_por_etapa(filas, campos):
+    """
+    Agrega filas (etapa, valor_1, ..., valor_n) por etapa: cantidad y p50/p95
+    de cada campo, ignorando los valores nulos.
+    """
+    valores = {}
+    cantidades = {}
+    for etapa, *medidas in filas:
+        por_campo = valores.setdefault(etapa, [[] for _ in campos])
+        cantidades[etapa] = cantidades.get(etapa, 0) + 1
+        for lista, valor in zip(por_campo, medidas):
+            if valor is not None:
+                lista.append(valor)
+    resumen = {}
+    for etapa, por_campo in valores.items():
+        resumen[etapa] = {'ejecuciones': cantidades[etapa]}
+        for campo, lista in zip(campos, por_campo):
+            lista.sort()
+            resumen[etapa][campo] = {'p50': percentil(lista, 50), 'p95': percentil(lista, 95)}
+    return resumen
@@ -0,0 +1,171 @@
+"""
+Subida de CSV sin parsear el archivo dentro del request.
+
+El archivo se copia a disco por bloques (o se mueve, si Django ya lo dejó en un
+archivo temporal) y la validación lee solo el encabezado y una muestra de la
+columna objetivo. La eliminación de columnas y la conversión completa de la
+columna objetivo quedan para el worker (ver preparar_original).
+
+El hash de contenido se encadena sobre partes de PREPROCESSING_UPLOAD_PART_BYTES
+bytes: hash_i = sha256(hash_{i-1} + sha256(parte_i)). Así se puede calcular
+parte por parte en las sesiones de subida (el estado es un string que se guarda
+en la base) y da lo mismo que al subir el archivo entero de una vez.
+
+pandas se importa dentro de las funciones que lo usan: las vistas importan este
+módulo y el proceso web no debería cargarlo hasta la primera validación.
+"""
+import hashlib
+import os
+import shutil
+from django.conf import settings
+
+
+def encadenar_hash(hash_previo, digest_parte):
+    return hashlib.sha256(f'{hash_previo}{digest_parte}'.encode()).hexdigest()
+
+
+class HashPorPartes:
+    """Hash de contenido encadenado, alimentado con bytes en cualquier tamaño de bloque"""
+
+    def __init__(self, tamano_parte=None):
+        self.tamano_parte = tamano_parte or settings.PREPROCESSING_UPLOAD_PART_BYTES
+        self.hash = ''
+        self._parte = hashlib.sha256()
+        self._bytes_parte = 0
+
+    def actualizar(self, datos):
+        datos = memoryview(datos)
+        while len(datos):
+            cantidad = min(len(datos), self.tamano_parte - self._bytes_parte)
+            self._parte.update(datos[:cantidad])
+            self._bytes_parte += cantidad
+            datos = datos[cantidad:]
+            if self._bytes_parte == self.tamano_parte:
+                self._cerrar_parte()
+
+    def _cerrar_parte(self):
+        self.hash = encadenar_hash(self.hash, self._parte.hexdigest())
+        self._parte = hashlib.sha256()
+        self._bytes_parte = 0
+
+    def hexdigest(self):
+        if self._bytes_parte or not self.hash:
+            return encadenar_hash(self.hash, self._parte.hexdigest())
+        return self.hash
+
+
+def hash_archivo(path, tamano_parte=None):
+    """Hash de contenido de un archivo ya escrito"""
+    hash_contenido = HashPorPartes(tamano_parte)
+    with open(path, 'rb') as f:
+        for bloque in iter(lambda: f.read(hash_contenido.tamano_parte), b''):
+            hash_contenido.actualizar(bloque)
+    return hash_contenido.hexdigest()
+
+
+def guardar_subida(archivo, path):
+    """
+    Escribe el UploadedFile en path sin cargarlo entero en memoria y devuelve
+    su hash de contenido
+    """
+    if hasattr(archivo, 'temporary_file_path'):
+        shutil.move(archivo.temporary_file_path(), path)
+        return hash_archivo(path)
+    hash_contenido = HashPorPartes()
+    with open(path, 'wb') as destino:
+        for bloque in archivo.chunks():
+            destino.write(bloque)
+            hash_contenido.actualizar(bloque)
+    return hash_contenido.hexdigest()
+
+
+def escribir_parte(archivo, path, offset):
+    """
+    Escribe una parte de una sesión de subida en path a partir de offset,
+    descartando lo que hubiera después (un intento anterior sin confirmar).
+    Devuelve (bytes escritos, sha256 de la parte).
+    """
+    digest = hashlib.sha256()
+    escritos = 0
+    with open(path, 'r+b' if os.path.exists(path) else 'wb') as destino:
+        destino.seek(offset)
+        for bloque in archivo.chunks():
+            destino.write(bloque)
+            digest.update(bloque)
+            escritos += len(bloque)
+        destino.truncate()
+    return escritos, digest.hexdigest()
+
+
+def truncar(path, offset):
+    if os.path.exists(path):
+        with open(path, 'r+b') as f:
+            f.truncate(offset)
+
+
+def columnas_a_eliminar(drop_column):
+    """Lista de columnas a eliminar a partir de None, 'a,b' o una lista"""
+    if not drop_column:
+        return []
+    if isinstance(drop_column, str):
+        return [col.strip() for col in drop_column.split(',') if col.strip()]
+    return list(drop_column)
+
+
+def _convertir_target(serie):
+    """Limpia espacios y fuerza a numérico; lanza ValueError si no es convertible"""
+    import pandas as pd
+    return pd.to_numeric(serie.astype(str).str.strip())
+
+
+def validar_csv(path, target_column, drop_columns, filas_muestra):
+    """
+    Valida el CSV leyendo el encabezado y las primeras filas_muestra filas de la
+    columna objetivo. Devuelve el mensaje de error o None si es válido.
+    """
+    import pandas as pd
+    try:
+        columnas = list(pd.read_csv(path, nrows=0).columns)
+    except Exception:
+        return 'El archivo no es un CSV válido.'
+
+    if target_column not in columnas:
+        return f'La columna objetivo "{target_column}" no existe en el archivo.'
+
+    try:
+        muestra = pd.read_csv(path, usecols=[target_column], nrows=filas_muestra)[target_column]
+    except Exception:
+        return 'El archivo no es un CSV válido.'
+    try:
+        _convertir_target(muestra)
+    except Exception:
+        return f'La columna objetivo "{target_column}" no es numérica ni convertible a numérica.'
+
+    not_found = [col for col in drop_columns if col not in columnas]
+    if not_found:
+        return f'Las columnas a suprimir no existen en el archivo: {not_found}'
+    return None
+
+
+def preparar_original(df, target_column=None, drop_column=None):
+    """
+    Lo que antes hacía la subida sobre el DataFrame completo: elimina las
+    columnas pedidas y convierte la columna objetivo a numérica. Con
+    PREPROCESSING_COMPACT_DTYPES deja además los tipos compactos.
+    """
+    import pandas as pd
+    from .dtype_utils import aplicar_modo_compacto
+    eliminar = [col for col in columnas_a_eliminar(drop_column) if col in df.columns]
+    if eliminar:
+        df = df.drop(columns=eliminar)
+    if target_column and target_column in df.columns and not pd.api.types.is_numeric_dtype(df[target_column]):
+        df[target_column] = convertir_objetivo(df[target_column], target_column)
+    return aplicar_modo_compacto(df)
+
+
+def convertir_objetivo(serie, target_column):
+    """La columna objetivo convertida a numérica; ValueError con el mensaje de la subida si no es convertible"""
+    try:
+        return _convertir_target(serie)
+    except Exception:
+        raise ValueError(f'La columna objetivo "{target_column}" no es numérica ni convertible a numérica.')
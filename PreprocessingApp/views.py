@@ -1,14 +1,80 @@
+import hmac
 import os
+import redis
 from rest_framework.views import APIView
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework import status
-from .models import CSVModel
-from .serializers import ProcessRequestSerializer
-from .tasks.main import procesar_csv
+from rest_framework.renderers import JSONRenderer
+from django.db import transaction
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils import timezone
+from datetime import timedelta
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from .models import CSVModel, StageRun, UploadSession
+from .renderers import EventStreamRenderer, evento_sse
+from .serializers import ProcessingRunSerializer, ProcessRequestSerializer
+from .tasks.graficos import graficos_vigentes, solicitar_graficos
+from .tasks.metricas import solicitar_metricas
 from django.conf import settings
-from .utils.metrics_utils import calcular_metricas_comparativas_json
-import pandas as pd
+from .utils.graph_utils import directorio_graficos, graficos_existentes
+from .utils.prometheus_utils import exponer_metricas
+from .utils.progreso_utils import (
+    ESTADO_ERROR,
+    ESTADO_LISTO,
+    escuchar_progreso,
+    esperar_progreso,
+    ultimo_progreso,
+)
+from .utils.resumen_utils import metricas_vigentes, version_graficos
+from .utils.telemetria_utils import resumen_por_etapa
+from .utils.upload_utils import (
+    columnas_a_eliminar,
+    encadenar_hash,
+    escribir_parte,
+    guardar_subida,
+    truncar,
+    validar_csv,
+)
+
+
+def _registrar_csv(user, temp_path, file_path, original_filename, target_column, processing_type, drop_columns_list,
+                   content_hash):
+    """
+    Valida el archivo ya escrito en temp_path, lo deja como csv_original.csv,
+    crea el CSVModel y lanza el procesamiento
+    """
+    error = validar_csv(temp_path, target_column, drop_columns_list, settings.PREPROCESSING_UPLOAD_VALIDATION_ROWS)
+    if error:
+        os.remove(temp_path)
+        return Response({'error': error}, status=400)
+    os.replace(temp_path, file_path)
+
+    # Crea el modelo CSVModel
+    csv_instance = CSVModel.objects.create(
+        user=user,
+        file=file_path,
+        target_column=target_column,
+        processing_type=processing_type,
+        drop_column=",".join(drop_columns_list) if drop_columns_list else None,
+        original_filename=original_filename,
+        content_hash=content_hash,
+    )
+
+    # Lanza la tarea de preprocesamiento SOLO con el id (el pipeline se importa
+    # recién acá: carga pandas y el resto de las tareas)
+    from .tasks.main import procesar_csv
+    task = procesar_csv.apply_async(args=[csv_instance.id])
+
+    return Response({
+        'message': 'Archivo subido y procesamiento iniciado',
+        'csv_id': csv_instance.id,
+        'task_id': task.id
+    }, status=201)
+
+
 class UploadCSVView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -35,63 +101,182 @@ class UploadCSVView(APIView):
             return Response({'error': 'Debe proporcionar algún tipo de procesamiento'}, status=400)
         if not target_column:
             return Response({'error': 'Debe proporcionar la columna objetivo'}, status=400)
-        try:
-            df = pd.read_csv(file)
-        except Exception:
-            return Response({'error': 'El archivo no es un CSV válido.'}, status=400)
-
-        if target_column not in df.columns:
-            return Response({'error': f'La columna objetivo "{target_column}" no existe en el archivo.'}, status=400)
-
-        # Limpia espacios y fuerza a numérico
-        df[target_column] = df[target_column].astype(str).str.strip()
-        try:
-            df[target_column] = pd.to_numeric(df[target_column])
-        except Exception:
-            return Response({'error': f'La columna objetivo "{target_column}" no es numérica ni convertible a numérica.'}, status=400)
 
         # Normaliza drop_columns a lista
-        if drop_columns is None:
-            drop_columns_list = []
-        elif isinstance(drop_columns, str):
-            drop_columns_list = [col.strip() for col in drop_columns.split(',') if col.strip()]
-        elif isinstance(drop_columns, list):
-            drop_columns_list = drop_columns
-        else:
+        if drop_columns is not None and not isinstance(drop_columns, (str, list)):
             return Response({'error': 'El parámetro drop_columns debe ser una lista o una cadena separada por comas.'}, status=400)
-
-        # Eliminar las columnas si existen
-        not_found = [col for col in drop_columns_list if col not in df.columns]
-        if not_found:
-            return Response({'error': f'Las columnas a suprimir no existen en el archivo: {not_found}'}, status=400)
-        if drop_columns_list:
-            df = df.drop(columns=drop_columns_list)
+        drop_columns_list = columnas_a_eliminar(drop_columns)
 
         # Verifica si el usuario ya subió un archivo con el mismo nombre original
         if CSVModel.objects.filter(user=request.user, original_filename=file.name).exists():
             return Response({'error': 'Ya subiste un archivo con ese nombre antes'}, status=400)
 
-        # Guarda el DataFrame (ya recortado si corresponde) en el sistema de archivos
-        df.to_csv(file_path, index=False)
+        # El archivo va a disco por bloques y solo se validan el encabezado y una
+        # muestra de la columna objetivo; la eliminación de columnas y la conversión
+        # de la columna objetivo las hace el worker (ver upload_utils.preparar_original)
+        temp_path = f'{file_path}.subiendo'
+        content_hash = guardar_subida(file, temp_path)
+        return _registrar_csv(
+            request.user, temp_path, file_path, file.name, target_column, processing_type, drop_columns_list,
+            content_hash,
+        )
+
+
+def _estado_sesion(sesion):
+    return {
+        'session_id': sesion.id,
+        'part_size': sesion.part_size,
+        'total_size': sesion.total_size,
+        'offset': sesion.received_bytes,
+        'received_parts': sesion.received_parts,
+        'content_hash': sesion.content_hash,
+    }
+
 
-        # Crea el modelo CSVModel
-        csv_instance = CSVModel.objects.create(
+class UploadSessionView(APIView):
+    """
+    Crea una sesión de subida reanudable. Las partes se mandan en orden a
+    upload/sesion/<id>/parte/ y se cierra con upload/sesion/<id>/completar/
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        filename = request.data.get('filename')
+        processing_type = request.data.get('processing_type')
+        target_column = request.data.get('target_column')
+        drop_columns = request.data.get('drop_columns')
+        try:
+            total_size = int(request.data.get('total_size'))
+        except (TypeError, ValueError):
+            total_size = 0
+
+        if not filename or not filename.lower().endswith('.csv'):
+            return Response({'error': 'El archivo debe ser un CSV'}, status=400)
+        if total_size <= 0:
+            return Response({'error': 'Debe proporcionar el tamaño total del archivo'}, status=400)
+        if not processing_type:
+            return Response({'error': 'Debe proporcionar algún tipo de procesamiento'}, status=400)
+        if not target_column:
+            return Response({'error': 'Debe proporcionar la columna objetivo'}, status=400)
+        if drop_columns is not None and not isinstance(drop_columns, (str, list)):
+            return Response({'error': 'El parámetro drop_columns debe ser una lista o una cadena separada por comas.'}, status=400)
+        if CSVModel.objects.filter(user=request.user, original_filename=filename).exists():
+            return Response({'error': 'Ya subiste un archivo con ese nombre antes'}, status=400)
+
+        drop_columns_list = columnas_a_eliminar(drop_columns)
+        sesion = UploadSession.objects.create(
             user=request.user,
-            file=file_path,
-            target_column=target_column,
+            original_filename=filename,
             processing_type=processing_type,
+            target_column=target_column,
             drop_column=",".join(drop_columns_list) if drop_columns_list else None,
-            original_filename=file.name,
+            total_size=total_size,
+            part_size=settings.PREPROCESSING_UPLOAD_PART_BYTES,
         )
+        os.makedirs(os.path.dirname(sesion.temp_path()), exist_ok=True)
+        return Response(_estado_sesion(sesion), status=201)
+
+
+class UploadSessionDetailView(APIView):
+    """Estado de la sesión (offset desde el que reanudar) o cancelación"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, session_id):
+        try:
+            sesion = UploadSession.objects.get(id=session_id, user=request.user)
+        except UploadSession.DoesNotExist:
+            return Response({'error': 'Sesión de subida no encontrada'}, status=404)
+        return Response(_estado_sesion(sesion))
+
+    def delete(self, request, session_id):
+        try:
+            sesion = UploadSession.objects.get(id=session_id, user=request.user, csv__isnull=True)
+        except UploadSession.DoesNotExist:
+            return Response({'error': 'Sesión de subida no encontrada'}, status=404)
+        if os.path.exists(sesion.temp_path()):
+            os.remove(sesion.temp_path())
+        sesion.delete()
+        return Response(status=204)
+
+
+class UploadPartView(APIView):
+    """
+    Recibe la parte que empieza en 'offset' (campo 'parte') con su sha256. Todas
+    las partes salvo la última miden part_size. Si el offset no es el esperado
+    responde 409 con el offset desde el que hay que seguir.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, session_id):
+        parte = request.FILES.get('parte')
+        checksum = (request.data.get('sha256') or '').lower()
+        try:
+            offset = int(request.data.get('offset'))
+        except (TypeError, ValueError):
+            return Response({'error': 'Debe proporcionar el offset de la parte'}, status=400)
+        if not parte or not checksum:
+            return Response({'error': 'Debe proporcionar la parte y su sha256'}, status=400)
+
+        with transaction.atomic():
+            try:
+                sesion = UploadSession.objects.select_for_update().get(
+                    id=session_id, user=request.user, csv__isnull=True
+                )
+            except UploadSession.DoesNotExist:
+                return Response({'error': 'Sesión de subida no encontrada'}, status=404)
+
+            if offset != sesion.received_bytes:
+                return Response({'error': 'Offset inesperado', **_estado_sesion(sesion)}, status=409)
+            restante = sesion.total_size - offset
+            if parte.size != min(sesion.part_size, restante):
+                return Response({'error': f'La parte debe medir {min(sesion.part_size, restante)} bytes'}, status=400)
+
+            escritos, digest = escribir_parte(parte, sesion.temp_path(), offset)
+            if digest != checksum:
+                truncar(sesion.temp_path(), offset)
+                return Response({'error': 'El sha256 de la parte no coincide', **_estado_sesion(sesion)}, status=400)
+
+            sesion.received_bytes += escritos
+            sesion.received_parts += 1
+            sesion.content_hash = encadenar_hash(sesion.content_hash, digest)
+            sesion.save(update_fields=['received_bytes', 'received_parts', 'content_hash'])
+        return Response(_estado_sesion(sesion))
+
+
+class UploadSessionCompleteView(APIView):
+    """Cierra la sesión: valida el CSV armado, crea el CSVModel y lanza el procesamiento"""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, session_id):
+        with transaction.atomic():
+            try:
+                sesion = UploadSession.objects.select_for_update().get(
+                    id=session_id, user=request.user, csv__isnull=True
+                )
+            except UploadSession.DoesNotExist:
+                return Response({'error': 'Sesión de subida no encontrada'}, status=404)
+            if sesion.received_bytes != sesion.total_size:
+                return Response({'error': 'La subida no está completa', **_estado_sesion(sesion)}, status=409)
+            checksum = request.data.get('content_hash')
+            if checksum and checksum.lower() != sesion.content_hash:
+                return Response({'error': 'El hash de contenido no coincide', **_estado_sesion(sesion)}, status=400)
+            if CSVModel.objects.filter(user=request.user, original_filename=sesion.original_filename).exists():
+                return Response({'error': 'Ya subiste un archivo con ese nombre antes'}, status=400)
+
+        # Fuera de la transacción: el worker tiene que ver el CSVModel ya guardado
+        respuesta = _registrar_csv(
+            request.user, sesion.temp_path(), sesion.final_path(), sesion.original_filename, sesion.target_column,
+            sesion.processing_type, columnas_a_eliminar(sesion.drop_column), sesion.content_hash,
+        )
+        if respuesta.status_code == 201:
+            sesion.csv_id = respuesta.data['csv_id']
+            sesion.save(update_fields=['csv'])
+        else:
+            # El archivo armado no es válido: la sesión no se puede reanudar
+            sesion.delete()
+        return respuesta
 
-        # Lanza la tarea de preprocesamiento SOLO con el id
-        task = procesar_csv.apply_async(args=[csv_instance.id])
 
-        return Response({
-            'message': 'Archivo subido y procesamiento iniciado',
-            'csv_id': csv_instance.id,
-            'task_id': task.id
-        }, status=201)
 class LaunchProcessingView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -103,8 +288,12 @@ class LaunchProcessingView(APIView):
             try:
                 obj = CSVModel.objects.get(id=csv_id, user=request.user)
                 obj.is_ready = False
+                # Las métricas del procesamiento anterior dejan de valer
+                obj.metrics = None
+                obj.metrics_version = None
                 obj.save()
 
+                from .tasks.main import procesar_csv
                 procesar_csv.delay(obj.id)
                 return Response({'message': 'Preprocesamiento lanzado', "id": csv_id}, status=200)
             except CSVModel.DoesNotExist:
@@ -152,7 +341,118 @@ class CSVStatusView(APIView):
         except CSVModel.DoesNotExist:
             return Response({'error': 'CSV no encontrado o no pertenece al usuario.'}, status=status.HTTP_404_NOT_FOUND)
 
+def _evento_desde_csv(csv_obj):
+    """Estado final tomado de la base, para cuando Redis no tiene eventos del CSV (expiraron o no está disponible)"""
+    if csv_obj.is_ready:
+        return {'csv_id': csv_obj.id, 'secuencia': 0, 'etapa': 'fin', 'porcentaje': 100, 'estado': ESTADO_LISTO}
+    if csv_obj.error_message:
+        return {'csv_id': csv_obj.id, 'secuencia': 0, 'etapa': 'fin', 'porcentaje': None,
+                'estado': ESTADO_ERROR, 'error': csv_obj.error_message}
+    return None
+
+
+def _stream_progreso(csv_id, despues_de):
+    yield 'retry: 3000\n\n'
+    try:
+        for evento in escuchar_progreso(csv_id, despues_de):
+            if evento is None:
+                yield ': latido\n\n'
+            else:
+                yield evento_sse(evento, id_evento=evento['secuencia'])
+    except redis.RedisError:
+        yield evento_sse({'error': 'Progreso no disponible, consultar el estado.'}, 'error')
+
+
+class CSVProgresoView(APIView):
+    """
+    Progreso del procesamiento publicado por las tareas en Redis. Con
+    Accept: text/event-stream (o ?format=sse) responde Server-Sent Events hasta
+    el evento final; Last-Event-ID retoma desde ese evento. Si no, long-poll:
+    devuelve el primer evento posterior a ?despues_de=<secuencia> o 204 si no
+    llega ninguno en ?espera=<segundos>.
+    """
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [JSONRenderer, EventStreamRenderer]
+
+    def get(self, request, csv_id):
+        try:
+            csv_obj = CSVModel.objects.get(id=csv_id, user=request.user)
+        except CSVModel.DoesNotExist:
+            return Response({'error': 'CSV no encontrado o no pertenece al usuario.'}, status=status.HTTP_404_NOT_FOUND)
+
+        stream = request.accepted_renderer.format == EventStreamRenderer.format
+        try:
+            despues_de = int(request.headers.get('Last-Event-ID') or request.query_params.get('despues_de') or 0)
+            espera = min(float(request.query_params.get('espera', settings.PREPROCESSING_PROGRESS_LONGPOLL_SECONDS)),
+                         settings.PREPROCESSING_PROGRESS_LONGPOLL_SECONDS)
+        except ValueError:
+            return Response({'error': 'despues_de y espera deben ser números.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Sin eventos en Redis, la base alcanza para saber si ya terminó
+        try:
+            sin_eventos = ultimo_progreso(csv_id) is None
+        except redis.RedisError:
+            sin_eventos = True
+        evento = _evento_desde_csv(csv_obj) if sin_eventos and not despues_de else None
+
+        if stream:
+            if evento is not None:
+                contenido = iter([evento_sse(evento, id_evento=evento['secuencia'])])
+            else:
+                contenido = _stream_progreso(csv_id, despues_de)
+            respuesta = StreamingHttpResponse(contenido, content_type='text/event-stream')
+            respuesta['Cache-Control'] = 'no-cache'
+            # Que nginx no acumule el stream en su buffer
+            respuesta['X-Accel-Buffering'] = 'no'
+            return respuesta
+
+        if evento is None:
+            try:
+                evento = esperar_progreso(csv_id, despues_de, max(espera, 0))
+            except redis.RedisError:
+                evento = _evento_desde_csv(csv_obj)
+        if evento is None:
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        return Response(evento)
+
+class CSVEjecucionesView(APIView):
+    """Ejecuciones del pipeline sobre el CSV (la última primero) con la telemetría de cada etapa"""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, csv_id):
+        try:
+            csv_obj = CSVModel.objects.get(id=csv_id, user=request.user)
+        except CSVModel.DoesNotExist:
+            return Response({'error': 'CSV no encontrado o no pertenece al usuario.'}, status=status.HTTP_404_NOT_FOUND)
+        runs = csv_obj.runs.prefetch_related('stages')[:settings.PREPROCESSING_RUNS_PAGE_SIZE]
+        return Response(ProcessingRunSerializer(runs, many=True).data)
+
+
+class EstadisticasEtapasView(APIView):
+    """
+    p50/p95 por etapa de duración, pico de RSS, filas y E/S sobre las etapas de
+    todas las ejecuciones de los últimos ?dias=<n> días (opcionalmente de un ?modo=)
+    """
+    permission_classes = [IsAdminUser]
+    CAMPOS = ['duration_seconds', 'peak_rss_bytes', 'rows_in', 'bytes_read', 'bytes_written']
+
+    def get(self, request):
+        try:
+            dias = int(request.query_params.get('dias', settings.PREPROCESSING_STAGE_STATS_DAYS))
+        except ValueError:
+            return Response({'error': 'dias debe ser un número entero.'}, status=status.HTTP_400_BAD_REQUEST)
+        etapas = StageRun.objects.filter(started_at__gte=timezone.now() - timedelta(days=dias))
+        if request.query_params.get('modo'):
+            etapas = etapas.filter(run__mode=request.query_params['modo'])
+        filas = etapas.values_list('stage', *self.CAMPOS).iterator()
+        return Response({'dias': dias, 'etapas': resumen_por_etapa(filas, self.CAMPOS)})
+
 class CSVMetricasView(APIView):
+    """
+    Métricas comparativas precalculadas por el worker. Si no corresponden al
+    procesado actual lanza la tarea que las recalcula y responde 202 con estado
+    'pendiente'.
+    """
     permission_classes = [IsAuthenticated]
 
     def get(self, request, csv_id):
@@ -171,35 +471,91 @@ class CSVMetricasView(APIView):
         if not os.path.exists(path_csv_preprocesado):
             return Response({'error': 'El archivo preprocesado no existe.'}, status=404)
 
-        metricas = calcular_metricas_comparativas_json(path_csv_original, path_csv_preprocesado,csv_instance.target_column)
-        return Response(metricas)
-from .utils.graph_utils import generar_graficos_calidad_comparativo
+        if not metricas_vigentes(csv_instance):
+            # Nunca se calculan en el request: leerían los CSV enteros dentro del proceso web.
+            # Los polls siguientes no la vuelven a encolar mientras esté pendiente
+            solicitar_metricas(csv_instance.id)
+            return Response({'estado': 'pendiente'}, status=202)
+        return Response(csv_instance.metrics)
 class CSVImagesView(APIView):
+    """
+    URLs de los gráficos de calidad. Si todavía no se generaron para los datos
+    actuales lanza la tarea y responde 202 con estado 'pendiente'. La lista
+    lleva un ETag con la versión de los datos.
+    """
     permission_classes = [IsAuthenticated]
 
     def get(self, request, csv_id):
         try:
             csv_instance = CSVModel.objects.get(id=csv_id, user=request.user)
-            base_dir = os.path.dirname(csv_instance.file.path)
-            img_dir = os.path.join(base_dir, "imgs", "calidad")
-            need_generate = not os.path.exists(img_dir) or not any(os.scandir(img_dir))
-
-            if need_generate:
-                df_orig = pd.read_csv(csv_instance.file.path)
-                if hasattr(csv_instance, "processed_file") and csv_instance.processed_file and os.path.exists(csv_instance.processed_file.path):
-                    df_proc = pd.read_csv(csv_instance.processed_file.path)
-                else:
-                    df_proc = df_orig.copy()  # Si no hay archivo procesado, compara con sí mismo
-                generar_graficos_calidad_comparativo(df_orig, df_proc, base_dir)
+            version = version_graficos(csv_instance)
+        except CSVModel.DoesNotExist:
+            return Response({'error': 'CSV no encontrado'}, status=404)
+        except OSError:
+            return Response({'error': 'No se pudo acceder a los archivos'}, status=400)
+
+        if not graficos_vigentes(csv_instance, version):
+            # Sin version (un CSV cambió desde su resumen) el hash lo calcula la tarea, no el request.
+            # Los polls siguientes no la vuelven a encolar mientras esté pendiente
+            solicitar_graficos(csv_instance.id)
+            return Response({'estado': 'pendiente'}, status=202)
+
+        etag = f'"{version}"'
+        no_modificado = get_conditional_response(request, etag=etag)
+        if no_modificado is not None:
+            return no_modificado
+
+        images = [
+            request.build_absolute_uri(reverse('csv-imagen', args=[csv_instance.id, nombre]))
+            for nombre in graficos_existentes(os.path.dirname(csv_instance.file.path))
+        ]
+        response = Response({'estado': 'listo', 'images': images})
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, no-cache'
+        return response
 
-            images = []
-            for fname in os.listdir(img_dir):
-                if fname.endswith(".png"):
-                    rel_path = os.path.relpath(os.path.join(img_dir, fname), settings.MEDIA_ROOT)
-                    url = request.build_absolute_uri('/' + rel_path.replace("\\", "/"))
-                    images.append(url)
 
-            return Response({'images': images})
+class CSVImageView(APIView):
+    """Un PNG de los gráficos de calidad, con ETag y Last-Modified para que el cliente no lo vuelva a bajar"""
+    permission_classes = [IsAuthenticated]
 
+    def get(self, request, csv_id, nombre):
+        try:
+            csv_instance = CSVModel.objects.get(id=csv_id, user=request.user)
         except CSVModel.DoesNotExist:
-            return Response({'error': 'CSV no encontrado'}, status=404)
\ No newline at end of file
+            return Response({'error': 'CSV no encontrado'}, status=404)
+        base_dir = os.path.dirname(csv_instance.file.path)
+        if nombre not in graficos_existentes(base_dir):
+            return Response({'error': 'Imagen no encontrada'}, status=404)
+
+        path = os.path.join(directorio_graficos(base_dir), nombre)
+        etag = f'"{csv_instance.charts_version}-{nombre}"'
+        last_modified = int(os.path.getmtime(path))
+        no_modificado = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if no_modificado is not None:
+            return no_modificado
+
+        response = FileResponse(open(path, 'rb'), content_type='image/png')
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = 'private, no-cache'
+        return response
+
+
+def metricas_prometheus(request):
+    """
+    /metrics para Prometheus. Fuera de DRF: el scraper no usa JWT y se exige
+    PREPROCESSING_METRICS_TOKEN como token Bearer. Sin token configurado solo
+    responde con DEBUG: en producción nunca queda público.
+    """
+    token = settings.PREPROCESSING_METRICS_TOKEN
+    if not token and not settings.DEBUG:
+        return HttpResponse('PREPROCESSING_METRICS_TOKEN sin configurar\n', status=status.HTTP_403_FORBIDDEN,
+                            content_type='text/plain')
+    if token and not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+        return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+    try:
+        contenido = exponer_metricas()
+    except redis.RedisError:
+        return HttpResponse('Redis no disponible\n', status=status.HTTP_503_SERVICE_UNAVAILABLE, content_type='text/plain')
+    return HttpResponse(contenido, content_type='text/plain; version=0.0.4; charset=utf-8')
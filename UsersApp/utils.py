@@ -4,12 +4,13 @@ import random
 from django.conf import settings
 
 
-def get_redis_connection():
+def get_redis_connection(**opciones):
     return redis.Redis(
         host=settings.REDIS_HOST,
         port=settings.REDIS_PORT,
         db=settings.REDIS_DB,
-        decode_responses=True
+        decode_responses=True,
+        **opciones
     )
 
 
@@ -30,6 +30,7 @@ INSTALLED_APPS = [
 # === MIDDLEWARE ===
 
 MIDDLEWARE = [
+    'PreprocessingApp.middleware.MetricasMiddleware',  # primero: mide el request completo
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',  # debe ir antes de CommonMiddleware
@@ -144,6 +145,64 @@ REDIS_2FA_MAX_ATTEMPTS = 3
 # -----
 #--------------------------------Preprocessing APP
 
+# === PREPROCESAMIENTO ===
+
+# Filas de la columna objetivo que se validan en la subida (el resto lo valida el worker)
+PREPROCESSING_UPLOAD_VALIDATION_ROWS = 10_000
+# Tamaño de las partes de las sesiones de subida reanudables (y del hash de contenido encadenado)
+PREPROCESSING_UPLOAD_PART_BYTES = 8 * 1024 * 1024  # 8 MB
+# Reutiliza el csv_procesado.csv de otra subida con el mismo contenido y configuración
+PREPROCESSING_RESULT_CACHE = True
+# Hasta este tamaño el pipeline corre inline en una sola tarea; por encima, como cadena de Celery
+PREPROCESSING_INLINE_MAX_BYTES = 50 * 1024 * 1024  # 50 MB
+# Desde este tamaño el pipeline corre por bloques, sin cargar el archivo entero en memoria
+PREPROCESSING_STREAMING_MIN_BYTES = 1024 * 1024 * 1024  # 1 GB
+PREPROCESSING_CHUNK_SIZE = 100_000  # filas por bloque
+# Por bloques y shards, con más filas únicas que esta muestra, medianas, cuantiles, columnas categóricas
+# y media/desvío son estimaciones sobre ella (ver tasks/streaming.py); el pipeline en memoria es exacto
+PREPROCESSING_STREAMING_SAMPLE_ROWS = 200_000
+PREPROCESSING_SUMMARY_SAMPLE_ROWS = 100_000  # muestra para los resúmenes de métricas y gráficos por bloques
+# Los archivos grandes se reparten en shards de filas entre los workers (chords de Celery)
+PREPROCESSING_USE_SHARDS = True
+PREPROCESSING_SHARD_BYTES = 256 * 1024 * 1024  # 256 MB por shard
+# Memoria para los hashes de filas ya vistas al deduplicar por bloques; por encima se vuelcan a disco.
+# Por bloques y shards se comparan hashes de 64 bits, no filas: dos filas distintas con el mismo hash
+# se toman como duplicadas (≈ n²/2⁶⁵ colisiones esperadas con n filas únicas, ver utils/dedup_utils.py)
+PREPROCESSING_DEDUP_MEMORY_BYTES = 256 * 1024 * 1024
+PREPROCESSING_DEDUP_BLOOM_BITS = 64 * 1024 * 1024 * 8  # Bloom de 64 MB frente a las corridas en disco (0 = sin filtro)
+# 'exacto' o 'aproximado' (KLLSketch mergeable, ver utils/sketch_utils.py). Por bloques y shards 'exacto'
+# toma medianas y límites IQR de PREPROCESSING_STREAMING_SAMPLE_ROWS; 'aproximado', de todas las filas
+PREPROCESSING_QUANTILES = 'exacto'
+PREPROCESSING_QUANTILE_ERROR = 0.01  # error de rango de los cuantiles aproximados
+# Enteros al menor ancho, flotantes a float32 y texto repetido a category al cargar (ver utils/dtype_utils.py)
+PREPROCESSING_COMPACT_DTYPES = config('PREPROCESSING_COMPACT_DTYPES', default=False, cast=bool)
+# Pool de procesos por columnas (memoria compartida) para DataFrames anchos
+PREPROCESSING_PARALLEL_PROCESSES = config('PREPROCESSING_PARALLEL_PROCESSES', default=4, cast=int)
+PREPROCESSING_PARALLEL_MIN_COLUMNS = 500
+# Desde esta cantidad de filas el perfil de columnas estima los valores únicos con HyperLogLog
+PREPROCESSING_PROFILE_HLL_MIN_ROWS = 1_000_000
+# Información mutua: por encima de estas filas se estima con una muestra estratificada (0 = siempre exacta)
+PREPROCESSING_MI_SAMPLE_ROWS = 100_000
+PREPROCESSING_MI_THREADS = config('PREPROCESSING_MI_THREADS', default=4, cast=int)
+# Eventos de progreso por Redis pub/sub (ver utils/progreso_utils.py)
+PREPROCESSING_PROGRESS_TTL_SECONDS = 24 * 3600  # cuánto se conserva el último evento de cada CSV
+# SSE y long-poll ocupan un hilo del servidor mientras esperan: gunicorn tiene que correr con
+# workers gthread (o gevent) y un --timeout mayor que PREPROCESSING_PROGRESS_STREAM_SECONDS
+# (ver docker-compose.yml); con el worker sync por defecto una conexión bloquea el worker entero
+PREPROCESSING_PROGRESS_STREAM_SECONDS = 300  # duración máxima de una conexión SSE (el cliente reconecta)
+PREPROCESSING_PROGRESS_HEARTBEAT_SECONDS = 15
+PREPROCESSING_PROGRESS_LONGPOLL_SECONDS = 25
+# Telemetría de ejecuciones y etapas (ver tasks/telemetria.py)
+PREPROCESSING_RUNS_PAGE_SIZE = 20  # ejecuciones por CSV que devuelve la API
+PREPROCESSING_STAGE_STATS_DAYS = 30  # ventana por defecto de los percentiles por etapa
+# /metrics en formato Prometheus (ver utils/prometheus_utils.py); exige Authorization: Bearer <token>.
+# En producción (DEBUG=False) hay que definir PREPROCESSING_METRICS_TOKEN: sin token /metrics responde 403
+PREPROCESSING_METRICS_TOKEN = config('PREPROCESSING_METRICS_TOKEN', default='')
+PREPROCESSING_METRICS_REDIS_TIMEOUT = 0.25  # segundos; un Redis colgado no debe demorar los requests
+PREPROCESSING_METRICS_QUEUES = ['celery']  # colas de Celery cuya longitud se expone
+# Tareas encoladas por las vistas de métricas e imágenes (ver utils/pendientes_utils.py)
+PREPROCESSING_PENDING_TTL_SECONDS = 300  # si el worker pierde la tarea, el siguiente poll la vuelve a encolar
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -18,9 +18,11 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from PreprocessingApp.views import metricas_prometheus
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/users/', include('UsersApp.urls')),
     path('api/preprocessing/', include('PreprocessingApp.urls')),
+    path('metrics', metricas_prometheus, name='metrics'),
 ]
\ No newline at end of file
@@ -0,0 +1,125 @@
+"""
+Tiempo de arranque del proceso web y del worker de Celery.
+
+Cada objetivo se importa en un intérprete nuevo con python -X importtime: se
+mide el tiempo total, los módulos con mayor tiempo acumulado y cuáles de las
+librerías pesadas quedaron cargadas. Cada corrida se agrega como una línea JSON
+(con la fecha y el commit) al historial, para seguir la evolución en el tiempo.
+
+Uso (desde la raíz del repositorio):
+    python benchmarks/importtime.py
+    python benchmarks/importtime.py --objetivo web --repeticiones 5 --top 20
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime, timezone
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HISTORIAL = os.path.join(RAIZ, 'benchmarks', 'resultados', 'importtime.jsonl')
+
+LIBRERIAS_PESADAS = ['pandas', 'numpy', 'pyarrow', 'sklearn', 'scipy', 'matplotlib', 'seaborn']
+
+# Lo que importa cada proceso al arrancar: las URLs (y con ellas las vistas) en
+# gunicorn, y los módulos de tareas en el worker
+OBJETIVOS = {
+    'web': ['PreprocessingApp.urls'],
+    'worker': ['PreprocessingApp.tasks.main', 'PreprocessingApp.tasks.graficos'],
+}
+
+CODIGO = '''
+import importlib, json, sys, time
+inicio = time.perf_counter()
+import django
+django.setup()
+for modulo in {modulos!r}:
+    importlib.import_module(modulo)
+print(json.dumps({{
+    'segundos': time.perf_counter() - inicio,
+    'pesadas': [nombre for nombre in {pesadas!r} if nombre in sys.modules],
+}}))
+'''
+
+
+def _parsear_importtime(salida):
+    """Líneas 'import time: self | cumulative | módulo' a {módulo: (propio_us, acumulado_us)}"""
+    tiempos = {}
+    for linea in salida.splitlines():
+        if not linea.startswith('import time:') or 'cumulative' in linea:
+            continue
+        propio, acumulado, modulo = linea[len('import time:'):].split('|')
+        tiempos[modulo.strip()] = (int(propio), int(acumulado))
+    return tiempos
+
+
+def medir(objetivo):
+    """Una corrida en un intérprete nuevo: segundos, librerías pesadas cargadas y tiempos por módulo"""
+    entorno = dict(os.environ)
+    entorno.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    entorno['PYTHONPATH'] = os.pathsep.join(filter(None, [RAIZ, entorno.get('PYTHONPATH')]))
+    codigo = CODIGO.format(modulos=OBJETIVOS[objetivo], pesadas=LIBRERIAS_PESADAS)
+    proceso = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', codigo],
+        cwd=RAIZ, env=entorno, capture_output=True, text=True, check=True,
+    )
+    resultado = json.loads(proceso.stdout.strip().splitlines()[-1])
+    resultado['modulos'] = _parsear_importtime(proceso.stderr)
+    return resultado
+
+
+def revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=RAIZ, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def resumir(objetivo, repeticiones, top):
+    """Mejor de varias corridas (el mínimo es el menos afectado por el ruido)"""
+    corridas = [medir(objetivo) for _ in range(repeticiones)]
+    mejor = min(corridas, key=lambda corrida: corrida['segundos'])
+    mas_lentos = sorted(mejor['modulos'].items(), key=lambda item: item[1][1], reverse=True)[:top]
+    return {
+        'objetivo': objetivo,
+        'segundos': round(mejor['segundos'], 4),
+        'pesadas': mejor['pesadas'],
+        'top': [{'modulo': modulo, 'acumulado_ms': round(acumulado / 1000, 1)} for modulo, (_, acumulado) in mas_lentos],
+    }
+
+
+def guardar(resultados, path=HISTORIAL):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fecha = datetime.now(timezone.utc).isoformat(timespec='seconds')
+    commit = revision()
+    with open(path, 'a') as f:
+        for resultado in resultados:
+            f.write(json.dumps({'fecha': fecha, 'revision': commit, **resultado}) + '\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Tiempo de arranque del proceso web y del worker')
+    parser.add_argument('--objetivo', choices=[*OBJETIVOS, 'todos'], default='todos')
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--historial', default=HISTORIAL)
+    parser.add_argument('--no-guardar', action='store_true', help='Solo mostrar, sin agregar al historial')
+    args = parser.parse_args(argv)
+
+    objetivos = list(OBJETIVOS) if args.objetivo == 'todos' else [args.objetivo]
+    resultados = [resumir(objetivo, args.repeticiones, args.top) for objetivo in objetivos]
+    for resultado in resultados:
+        print(f"== {resultado['objetivo']}: {resultado['segundos']:.3f}s")
+        print(f"   librerías pesadas cargadas: {', '.join(resultado['pesadas']) or 'ninguna'}")
+        for entrada in resultado['top']:
+            print(f"   {entrada['acumulado_ms']:>9.1f} ms  {entrada['modulo']}")
+    if not args.no_guardar:
+        guardar(resultados, args.historial)
+        print(f'Historial actualizado: {args.historial}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""
+Perfil de memoria por etapa del preprocesamiento, con presupuestos.
+
+Cada etapa de ETAPAS (y el resumen que usan métricas y gráficos) corre sobre
+datos sintéticos (ver pipeline.py) bajo tracemalloc, que ve las asignaciones
+de Python y de numpy/pandas, y con el pico de RSS del proceso (VmHWM, ver
+utils/telemetria_utils.py), que ve además lo que asignan librerías nativas como
+pyarrow. Se informa, relativo al tamaño en memoria del DataFrame de entrada:
+
+- pico: máximo asignado durante la etapa por encima de lo que había antes
+- neto: lo que sigue asignado al terminar (incluye el DataFrame de salida)
+- rss: crecimiento del pico de RSS (solo informativo, depende del allocator)
+
+Los presupuestos de pico y neto de cada etapa están versionados en
+benchmarks/presupuestos_memoria.json; una optimización que los supere tiene que
+subirlos explícitamente en el mismo cambio. Sale con código 1 si alguna etapa
+se pasa.
+
+Uso (desde la raíz del repositorio, con las variables de entorno de settings):
+    python benchmarks/memoria.py
+    python benchmarks/memoria.py --filas 1M --columnas 20
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import sys
+import tracemalloc
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PRESUPUESTOS = os.path.join(RAIZ, 'benchmarks', 'presupuestos_memoria.json')
+ETAPA_RESUMEN = 'resumen'
+
+
+def _bytes_df(df):
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def perfilar(funcion, df):
+    """
+    Corre funcion(df) y devuelve (resultado, medición) con los bytes de pico y
+    neto de tracemalloc y el crecimiento del pico de RSS (None si no se puede
+    reiniciar VmHWM).
+    """
+    from PreprocessingApp.utils.telemetria_utils import pico_rss, reiniciar_pico_rss
+
+    rss_valido = reiniciar_pico_rss()
+    rss_inicial = pico_rss()
+    iniciado = tracemalloc.is_tracing()
+    if not iniciado:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    antes, _ = tracemalloc.get_traced_memory()
+    try:
+        resultado = funcion(df)
+        despues, pico = tracemalloc.get_traced_memory()
+    finally:
+        if not iniciado:
+            tracemalloc.stop()
+    rss = pico_rss()
+    return resultado, {
+        'entrada': _bytes_df(df),
+        'pico': pico - antes,
+        'neto': despues - antes,
+        'rss': rss - rss_inicial if rss_valido and rss is not None else None,
+    }
+
+
+def perfilar_etapas(df, target_column):
+    """Medición de cada etapa, encadenadas como en el pipeline, más el resumen del resultado"""
+    from PreprocessingApp.tasks.pipeline import ETAPAS
+    from PreprocessingApp.utils.metrics_utils import resumir_dataset
+
+    # Una pasada previa sobre una muestra: los imports diferidos (sklearn,
+    # scipy) y sus cachés no deben contarse como memoria de la etapa
+    muestra = df.head(500)
+    for _, funcion in ETAPAS:
+        muestra = funcion(muestra, target_column)
+    resumir_dataset(muestra, target_column)
+
+    mediciones = {}
+    for nombre, funcion in ETAPAS:
+        df, mediciones[nombre] = perfilar(lambda entrada: funcion(entrada, target_column), df)
+    _, mediciones[ETAPA_RESUMEN] = perfilar(lambda entrada: resumir_dataset(entrada, target_column), df)
+    return mediciones
+
+
+def cargar_presupuestos(path=PRESUPUESTOS):
+    with open(path) as f:
+        return json.load(f)
+
+
+def excedidos(mediciones, presupuestos):
+    """(etapa, medida, veces la entrada, presupuesto) de cada medida fuera de presupuesto"""
+    fuera = []
+    for etapa, medicion in mediciones.items():
+        for medida, limite in presupuestos.get(etapa, {}).items():
+            veces = medicion[medida] / medicion['entrada'] if medicion['entrada'] else 0
+            if veces > limite:
+                fuera.append((etapa, medida, veces, limite))
+    return fuera
+
+
+def _mb(valor):
+    return f'{valor / 2**20:9.1f} MB' if valor is not None else '        -   '
+
+
+def main(argv=None):
+    from benchmarks.pipeline import COLUMNA_OBJETIVO, _cantidad, generar_dataset
+
+    parser = argparse.ArgumentParser(description='Pico de memoria por etapa contra los presupuestos del repositorio')
+    parser.add_argument('--filas', type=_cantidad, default=200_000)
+    parser.add_argument('--columnas', type=int, default=20)
+    parser.add_argument('--nulos', type=float, default=0.05)
+    parser.add_argument('--duplicados', type=float, default=0.02)
+    parser.add_argument('--outliers', type=float, default=0.01)
+    parser.add_argument('--categoricas', type=float, default=0.2)
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--presupuestos', default=PRESUPUESTOS)
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    import django
+    django.setup()
+    logging.getLogger('PreprocessingApp').setLevel(logging.WARNING)
+
+    from PreprocessingApp.utils.upload_utils import preparar_original
+    df = preparar_original(generar_dataset(
+        args.filas, args.columnas, nulos=args.nulos, duplicados=args.duplicados,
+        outliers=args.outliers, categoricas=args.categoricas, semilla=args.semilla,
+    ), COLUMNA_OBJETIVO)
+    with contextlib.redirect_stdout(sys.stderr):
+        mediciones = perfilar_etapas(df, COLUMNA_OBJETIVO)
+    presupuestos = cargar_presupuestos(args.presupuestos)
+
+    print(f'== {args.filas}x{args.columnas}')
+    print(f"   {'etapa':<16}{'entrada':>12}{'pico':>12}{'neto':>12}{'rss':>12}   pico/entrada  neto/entrada")
+    for etapa, medicion in mediciones.items():
+        entrada = medicion['entrada'] or 1
+        limites = presupuestos.get(etapa, {})
+        print(f"   {etapa:<16}{_mb(medicion['entrada'])}{_mb(medicion['pico'])}{_mb(medicion['neto'])}"
+              f"{_mb(medicion['rss'])}   {medicion['pico'] / entrada:5.2f} (≤{limites.get('pico', '-')})"
+              f"  {medicion['neto'] / entrada:5.2f} (≤{limites.get('neto', '-')})")
+    fuera = excedidos(mediciones, presupuestos)
+    for etapa, medida, veces, limite in fuera:
+        print(f'   FUERA DE PRESUPUESTO: {etapa} {medida} {veces:.2f}x la entrada (presupuesto {limite}x)')
+    return 1 if fuera else 0
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, RAIZ)
+    sys.exit(main())
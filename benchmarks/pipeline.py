@@ -0,0 +1,274 @@
+"""
+Benchmark del preprocesamiento sobre datos sintéticos.
+
+Para cada tamaño (filas x columnas) se genera un CSV con una tasa dada de
+nulos, filas duplicadas, outliers y columnas categóricas, y se mide:
+
+- lectura: pd.read_csv + preparar_original, como en procesar_csv
+- cada etapa de ETAPAS y el pipeline inline completo (ejecutar_pipeline)
+- cadena: las tareas de la cadena de Celery ejecutadas en modo eager, con los
+  artefactos Parquet entre etapas (sin broker ni base de datos)
+- metricas: calcular_metricas_comparativas_json sobre original y procesado
+- graficos: generar_graficos_calidad_comparativo
+
+Cada medición es el mínimo de varias repeticiones. Los resultados se comparan
+con la línea base versionada (benchmarks/resultados/pipeline.json) y con
+--guardar se reescriben los tamaños medidos, así el cambio queda en el diff.
+Sale con código 1 si alguna medición empeoró más que la tolerancia.
+
+Los tamaños que superan --max-celdas se saltean: 10M x 10 o 1M x 500 no entran
+en memoria en una máquina de desarrollo común.
+
+Uso (desde la raíz del repositorio, con las variables de entorno de settings):
+    python benchmarks/pipeline.py --filas 10k --columnas 10,500
+    python benchmarks/pipeline.py --filas 1M --columnas 10 --repeticiones 1 --guardar
+"""
+import argparse
+import contextlib
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LINEA_BASE = os.path.join(RAIZ, 'benchmarks', 'resultados', 'pipeline.json')
+
+FILAS = ['10k', '1M', '10M']
+COLUMNAS = [10, 500, 5000]
+COLUMNA_OBJETIVO = 'target'
+# Diferencias menores a esto son ruido aunque el cociente sea grande
+PISO_SEGUNDOS = 0.05
+
+
+def _cantidad(texto):
+    """'10k' -> 10000, '1M' -> 1000000"""
+    texto = str(texto).strip()
+    multiplicador = {'k': 1_000, 'm': 1_000_000}.get(texto[-1:].lower(), 1)
+    return int(float(texto.rstrip('kKmM')) * multiplicador)
+
+
+def generar_dataset(filas, columnas, nulos=0.05, duplicados=0.02, outliers=0.01, categoricas=0.2, semilla=0):
+    """
+    DataFrame sintético de filas x columnas (incluida la columna objetivo).
+    Las columnas numéricas son normales con outliers a ±10 desvíos, las
+    categóricas son etiquetas de texto de cardinalidad variable; ambas con
+    nulos. Las últimas filas son copias exactas de filas anteriores.
+    """
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(semilla)
+    n_categoricas = int(round((columnas - 1) * categoricas))
+    datos = {}
+    for i in range(columnas - 1 - n_categoricas):
+        escala = rng.uniform(1, 50)
+        valores = rng.normal(rng.uniform(-100, 100), escala, filas)
+        anomalos = rng.random(filas) < outliers
+        valores[anomalos] += rng.choice([-10, 10], anomalos.sum()) * escala
+        valores[rng.random(filas) < nulos] = np.nan
+        datos[f'num_{i}'] = valores
+    for i in range(n_categoricas):
+        etiquetas = np.array([f'c{i}_{k}' for k in range(int(rng.integers(2, 50)))], dtype=object)
+        valores = etiquetas[rng.integers(0, len(etiquetas), filas)]
+        valores[rng.random(filas) < nulos] = None
+        datos[f'cat_{i}'] = valores
+    datos[COLUMNA_OBJETIVO] = rng.integers(0, 3, filas)
+    df = pd.DataFrame(datos)
+
+    n_duplicados = int(filas * duplicados)
+    if n_duplicados and n_duplicados < filas:
+        indices = np.arange(filas)
+        indices[filas - n_duplicados:] = rng.integers(0, filas - n_duplicados, n_duplicados)
+        df = df.iloc[indices].reset_index(drop=True)
+    return df
+
+
+def _minimo(funcion, repeticiones):
+    """Mínimo de varias corridas (el menos afectado por el ruido) y el resultado de la última"""
+    mejor = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        segundos = time.perf_counter() - inicio
+        mejor = segundos if mejor is None else min(mejor, segundos)
+    return mejor, resultado
+
+
+def _cadena_eager(df, directorio):
+    from celery import chain
+    from PreprocessingApp.tasks.imputacion import preprocesar_imputacion
+    from PreprocessingApp.tasks.normalizacion import preprocesar_normalizacion
+    from PreprocessingApp.tasks.outliers import preprocesar_outliers
+    from PreprocessingApp.tasks.registros_duplicados import preprocesar_duplicados
+    from PreprocessingApp.tasks.transformacion import preprocesar_transformacion
+    from PreprocessingApp.utils.artifact_utils import cargar_artefacto, eliminar_artefactos, guardar_artefacto
+
+    artefacto = guardar_artefacto(df, directorio, 'original')
+    final = chain(
+        preprocesar_transformacion.s(artefacto, None, COLUMNA_OBJETIVO),
+        preprocesar_duplicados.s(None),
+        preprocesar_imputacion.s(None),
+        preprocesar_outliers.s(None),
+        preprocesar_normalizacion.s(COLUMNA_OBJETIVO, None),
+    ).apply().get()
+    df_final = cargar_artefacto(final)
+    eliminar_artefactos(final)
+    return df_final
+
+
+def medir_tamano(filas, columnas, repeticiones=3, graficos=True, **tasas):
+    """Segundos de cada medición para un tamaño; las claves son las de la línea base"""
+    import pandas as pd
+    from PreprocessingApp.tasks.pipeline import ETAPAS, ejecutar_pipeline
+    from PreprocessingApp.utils.artifact_utils import directorio_artefactos
+    from PreprocessingApp.utils.graph_utils import generar_graficos_calidad_comparativo
+    from PreprocessingApp.utils.metrics_utils import calcular_metricas_comparativas_json
+    from PreprocessingApp.utils.upload_utils import preparar_original
+
+    directorio = tempfile.mkdtemp(prefix='benchmark_pipeline_')
+    try:
+        ruta_original = os.path.join(directorio, 'original.csv')
+        ruta_procesado = os.path.join(directorio, 'procesado.csv')
+        generar_dataset(filas, columnas, **tasas).to_csv(ruta_original, index=False)
+
+        tiempos = {}
+        tiempos['lectura'], df = _minimo(
+            lambda: preparar_original(pd.read_csv(ruta_original), COLUMNA_OBJETIVO), repeticiones)
+
+        # Los registros de ejecutar_pipeline ya traen el tiempo de cada etapa
+        por_etapa = {nombre: [] for nombre, _ in ETAPAS}
+        def pipeline():
+            df_final, registros = ejecutar_pipeline(df.copy(), COLUMNA_OBJETIVO)
+            for registro in registros:
+                por_etapa[registro['etapa']].append(registro['segundos'])
+            return df_final
+        tiempos['pipeline'], df_procesado = _minimo(pipeline, repeticiones)
+        for nombre, segundos in por_etapa.items():
+            tiempos[f'etapa:{nombre}'] = min(segundos)
+
+        tiempos['cadena'], _ = _minimo(
+            lambda: _cadena_eager(df, directorio_artefactos(ruta_original)), repeticiones)
+
+        df_procesado.to_csv(ruta_procesado, index=False)
+        tiempos['metricas'], _ = _minimo(
+            lambda: calcular_metricas_comparativas_json(ruta_original, ruta_procesado, COLUMNA_OBJETIVO),
+            repeticiones)
+        if graficos:
+            tiempos['graficos'], _ = _minimo(
+                lambda: generar_graficos_calidad_comparativo(
+                    df, df_procesado, os.path.join(directorio, 'graficos')),
+                repeticiones)
+        return {medicion: round(segundos, 4) for medicion, segundos in tiempos.items()}
+    finally:
+        shutil.rmtree(directorio, ignore_errors=True)
+
+
+def cargar_linea_base(path=LINEA_BASE):
+    if not os.path.exists(path):
+        return {'tamanos': {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def comparar(resultados, linea_base, tolerancia):
+    """Filas (tamaño, medición, actual, base, cociente, regresión) para cada medición con base"""
+    filas = []
+    for tamano, tiempos in resultados.items():
+        base = linea_base['tamanos'].get(tamano, {}).get('tiempos', {})
+        for medicion, segundos in tiempos.items():
+            anterior = base.get(medicion)
+            cociente = segundos / anterior if anterior else None
+            regresion = cociente is not None and cociente > tolerancia and segundos - anterior > PISO_SEGUNDOS
+            filas.append((tamano, medicion, segundos, anterior, cociente, regresion))
+    return filas
+
+
+def guardar(resultados, tasas, repeticiones, linea_base, path=LINEA_BASE):
+    """Reescribe en la línea base solo los tamaños medidos"""
+    from benchmarks.importtime import revision
+
+    fecha = datetime.now(timezone.utc).isoformat(timespec='seconds')
+    for tamano, tiempos in resultados.items():
+        linea_base['tamanos'][tamano] = {
+            'fecha': fecha,
+            'revision': revision(),
+            'python': sys.version.split()[0],
+            'repeticiones': repeticiones,
+            'tasas': tasas,
+            'tiempos': tiempos,
+        }
+    linea_base['tamanos'] = dict(sorted(linea_base['tamanos'].items(), key=lambda item: _orden(item[0])))
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(linea_base, f, indent=2, ensure_ascii=False)
+        f.write('\n')
+
+
+def _orden(tamano):
+    filas, columnas = tamano.split('x')
+    return int(filas), int(columnas)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark de las etapas del preprocesamiento con datos sintéticos')
+    parser.add_argument('--filas', default=','.join(FILAS), help='Lista separada por comas, admite k y M')
+    parser.add_argument('--columnas', default=','.join(map(str, COLUMNAS)))
+    parser.add_argument('--max-celdas', type=_cantidad, default=50_000_000,
+                        help='Saltea los tamaños con más celdas que esto')
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--nulos', type=float, default=0.05)
+    parser.add_argument('--duplicados', type=float, default=0.02)
+    parser.add_argument('--outliers', type=float, default=0.01)
+    parser.add_argument('--categoricas', type=float, default=0.2, help='Fracción de columnas categóricas')
+    parser.add_argument('--semilla', type=int, default=0)
+    parser.add_argument('--sin-graficos', action='store_true')
+    parser.add_argument('--tolerancia', type=float, default=1.25,
+                        help='Cociente contra la línea base a partir del cual se marca una regresión')
+    parser.add_argument('--linea-base', default=LINEA_BASE)
+    parser.add_argument('--guardar', action='store_true', help='Reescribir la línea base con los tamaños medidos')
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, RAIZ)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'backend.settings')
+    import django
+    django.setup()
+    # Los logs por etapa del pipeline distorsionan los tiempos y tapan el reporte
+    logging.getLogger('PreprocessingApp').setLevel(logging.WARNING)
+
+    tasas = {'nulos': args.nulos, 'duplicados': args.duplicados, 'outliers': args.outliers,
+             'categoricas': args.categoricas, 'semilla': args.semilla}
+    resultados = {}
+    for filas in map(_cantidad, args.filas.split(',')):
+        for columnas in map(int, args.columnas.split(',')):
+            tamano = f'{filas}x{columnas}'
+            if filas * columnas > args.max_celdas:
+                print(f'== {tamano}: salteado (más de {args.max_celdas} celdas, ver --max-celdas)')
+                continue
+            print(f'== {tamano}', flush=True)
+            # Algunas etapas imprimen con print: a stderr, para no mezclarlo con el reporte
+            with contextlib.redirect_stdout(sys.stderr):
+                resultados[tamano] = medir_tamano(
+                    filas, columnas, args.repeticiones, graficos=not args.sin_graficos, **tasas)
+
+    linea_base = cargar_linea_base(args.linea_base)
+    regresiones = 0
+    for tamano, medicion, segundos, anterior, cociente, regresion in comparar(resultados, linea_base, args.tolerancia):
+        referencia = f'base {anterior:.3f}s  x{cociente:.2f}' if cociente is not None else 'sin base'
+        marca = '  REGRESIÓN' if regresion else ''
+        print(f'   {tamano:>14} {medicion:<22} {segundos:>9.3f}s  ({referencia}){marca}')
+        regresiones += regresion
+    if args.guardar:
+        guardar(resultados, tasas, args.repeticiones, linea_base, args.linea_base)
+        print(f'Línea base actualizada: {args.linea_base}')
+    elif regresiones:
+        print(f'{regresiones} mediciones empeoraron más de x{args.tolerancia}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())